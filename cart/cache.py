@@ -0,0 +1,103 @@
+"""
+Cached cart summaries.
+
+The cart sidebar and navbar badge are shown on nearly every page, but only
+need the cart's lines, total and item count. These are cached per owner
+(the user id for authenticated users, the session key for guests) so
+browsing pages does not rebuild them from the cart, cart item and product
+tables on every request.
+
+Like the catalog caches (see `products.cache`), summaries are keyed on
+versions instead of being deleted: the views that change a cart bump the
+owner's cart version (`invalidate_cart_summary`) when their transaction
+commits, and the next render writes the summary under the new key. The key
+also contains the catalog cache version, which product saves bump (see
+`products.signals`), so price, name and image changes are never shown
+from a stale summary.
+"""
+
+from django.core.cache import cache
+from products.cache import bump_versions, get_catalog_version, get_version
+
+CART_SUMMARY_KEY = 'cart:summary:{}:{}:{}'
+CART_VERSION_KEY = 'cart:version:{}'
+CART_SUMMARY_TIMEOUT = 60 * 30
+REQUEST_SNAPSHOT_ATTR = '_cart_snapshot'
+
+
+def get_cart_owner(request):
+    """
+    Returns the identifier a request's cart summary is cached under.
+
+    :param request: The HttpRequest object.
+    :return: 'user:<id>' for authenticated users, 'session:<key>' for
+             guests with a session, otherwise None (nothing to cache).
+    :rtype: str | None
+    """
+
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    session_key = getattr(request.session, 'session_key', None)
+    if session_key:
+        return f'session:{session_key}'
+    return None
+
+
+def _summary_key(owner):
+    """
+    :param owner: The owner identifier, see `get_cart_owner`.
+    :return: The cache key of the owner's summary.
+    :rtype: str
+    """
+
+    return CART_SUMMARY_KEY.format(
+        owner,
+        get_version(CART_VERSION_KEY.format(owner)),
+        get_catalog_version(),
+    )
+
+
+def get_cart_summary(owner):
+    """
+    Returns an owner's cached cart summary.
+
+    :param owner: The owner identifier, see `get_cart_owner`.
+    :return: The cached summary, or None if missing.
+    :rtype: tuple | None
+    """
+
+    return cache.get(_summary_key(owner))
+
+
+def set_cart_summary(owner, summary):
+    """
+    Stores an owner's cart summary.
+
+    :param owner: The owner identifier, see `get_cart_owner`.
+    :param summary: A (cart, items, total, item count) tuple.
+    """
+
+    cache.set(_summary_key(owner), summary, CART_SUMMARY_TIMEOUT)
+
+
+def invalidate_cart_summary(request=None, user_id=None):
+    """
+    Invalidates a cached cart summary after the cart changed.
+
+    The owner's cart version is bumped when the current transaction
+    commits. The request's cart snapshot (see `cart.snapshot`) is dropped
+    right away, so the rest of the request sees the change.
+
+    :param request: The request whose cart changed.
+    :param user_id: Alternatively, the id of the user whose cart changed.
+    """
+
+    if request is not None:
+        request.__dict__.pop(REQUEST_SNAPSHOT_ATTR, None)
+
+    if user_id is not None:
+        owner = f'user:{user_id}'
+    else:
+        owner = get_cart_owner(request)
+    if owner:
+        bump_versions([CART_VERSION_KEY.format(owner)])
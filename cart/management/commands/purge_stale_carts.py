@@ -0,0 +1,140 @@
+"""
+Management command to purge abandoned carts and expired sessions.
+
+Usage: python manage.py purge_stale_carts [--days 30] [--batch-size 1000]
+"""
+
+import logging
+import time
+from datetime import timedelta
+from importlib import import_module
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from cart.models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+DB_SESSION_ENGINES = {
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+}
+
+
+class Command(BaseCommand):
+    """
+    Deletes abandoned carts (without a user, or inactive for `--days`)
+    together with their items, and expired sessions, which hold the guest
+    carts.
+
+    Rows are deleted in batches of primary keys, so each statement (and
+    the locks it takes) stays small however far the tables have grown.
+    Orders keep their data; their link to a purged cart is cleared. The
+    command is meant to be scheduled periodically (e.g. daily).
+    """
+
+    help = 'Deletes abandoned carts and expired sessions in batches.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Days without activity after which a cart is abandoned.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per statement.'
+        )
+
+    def delete_in_batches(self, queryset, batch_size):
+        """
+        Deletes the rows of a queryset in batches of primary keys.
+
+        :param queryset: The rows to delete.
+        :param batch_size: Number of rows per batch.
+        :return: The number of deleted rows by model label, including
+                 cascaded rows.
+        :rtype: dict[str, int]
+        """
+
+        deleted = {}
+        while True:
+            batch = list(
+                queryset.order_by('pk').values_list('pk', flat=True)[
+                    :batch_size
+                ]
+            )
+            if not batch:
+                return deleted
+            _, counts = queryset.model.objects.filter(pk__in=batch).delete()
+            for label, count in counts.items():
+                deleted[label] = deleted.get(label, 0) + count
+
+    def purge_sessions(self, batch_size):
+        """
+        Deletes expired sessions.
+
+        Database-backed sessions are deleted in batches; other session
+        engines clear their expired sessions themselves.
+
+        :param batch_size: Number of rows per batch.
+        :return: The number of deleted sessions, or None if the session
+                 engine does not report it.
+        :rtype: int | None
+        """
+
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            engine = import_module(settings.SESSION_ENGINE)
+            engine.SessionStore.clear_expired()
+            return None
+
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        deleted = self.delete_in_batches(expired, batch_size)
+        return deleted.get(Session._meta.label, 0)
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        cutoff = timezone.now() - timedelta(days=max(options['days'], 0))
+        started = time.monotonic()
+
+        stale_carts = Cart.objects.filter(
+            Q(user__isnull=True) | Q(updated_on__lt=cutoff)
+        )
+        deleted = self.delete_in_batches(stale_carts, batch_size)
+        carts = deleted.get(Cart._meta.label, 0)
+        items = deleted.get(CartItem._meta.label, 0)
+        sessions = self.purge_sessions(batch_size)
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            'Purged %d stale carts (%d items) inactive since %s and %s '
+            'expired sessions in %.2fs.',
+            carts, items, cutoff.isoformat(),
+            'unreported' if sessions is None else sessions, elapsed,
+        )
+        sessions_text = (
+            'expired sessions' if sessions is None
+            else f'{sessions} expired sessions'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {carts} carts ({items} items) and {sessions_text} '
+            f'in {elapsed:.2f}s.'
+        ))
@@ -5,8 +5,10 @@ Defines the structure of the shopping cart (`Cart`) and the items
 within it (`CartItem`) as stored in the database.
 """
 
+from datetime import timedelta
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 
 
@@ -16,7 +18,9 @@ class Cart(models.Model):
 
     A cart can be associated with a logged-in user (`user` field) or represent
     a guest cart implicitly (if `user` is None, though typically guest carts
-    are handled via session first). Tracks creation and update timestamps.
+    are handled via session first). Tracks creation and update timestamps;
+    `updated_on` doubles as the cart's last activity, which the
+    `purge_stale_carts` command uses to find abandoned carts.
 
     :param user: ForeignKey relationship to the User model. Can be null for
     guest identification logic elsewhere.
@@ -32,6 +36,29 @@ class Cart(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
+    # How often `for_user` refreshes `updated_on` of an active cart.
+    ACTIVITY_INTERVAL = timedelta(hours=1)
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns a user's cart, creating it if needed, and records activity.
+
+        Item changes do not save the cart itself, so `updated_on` is
+        refreshed here, at most once per `ACTIVITY_INTERVAL`, to keep
+        carts in use from being purged as abandoned.
+
+        :param user: The authenticated user.
+        :return: The user's cart.
+        :rtype: Cart
+        """
+
+        cart, created = cls.objects.get_or_create(user=user)
+        if (not created and cart.updated_on
+                < timezone.now() - cls.ACTIVITY_INTERVAL):
+            cart.save(update_fields=['updated_on'])
+        return cart
+
     def __str__(self):
         """
         Returns a string representation of the cart.
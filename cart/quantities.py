@@ -0,0 +1,164 @@
+"""
+Race-free cart quantity updates.
+
+Adding to a database cart used to read the cart item, add in Python and
+save, so concurrent requests (double clicks, several tabs) could lose
+updates. `add_to_cart_item` instead increments the quantity in a single
+conditional UPDATE that also checks the available stock (the stock not
+held by checkout reservations), and only falls back to an insert when the
+product is not in the cart yet.
+
+`merge_into_cart` adds many lines at once (login merge, reorder) with one
+read of the existing lines and one bulk insert and update.
+"""
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from products.models import Product
+from .models import CartItem
+
+# Backends whose UPDATE supports RETURNING, so the increment and the read
+# of the new quantity take one round trip.
+RETURNING_VENDORS = {'postgresql', 'sqlite'}
+
+
+def _increment(cart_id, product_id, quantity):
+    """
+    Increments an existing cart item if the available stock allows it.
+
+    :param cart_id: The primary key of the cart.
+    :param product_id: The primary key of the product.
+    :param quantity: The quantity to add.
+    :return: The new quantity, or None if no row was updated (the item does
+             not exist or the stock is insufficient).
+    :rtype: int | None
+    """
+
+    if (connection.vendor in RETURNING_VENDORS
+            and connection.features.can_return_columns_from_insert):
+        item_table = connection.ops.quote_name(CartItem._meta.db_table)
+        product_table = connection.ops.quote_name(Product._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {item_table} SET quantity = quantity + %s '
+                f'WHERE cart_id = %s AND product_id = %s '
+                f'AND quantity + %s <= ('
+                f'SELECT stock_quantity - reserved_quantity '
+                f'FROM {product_table} WHERE id = %s'
+                f') RETURNING quantity',
+                [quantity, cart_id, product_id, quantity, product_id]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    updated = items.filter(
+        quantity__lte=F('product__stock_quantity')
+        - F('product__reserved_quantity') - quantity
+    ).update(quantity=F('quantity') + quantity)
+    if not updated:
+        return None
+    return items.values_list('quantity', flat=True).first()
+
+
+def add_to_cart_item(cart, product, quantity):
+    """
+    Atomically adds a quantity of a product to a database cart.
+
+    The common case (the product is already in the cart) is one UPDATE.
+    Otherwise a new line is inserted if the available stock allows it (see
+    `Product.available_quantity`); an insert that loses a race against a
+    concurrent one retries the increment.
+
+    :param cart: The cart to add to.
+    :type cart: cart.models.Cart
+    :param product: The product to add.
+    :type product: products.models.Product
+    :param quantity: The quantity to add (positive).
+    :type quantity: int
+    :return: A (new quantity, added) tuple. When the stock does not allow
+             the addition, added is False and the quantity is the one
+             already in the cart (0 if none).
+    :rtype: tuple[int, bool]
+    """
+
+    new_quantity = _increment(cart.pk, product.pk, quantity)
+    if new_quantity is not None:
+        return new_quantity, True
+
+    current_quantity = CartItem.objects.filter(
+        cart=cart, product=product
+    ).values_list('quantity', flat=True).first()
+    if current_quantity is not None:
+        return current_quantity, False
+
+    if quantity > product.available_quantity:
+        return 0, False
+
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, product=product,
+                                    quantity=quantity)
+        return quantity, True
+    except IntegrityError:
+        new_quantity = _increment(cart.pk, product.pk, quantity)
+        if new_quantity is not None:
+            return new_quantity, True
+        return CartItem.objects.filter(
+            cart=cart, product=product
+        ).values_list('quantity', flat=True).first() or 0, False
+
+
+def merge_into_cart(cart, quantities, stock):
+    """
+    Adds several products to a database cart in bulk, clamped to stock.
+
+    Reads the existing lines with one query, then inserts new lines with
+    one `bulk_create` and raises existing ones with one `bulk_update`. A
+    line is never raised above the product's stock; lines already at or
+    above it are left unchanged.
+
+    :param cart: The cart to add to.
+    :type cart: cart.models.Cart
+    :param quantities: The quantities to add by product id.
+    :type quantities: dict[int, int]
+    :param stock: The available stock (see `Product.available_quantity`)
+                  by product id; products missing here are skipped.
+    :type stock: dict[int, int]
+    :return: The quantities actually added by product id.
+    :rtype: dict[int, int]
+    """
+
+    existing_items = {
+        item.product_id: item
+        for item in CartItem.objects.filter(
+            cart=cart, product_id__in=[pk for pk in quantities if pk in stock]
+        )
+    }
+
+    added = {}
+    items_to_create = []
+    items_to_update = []
+    for product_id, quantity in quantities.items():
+        if product_id not in stock or quantity <= 0:
+            continue
+
+        cart_item = existing_items.get(product_id)
+        current_quantity = cart_item.quantity if cart_item else 0
+        new_quantity = min(current_quantity + quantity, stock[product_id])
+        if new_quantity <= current_quantity:
+            added[product_id] = 0
+            continue
+
+        added[product_id] = new_quantity - current_quantity
+        if cart_item is None:
+            items_to_create.append(CartItem(
+                cart=cart, product_id=product_id, quantity=new_quantity
+            ))
+        else:
+            cart_item.quantity = new_quantity
+            items_to_update.append(cart_item)
+
+    CartItem.objects.bulk_create(items_to_create)
+    CartItem.objects.bulk_update(items_to_update, ['quantity'])
+    return added
@@ -0,0 +1,184 @@
+"""
+Compact storage of the guest cart in the session.
+
+Guest carts used to be stored as `{"<product id>": {"quantity": n}}`, which
+serializes to verbose JSON on every session write. `SessionCart` stores
+them as a flat, versioned list instead::
+
+    [2, <product id>, <quantity>, <product id>, <quantity>, ...]
+
+where the first element is the schema version. Carts in the old dict
+format (version 1) are still read, and rewritten in the compact format on
+the next change. All code reading or changing the guest cart goes through
+this class.
+"""
+
+from .constants import GUEST_CART_SESSION_ID
+
+SESSION_CART_VERSION = 2
+
+
+def decode_session_cart(raw):
+    """
+    Decodes a stored guest cart of any known version.
+
+    Malformed lines and non-positive quantities are skipped.
+
+    :param raw: The value stored in the session.
+    :return: The quantities by product id, in insertion order.
+    :rtype: dict[int, int]
+    """
+
+    if isinstance(raw, dict):
+        pairs = (
+            (product_id, item_data.get('quantity', 0)
+             if isinstance(item_data, dict) else 0)
+            for product_id, item_data in raw.items()
+        )
+    elif (isinstance(raw, list) and raw
+          and raw[0] == SESSION_CART_VERSION):
+        pairs = zip(raw[1::2], raw[2::2])
+    else:
+        return {}
+
+    quantities = {}
+    for product_id, quantity in pairs:
+        try:
+            product_id = int(product_id)
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[product_id] = quantity
+    return quantities
+
+
+def encode_session_cart(quantities):
+    """
+    Encodes guest cart quantities in the current compact format.
+
+    :param quantities: The quantities by product id.
+    :type quantities: dict[int, int]
+    :return: The value to store in the session.
+    :rtype: list[int]
+    """
+
+    encoded = [SESSION_CART_VERSION]
+    for product_id, quantity in quantities.items():
+        encoded.extend((product_id, quantity))
+    return encoded
+
+
+class SessionCart:
+    """
+    Reads and changes the guest cart stored in a session.
+
+    Changes are written back to the session (in the compact format)
+    immediately; an emptied cart removes the session key.
+
+    :param session: The session holding the cart.
+    :type session: django.contrib.sessions.backends.base.SessionBase
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._quantities = decode_session_cart(
+            session.get(GUEST_CART_SESSION_ID)
+        )
+
+    def __bool__(self):
+        return bool(self._quantities)
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __contains__(self, product_id):
+        return int(product_id) in self._quantities
+
+    def items(self):
+        """
+        :return: (product id, quantity) pairs in insertion order.
+        :rtype: list[tuple[int, int]]
+        """
+
+        return list(self._quantities.items())
+
+    def product_ids(self):
+        """
+        :return: The ids of the products in the cart.
+        :rtype: list[int]
+        """
+
+        return list(self._quantities)
+
+    def get(self, product_id):
+        """
+        :param product_id: The id of a product.
+        :return: The product's quantity in the cart (0 if absent).
+        :rtype: int
+        """
+
+        return self._quantities.get(int(product_id), 0)
+
+    def set(self, product_id, quantity):
+        """
+        Sets a product's quantity; 0 removes the line.
+
+        :param product_id: The id of the product.
+        :param quantity: The new quantity.
+        """
+
+        if quantity > 0:
+            self._quantities[int(product_id)] = quantity
+        else:
+            self._quantities.pop(int(product_id), None)
+        self._save()
+
+    def add(self, product_id, quantity):
+        """
+        Adds a quantity of a product.
+
+        :param product_id: The id of the product.
+        :param quantity: The quantity to add.
+        :return: The product's new quantity.
+        :rtype: int
+        """
+
+        new_quantity = self.get(product_id) + quantity
+        self.set(product_id, new_quantity)
+        return new_quantity
+
+    def remove(self, product_id):
+        """
+        Removes a product from the cart.
+
+        :param product_id: The id of the product.
+        :return: True if the product was in the cart.
+        :rtype: bool
+        """
+
+        if product_id not in self:
+            return False
+        self.set(product_id, 0)
+        return True
+
+    def clear(self):
+        """
+        Empties the cart.
+        """
+
+        self._quantities = {}
+        self._save()
+
+    def _save(self):
+        """
+        Writes the cart back to the session.
+        """
+
+        if self._quantities:
+            self.session[GUEST_CART_SESSION_ID] = encode_session_cart(
+                self._quantities
+            )
+        elif GUEST_CART_SESSION_ID in self.session:
+            del self.session[GUEST_CART_SESSION_ID]
+        self.session.modified = True
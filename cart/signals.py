@@ -9,9 +9,11 @@ merging session carts into database carts.
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in
 from django.db import transaction
-from .models import Cart, CartItem
+from .cache import invalidate_cart_summary
+from .models import Cart
+from .quantities import merge_into_cart
 from products.models import Product
-from .views import GUEST_CART_SESSION_ID
+from .session import SessionCart
 
 
 @receiver(user_logged_in)
@@ -21,11 +23,16 @@ def merge_session_cart_into_db_cart(sender, request, user, **kwargs):
     upon login.
 
     This function is connected to the `user_logged_in` signal. It checks if a
-    guest cart exists in the session. If so, it iterates through the session
-    cart items, retrieves or creates the corresponding user's database cart
-    and cart items, updates quantities, and handles potential errors like
-    non-existent products. The session cart is cleared after successful
-    merging. Uses a database transaction to ensure atomicity.
+    guest cart exists in the session. If so, the session lines are merged
+    into the user's database cart with a constant number of queries: the
+    active products are loaded with one `in_bulk` query, and
+    `merge_into_cart` reads the existing cart items with one query, inserts
+    new lines with `bulk_create` and updates existing lines with one
+    `bulk_update`. Merged quantities are
+    clamped to the available stock, and lines for inactive, missing or
+    invalid products are dropped.
+    The session cart is cleared after successful merging. Uses a database
+    transaction to ensure atomicity.
 
     :param sender: The sender of the signal (typically the user model).
     :param request: The HttpRequest object containing the session.
@@ -35,47 +42,34 @@ def merge_session_cart_into_db_cart(sender, request, user, **kwargs):
     :param kwargs: Additional keyword arguments passed by the signal.
     """
 
-    session_cart = request.session.get(GUEST_CART_SESSION_ID)
+    session_cart = SessionCart(request.session)
 
     if not session_cart:
         return
 
+    quantities = dict(session_cart.items())
+
     try:
         with transaction.atomic():
-            db_cart, created = Cart.objects.get_or_create(user=user)
-
-            items_merged = 0
-            items_created = 0
-
-            for product_id_str, item_data in session_cart.items():
-                try:
-                    product_id = int(product_id_str)
-                    quantity = int(item_data.get('quantity', 0))
-
-                    if quantity <= 0:
-                        continue
-
-                    product = Product.objects.get(id=product_id)
-                    cart_item, item_created = CartItem.objects.get_or_create(
-                        cart=db_cart,
-                        product=product,
-                        defaults={'quantity': quantity}
-                    )
-
-                    if not item_created:
-                        cart_item.quantity += quantity
-                        cart_item.save()
-                        items_merged += 1
-                    else:
-                        items_created += 1
-
-                except Product.DoesNotExist:
-                    continue
-                except (ValueError, TypeError) as e:
-                    continue
-
-            del request.session[GUEST_CART_SESSION_ID]
-            request.session.modified = True
+            db_cart = Cart.for_user(user)
+            products = Product.objects.filter(is_active=True).only(
+                'pk', 'stock_quantity', 'reserved_quantity'
+            ).in_bulk(list(quantities))
+            # Lines of inactive or deleted products are dropped.
+            quantities = {
+                product_id: quantity
+                for product_id, quantity in quantities.items()
+                if product_id in products
+            }
+            stock = {
+                product_id: product.available_quantity
+                for product_id, product in products.items()
+            }
+            merge_into_cart(db_cart, quantities, stock)
+
+            session_cart.clear()
+
+        invalidate_cart_summary(user_id=user.pk)
 
     except Exception as e:
         pass
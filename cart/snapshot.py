@@ -0,0 +1,219 @@
+"""
+Request-scoped snapshot of the current cart.
+
+`get_cart_snapshot` attaches one `CartSnapshot` to the request, so the views
+(checkout in particular) and the `cart_context` context processor rendering
+their templates share a single load of the cart and its products.
+"""
+
+from decimal import Decimal
+from django.utils.functional import SimpleLazyObject, cached_property
+from products.models import Product
+from .cache import (
+    REQUEST_SNAPSHOT_ATTR,
+    get_cart_owner,
+    get_cart_summary,
+    set_cart_summary,
+)
+from .models import Cart, CartItem
+from .session import SessionCart
+
+
+class CartSnapshot:
+    """
+    The current cart's items, total price and item count, loaded on first
+    access and memoized.
+
+    Use `get_cart_snapshot` to share one snapshot per request between the
+    views and the context processor.
+
+    For authenticated users:
+    - Fetches the user's Cart object and related CartItems.
+    - Calculates total price and item count from CartItems.
+
+    For guest users:
+    - Retrieves cart data from the session (see `SessionCart`).
+    - Fetches Product details for items in the session cart.
+    - Constructs a list of temporary item dictionaries mimicking
+    CartItem structure.
+    - Calculates total price and item count from session data.
+
+    With `cached`, the contents are read from (and written to) the cached
+    cart summary; views that act on the cart, like checkout, request a
+    fresh snapshot loaded from the database instead.
+
+    :param request: The HttpRequest object, used to access user and session.
+    :type request: django.http.HttpRequest
+    :param cached: True to use the cached cart summary.
+    :type cached: bool
+    """
+
+    def __init__(self, request, cached=False):
+        self.request = request
+        self.cached = cached
+
+    @cached_property
+    def _contents(self):
+        """
+        Returns the cart contents, from the cached summary if allowed.
+
+        :return: A (cart, items, total, item count) tuple.
+        :rtype: tuple
+        """
+
+        owner = get_cart_owner(self.request) if self.cached else None
+        if owner:
+            summary = get_cart_summary(owner)
+            if summary is None:
+                summary = self._load()
+                set_cart_summary(owner, summary)
+            return summary
+        return self._load()
+
+    def _load(self):
+        """
+        Loads the cart contents from the database.
+
+        :return: A (cart, items, total, item count) tuple.
+        :rtype: tuple
+        """
+
+        cart = None
+        cart_items = []
+        cart_total = Decimal('0.00')
+        cart_item_count = 0
+
+        if self.request.user.is_authenticated:
+            try:
+                cart = Cart.objects.prefetch_related('items__product').get(
+                    user=self.request.user)
+                for item in cart.items.all():
+                    cart_items.append(item)
+                    cart_total += item.total_price()
+                    cart_item_count += item.quantity
+
+            except Cart.DoesNotExist:
+                pass
+        else:
+            session_cart = SessionCart(self.request.session)
+            if session_cart:
+                products = Product.objects.filter(
+                    id__in=session_cart.product_ids()
+                )
+                products_dict = {p.id: p for p in products}
+
+                for product_id, quantity in session_cart.items():
+                    product = products_dict.get(product_id)
+
+                    if product:
+                        item_total = product.price * quantity
+                        cart_total += item_total
+                        cart_item_count += quantity
+
+                        cart_items.append({
+                            'product': product,
+                            'quantity': quantity,
+                            'total_price': item_total,
+                            'id': product_id
+                        })
+
+        return cart, cart_items, cart_total, cart_item_count
+
+    @property
+    def cart(self):
+        """
+        :return: The user's Cart object, or None for guests and users
+                 without a cart.
+        :rtype: Cart | None
+        """
+
+        return self._contents[0]
+
+    @property
+    def items(self):
+        """
+        :return: A list of CartItem objects (auth) or dicts (guest).
+        :rtype: list
+        """
+
+        return self._contents[1]
+
+    @cached_property
+    def products(self):
+        """
+        :return: The products in the cart by id.
+        :rtype: dict[int, products.models.Product]
+        """
+
+        products = {}
+        for item in self.items:
+            product = (item.product if isinstance(item, CartItem)
+                       else item['product'])
+            products[product.pk] = product
+        return products
+
+    @property
+    def total(self):
+        """
+        :return: The total price of the items in the cart.
+        :rtype: decimal.Decimal
+        """
+
+        return self._contents[2]
+
+    @property
+    def item_count(self):
+        """
+        :return: The total number of individual items in the cart.
+        :rtype: int
+        """
+
+        return self._contents[3]
+
+    def as_context(self):
+        """
+        Returns the contents under the template context variable names.
+
+        The values are lazy objects, so nothing is loaded until a template
+        uses one of them; all of them share one load.
+
+        :return: A dictionary containing cart context variables:
+                 'current_cart': The Cart object (or None for guests).
+                 'current_cart_items': A list of CartItem objects (auth) or
+                 dicts (guest).
+                 'current_cart_total': The total price of items in the cart
+                 (Decimal).
+                 'current_cart_item_count': The total number of individual
+                 items in the cart (int).
+        :rtype: dict
+        """
+
+        return {
+            'current_cart': SimpleLazyObject(lambda: self.cart),
+            'current_cart_items': SimpleLazyObject(lambda: self.items),
+            'current_cart_total': SimpleLazyObject(lambda: self.total),
+            'current_cart_item_count': SimpleLazyObject(
+                lambda: self.item_count
+            ),
+        }
+
+
+def get_cart_snapshot(request, fresh=False):
+    """
+    Returns the request's cart snapshot, creating it on first use.
+
+    :param request: The HttpRequest object.
+    :type request: django.http.HttpRequest
+    :param fresh: True to require a snapshot loaded from the database
+                  rather than the cached cart summary; a cached snapshot
+                  attached earlier is then replaced.
+    :type fresh: bool
+    :return: The request's snapshot.
+    :rtype: CartSnapshot
+    """
+
+    snapshot = getattr(request, REQUEST_SNAPSHOT_ATTR, None)
+    if snapshot is None or (fresh and snapshot.cached):
+        snapshot = CartSnapshot(request, cached=not fresh)
+        setattr(request, REQUEST_SNAPSHOT_ATTR, snapshot)
+    return snapshot
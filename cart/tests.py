@@ -1,3 +1,591 @@
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import json
+from decimal import Decimal
+from unittest import mock
+from products.models import Product
+from .constants import GUEST_CART_SESSION_ID
+from .context_processors import cart_context
+from .models import Cart, CartItem
+from .quantities import add_to_cart_item
+from .session import SessionCart
+from .signals import merge_session_cart_into_db_cart
 
-# Create your tests here.
+# Query-count tests use a local cache, so cache reads are not counted.
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartContextTests(TestCase):
+    def setUp(self):
+        """
+        Set up a user with a database cart and two products.
+        """
+
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='shopper',
+            password='password'
+        )
+        self.pi = Product.objects.create(name='Pi 5', price=Decimal('80.00'),
+                                         stock_quantity=10)
+        self.case = Product.objects.create(name='Case', price=Decimal('5.50'),
+                                           stock_quantity=10)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.pi, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.case, quantity=2)
+
+    def test_context_is_lazy_and_loaded_once(self):
+        """
+        Test that building the context runs no query and that all values
+        share a single load.
+        """
+
+        request = self.factory.get('/')
+        request.user = self.user
+
+        with self.assertNumQueries(0):
+            context = cart_context(request)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(context['current_cart_item_count'], 3)
+            self.assertEqual(context['current_cart_total'], Decimal('91.00'))
+            self.assertEqual(len(context['current_cart_items']), 2)
+            self.assertEqual(context['current_cart'].user_id, self.user.pk)
+
+    def test_guest_context_reads_session_cart(self):
+        """
+        Test that guest carts are read from the session on first access.
+        """
+
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        request.session = {
+            GUEST_CART_SESSION_ID: {str(self.pi.pk): {'quantity': 2}}
+        }
+
+        with self.assertNumQueries(0):
+            context = cart_context(request)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(context['current_cart_total'], Decimal('160.00'))
+            self.assertEqual(context['current_cart_items'][0]['product'],
+                             self.pi)
+        self.assertIsNone(context['current_cart'] or None)
+
+    def test_remove_from_cart_renders_updated_sidebar(self):
+        """
+        Test that the AJAX sidebar rendered after a removal reflects the
+        updated cart.
+        """
+
+        self.client.login(username='shopper', password='password')
+        response = self.client.post(
+            reverse('remove_from_cart', kwargs={'product_id': self.case.pk}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        html = response.json()['cart_sidebar_html']
+        self.assertIn('Subtotal (1 items)', html)
+        self.assertIn('80.00', html)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartSummaryCacheTests(TestCase):
+    def setUp(self):
+        """
+        Set up a logged-in user with one cart line.
+        """
+
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='shopper',
+            password='password'
+        )
+        self.pi = Product.objects.create(name='Pi 5', price=Decimal('80.00'),
+                                         stock_quantity=10)
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.pi, quantity=1)
+        self.client.login(username='shopper', password='password')
+
+    def get_total(self):
+        """
+        Returns the cart total as seen by a template.
+        """
+
+        request = self.factory.get('/')
+        request.user = self.user
+        return cart_context(request)['current_cart_total']
+
+    def test_summary_is_served_from_cache(self):
+        """
+        Test that a second render reads the summary without queries.
+        """
+
+        self.assertEqual(self.get_total(), Decimal('80.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_total(), Decimal('80.00'))
+
+    def test_add_and_remove_invalidate_summary(self):
+        """
+        Test that adding and removing items drop the cached summary.
+        """
+
+        self.get_total()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('add_to_cart', kwargs={'product_id': self.pi.pk}),
+                {'quantity': 2}
+            )
+        self.assertEqual(self.get_total(), Decimal('240.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('remove_from_cart', kwargs={'product_id': self.pi.pk})
+            )
+        self.assertEqual(self.get_total(), Decimal('0.00'))
+
+    def test_price_change_invalidates_summary(self):
+        """
+        Test that saving a new product price invalidates the summary.
+        """
+
+        self.get_total()
+        self.pi.price = Decimal('70.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pi.save()
+        self.assertEqual(self.get_total(), Decimal('70.00'))
+
+    def test_login_merge_invalidates_summary(self):
+        """
+        Test that merging a guest cart on login drops the user's summary.
+        """
+
+        self.get_total()
+        self.client.logout()
+        session = self.client.session
+        session[GUEST_CART_SESSION_ID] = {str(self.pi.pk): {'quantity': 3}}
+        session.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='shopper', password='password')
+        self.assertEqual(self.get_total(), Decimal('320.00'))
+
+
+class SessionCartMergeTests(TestCase):
+    def setUp(self):
+        """
+        Set up a user and a few products.
+        """
+
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='returning')
+        self.products = [
+            Product.objects.create(name=f'Part {i}', price=Decimal('2.00'),
+                                   stock_quantity=5)
+            for i in range(6)
+        ]
+
+    def merge(self, session_cart):
+        """
+        Runs the login merge for a guest cart and returns the query count.
+        """
+
+        request = self.factory.get('/')
+        request.session = self.client.session
+        request.session[GUEST_CART_SESSION_ID] = session_cart
+        with CaptureQueriesContext(connection) as queries:
+            merge_session_cart_into_db_cart(None, request, self.user)
+        self.assertNotIn(GUEST_CART_SESSION_ID, request.session)
+        return len(queries)
+
+    def quantities(self):
+        """
+        Returns the user's cart quantities by product id.
+        """
+
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list(
+            'product_id', 'quantity'
+        ))
+
+    def test_merge_takes_constant_queries(self):
+        """
+        Test that merging many lines costs as many queries as one line.
+        """
+
+        cart = Cart.objects.create(user=self.user)
+        single = self.merge({str(self.products[0].pk): {'quantity': 1}})
+        CartItem.objects.filter(cart=cart).delete()
+
+        many = self.merge({
+            str(product.pk): {'quantity': 1} for product in self.products
+        })
+        self.assertEqual(many, single)
+        self.assertEqual(len(self.quantities()), 6)
+
+    def test_merge_adds_to_existing_lines_clamped_to_stock(self):
+        """
+        Test that existing lines are increased, new lines created and both
+        clamped to the available stock; invalid lines are skipped.
+        """
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0],
+                                quantity=2)
+        CartItem.objects.create(cart=cart, product=self.products[1],
+                                quantity=1)
+
+        self.merge({
+            str(self.products[0].pk): {'quantity': 2},
+            str(self.products[1].pk): {'quantity': 9},
+            str(self.products[2].pk): {'quantity': 7},
+            '999999': {'quantity': 1},
+            'nonsense': {'quantity': 1},
+        })
+        self.assertEqual(self.quantities(), {
+            self.products[0].pk: 4,
+            self.products[1].pk: 5,
+            self.products[2].pk: 5,
+        })
+
+    def test_merge_drops_inactive_products(self):
+        """
+        Test that guest lines of inactive products are not merged.
+        """
+
+        Product.objects.filter(pk=self.products[0].pk).update(is_active=False)
+        self.merge({
+            str(self.products[0].pk): {'quantity': 1},
+            str(self.products[1].pk): {'quantity': 2},
+        })
+        self.assertEqual(self.quantities(), {self.products[1].pk: 2})
+
+
+class AtomicAddToCartTests(TestCase):
+    def setUp(self):
+        """
+        Set up a user's cart and a product with limited stock.
+        """
+
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='clicker',
+            password='password'
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = Product.objects.create(name='Fan', price=Decimal('4'),
+                                              stock_quantity=5)
+
+    def test_increment_is_a_single_query(self):
+        """
+        Test that adding to an existing line is one conditional UPDATE that
+        returns the new quantity.
+        """
+
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 2),
+                         (2, True))
+        with self.assertNumQueries(1):
+            result = add_to_cart_item(self.cart, self.product, 2)
+        self.assertEqual(result, (4, True))
+
+    def test_stock_limit_is_enforced(self):
+        """
+        Test that additions beyond the stock are refused and report the
+        quantity already in the cart.
+        """
+
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 6),
+                         (0, False))
+        add_to_cart_item(self.cart, self.product, 4)
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 2),
+                         (4, False))
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 4)
+
+    def test_reserved_stock_is_not_available(self):
+        """
+        Test that units held by checkout reservations cannot be added, on
+        both the RETURNING and the ORM path.
+        """
+
+        Product.objects.filter(pk=self.product.pk).update(reserved_quantity=3)
+        self.product.refresh_from_db()
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 3),
+                         (0, False))
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 1),
+                         (1, True))
+        self.assertEqual(add_to_cart_item(self.cart, self.product, 2),
+                         (1, False))
+        with mock.patch('cart.quantities.RETURNING_VENDORS', set()):
+            self.assertEqual(add_to_cart_item(self.cart, self.product, 1),
+                             (2, True))
+            self.assertEqual(add_to_cart_item(self.cart, self.product, 1),
+                             (2, False))
+
+    def test_fallback_without_update_returning(self):
+        """
+        Test the ORM path used on backends without UPDATE ... RETURNING.
+        """
+
+        with mock.patch('cart.quantities.RETURNING_VENDORS', set()):
+            add_to_cart_item(self.cart, self.product, 1)
+            self.assertEqual(add_to_cart_item(self.cart, self.product, 3),
+                             (4, True))
+            self.assertEqual(add_to_cart_item(self.cart, self.product, 3),
+                             (4, False))
+
+    def test_ajax_response_includes_resulting_quantity(self):
+        """
+        Test that the add-to-cart response reports the new quantity.
+        """
+
+        self.client.login(username='clicker', password='password')
+        url = reverse('add_to_cart', kwargs={'product_id': self.product.pk})
+        for expected in (2, 4):
+            response = self.client.post(
+                url, {'quantity': 2}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertEqual(response.json()['quantity'], expected)
+        response = self.client.post(
+            url, {'quantity': 2}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json()['status'], 'error')
+
+
+class CartUpdateViewTests(TestCase):
+    def setUp(self):
+        """
+        Set up products and the update endpoint.
+        """
+
+        cache.clear()
+        self.url = reverse('update_cart')
+        self.user = User.objects.create_user(
+            username='batcher',
+            password='password'
+        )
+        self.pi = Product.objects.create(name='Pi 5', price=Decimal('80.00'),
+                                         stock_quantity=3)
+        self.case = Product.objects.create(name='Case', price=Decimal('5.00'),
+                                           stock_quantity=10)
+        self.fan = Product.objects.create(name='Fan', price=Decimal('4.00'),
+                                          stock_quantity=10)
+
+    def post(self, operations):
+        """
+        Posts operations as JSON.
+        """
+
+        return self.client.post(self.url, json.dumps(operations),
+                                content_type='application/json')
+
+    def test_db_cart_applies_all_operations(self):
+        """
+        Test that one request creates, updates and removes lines, clamps to
+        stock and returns the new summary.
+        """
+
+        self.client.login(username='batcher', password='password')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.case, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.fan, quantity=1)
+
+        response = self.post([
+            {'product_id': self.pi.pk, 'quantity': 5},
+            {'product_id': self.case.pk, 'quantity': 2},
+            {'product_id': self.fan.pk, 'quantity': 0},
+        ])
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['cart']['item_count'], 5)
+        self.assertEqual(data['cart']['total'], '250.00')
+        self.assertEqual(data['adjusted'], [
+            {'product_id': self.pi.pk, 'requested': 5, 'quantity': 3}
+        ])
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.pi.pk: 3, self.case.pk: 2}
+        )
+
+    def test_session_cart_applies_operations(self):
+        """
+        Test that guest carts are updated in the session.
+        """
+
+        response = self.post({'items': [
+            {'product_id': self.case.pk, 'quantity': 2},
+            {'product_id': self.fan.pk, 'quantity': 1},
+        ]})
+        self.assertEqual(response.json()['cart']['total'], '14.00')
+        self.assertEqual(self.client.session[GUEST_CART_SESSION_ID],
+                         [2, self.case.pk, 2, self.fan.pk, 1])
+
+        self.post([{'product_id': self.case.pk, 'quantity': 0}])
+        self.assertEqual(self.client.session[GUEST_CART_SESSION_ID],
+                         [2, self.fan.pk, 1])
+
+    def test_invalid_operations_change_nothing(self):
+        """
+        Test that malformed payloads and unknown products are rejected
+        without applying any operation.
+        """
+
+        self.client.login(username='batcher', password='password')
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(
+            self.post([{'product_id': self.pi.pk, 'quantity': -1}])
+            .status_code, 400
+        )
+        response = self.post([
+            {'product_id': self.pi.pk, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+
+    def test_inactive_products_can_only_be_removed(self):
+        """
+        Test that lines of inactive products cannot be set, but can still
+        be removed.
+        """
+
+        self.client.login(username='batcher', password='password')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.fan, quantity=1)
+        Product.objects.filter(pk=self.fan.pk).update(is_active=False)
+
+        response = self.post([
+            {'product_id': self.case.pk, 'quantity': 1},
+            {'product_id': self.fan.pk, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            f'Product {self.fan.pk} does not exist or is not available.'
+        ])
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.fan.pk: 1}
+        )
+
+        response = self.post([{'product_id': self.fan.pk, 'quantity': 0}])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(cart.items.exists())
+
+class SessionCartTests(TestCase):
+    def test_reads_legacy_format(self):
+        """
+        Test that carts stored in the old dict format are still read,
+        skipping malformed lines.
+        """
+
+        session = {GUEST_CART_SESSION_ID: {
+            '3': {'quantity': 2},
+            '7': {'quantity': 0},
+            'x': {'quantity': 1},
+            '9': 'broken',
+        }}
+        self.assertEqual(SessionCart(session).items(), [(3, 2)])
+
+    def test_changes_are_stored_compactly(self):
+        """
+        Test that changes rewrite the cart as a versioned flat list and
+        that emptying it removes the session key.
+        """
+
+        session = self.client.session
+        session[GUEST_CART_SESSION_ID] = {'3': {'quantity': 2}}
+        cart = SessionCart(session)
+
+        self.assertEqual(cart.add(3, 1), 3)
+        cart.set(5, 4)
+        self.assertEqual(session[GUEST_CART_SESSION_ID], [2, 3, 3, 5, 4])
+        self.assertEqual(SessionCart(session).get(5), 4)
+
+        self.assertTrue(cart.remove(3))
+        self.assertFalse(cart.remove(3))
+        cart.clear()
+        self.assertNotIn(GUEST_CART_SESSION_ID, session)
+
+    def test_guest_add_to_cart_uses_compact_format(self):
+        """
+        Test that the add-to-cart view writes the compact format.
+        """
+
+        product = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                         stock_quantity=3)
+        url = reverse('add_to_cart', kwargs={'product_id': product.pk})
+        self.client.post(url, {'quantity': 1})
+        self.client.post(url, {'quantity': 1})
+        self.assertEqual(self.client.session[GUEST_CART_SESSION_ID],
+                         [2, product.pk, 2])
+
+
+class PurgeStaleCartsTests(TestCase):
+    def setUp(self):
+        """
+        Set up active, abandoned and user-less carts.
+        """
+
+        product = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                         stock_quantity=3)
+        long_ago = timezone.now() - timedelta(days=45)
+        self.active = Cart.objects.create(
+            user=User.objects.create_user(username='active')
+        )
+        self.abandoned = Cart.objects.create(
+            user=User.objects.create_user(username='gone')
+        )
+        self.userless = Cart.objects.create()
+        for cart in (self.active, self.abandoned, self.userless):
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        Cart.objects.filter(pk=self.abandoned.pk).update(updated_on=long_ago)
+
+    def test_purges_abandoned_carts_and_expired_sessions(self):
+        """
+        Test that abandoned carts, their items and expired sessions are
+        deleted in batches while active data is kept.
+        """
+
+        now = timezone.now()
+        Session.objects.create(session_key='old', session_data='',
+                               expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='new', session_data='',
+                               expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        with self.assertLogs('cart.management.commands.purge_stale_carts',
+                             level='INFO') as logs:
+            call_command('purge_stale_carts', '--batch-size=1', stdout=out)
+
+        self.assertEqual(list(Cart.objects.all()), [self.active])
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            ['new']
+        )
+        self.assertIn('Deleted 2 carts (2 items) and 1 expired sessions',
+                      out.getvalue())
+        self.assertIn('Purged 2 stale carts (2 items)', logs.output[0])
+
+    def test_cart_activity_is_recorded(self):
+        """
+        Test that using an old cart refreshes its activity timestamp so it
+        is not purged.
+        """
+
+        Cart.for_user(self.abandoned.user)
+        call_command('purge_stale_carts', stdout=StringIO())
+        self.assertTrue(Cart.objects.filter(pk=self.abandoned.pk).exists())
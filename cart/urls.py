@@ -6,7 +6,7 @@ cart views (e.g., adding or removing items from the cart).
 """
 
 from django.urls import path
-from .views import AddToCartView, RemoveFromCartView
+from .views import AddToCartView, RemoveFromCartView, CartUpdateView
 
 # Define the URL patterns for the cart app
 urlpatterns = [
@@ -16,4 +16,6 @@ urlpatterns = [
     # URL pattern for removing a product from the cart
     path('remove/<int:product_id>/', RemoveFromCartView.as_view(),
          name='remove_from_cart'),
+    # JSON endpoint for updating several cart lines at once
+    path('update/', CartUpdateView.as_view(), name='update_cart'),
 ]
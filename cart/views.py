@@ -9,6 +9,8 @@ guest users (session-backed carts), and handles both standard HTTP requests
 and AJAX requests.
 """
 
+import json
+from django.db import transaction
 from django.shortcuts import redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.http import JsonResponse
@@ -16,8 +18,11 @@ from django.views import View
 from django.contrib import messages
 from .models import Cart, CartItem
 from products.models import Product
+from .cache import invalidate_cart_summary
 from .context_processors import cart_context
-from .constants import GUEST_CART_SESSION_ID
+from .snapshot import get_cart_snapshot
+from .quantities import add_to_cart_item
+from .session import SessionCart
 
 
 class AddToCartView(View):
@@ -69,7 +74,7 @@ class AddToCartView(View):
         except (ValueError, TypeError):
             quantity_to_add = 1
 
-        if product.stock_quantity == 0:
+        if product.available_quantity == 0:
             message = f"Sorry, {product.name} is out of stock."
             messages.error(request, message)
             if is_ajax:
@@ -81,10 +86,10 @@ class AddToCartView(View):
                 return redirect(
                     request.META.get('HTTP_REFERER', 'product_list'))
 
-        if quantity_to_add > product.stock_quantity:
+        if quantity_to_add > product.available_quantity:
             message = (
                 f"Cannot add {quantity_to_add} x {product.name}. "
-                f"Only {product.stock_quantity} available."
+                f"Only {product.available_quantity} available."
             )
             messages.error(request, message)
             if is_ajax:
@@ -96,12 +101,15 @@ class AddToCartView(View):
                 return redirect(
                     request.META.get('HTTP_REFERER', 'product_list'))
 
-        success = False
         if request.user.is_authenticated:
-            success = self._add_to_db_cart(request, product, quantity_to_add)
+            quantity_in_cart = self._add_to_db_cart(request, product,
+                                                    quantity_to_add)
         else:
-            success = self._add_to_session_cart(request, product,
-                                                quantity_to_add)
+            quantity_in_cart = self._add_to_session_cart(request, product,
+                                                         quantity_to_add)
+        success = quantity_in_cart is not None
+        if success:
+            invalidate_cart_summary(request)
 
         if is_ajax:
             if success:
@@ -112,6 +120,7 @@ class AddToCartView(View):
                 messages_html = render_to_string('partials/messages.html', {},
                                                  request=request)
                 return JsonResponse({'status': 'success',
+                                     'quantity': quantity_in_cart,
                                      'cart_sidebar_html': cart_sidebar_html,
                                      'messages_html': messages_html})
             else:
@@ -126,13 +135,14 @@ class AddToCartView(View):
 
     def _add_to_db_cart(self, request, product, quantity_to_add):
         """
-        Adds or updates a product quantity in the database cart for an
-        authenticated user.
+        Adds a product quantity to the database cart for an authenticated
+        user.
 
-        Retrieves or creates the user's cart and the specific cart item.
-        Checks if adding the requested quantity exceeds the product's
-        available stock, considering items already in the cart. Updates the
-        quantity if valid, otherwise adds an error message.
+        Retrieves or creates the user's cart, then adds the quantity with
+        `add_to_cart_item`, which increments the line in one conditional
+        UPDATE that also checks the product's available stock, so
+        concurrent requests cannot lose updates or exceed the stock. Adds
+        an error message if the stock does not allow the addition.
 
         :param request: The HttpRequest object, used for adding messages.
         :type request: django.http.HttpRequest
@@ -140,23 +150,18 @@ class AddToCartView(View):
         :type product: products.models.Product
         :param quantity_to_add: The quantity of the product to add.
         :type quantity_to_add: int
-        :return: True if the item was successfully added or updated, False
-        otherwise.
-        :rtype: bool
+        :return: The resulting quantity in the cart if the item was
+        successfully added, None otherwise.
+        :rtype: Optional[int]
         """
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': 0}
-        )
-
-        current_quantity_in_cart = cart_item.quantity
-        requested_total_quantity = current_quantity_in_cart + quantity_to_add
-        available_stock = product.stock_quantity
+        cart = Cart.for_user(request.user)
+        quantity_in_cart, added = add_to_cart_item(cart, product,
+                                                   quantity_to_add)
 
-        if requested_total_quantity > available_stock:
+        if not added:
+            current_quantity_in_cart = quantity_in_cart
+            available_stock = product.available_quantity
             can_add = available_stock - current_quantity_in_cart
             if can_add > 0:
                 message = (
@@ -178,18 +183,11 @@ class AddToCartView(View):
                 )
 
             messages.error(request, message)
-            return False
-
-        cart_item.quantity += quantity_to_add
-        cart_item.save()
+            return None
 
-        if created or quantity_to_add > 0:
-            message = f'Added {quantity_to_add} x {product.name} to your cart.'
-            messages.success(request, message)
-        elif not created and quantity_to_add > 0:
-            message = f'Updated quantity for {product.name} in your cart.'
-            messages.success(request, message)
-        return True
+        message = f'Added {quantity_to_add} x {product.name} to your cart.'
+        messages.success(request, message)
+        return quantity_in_cart
 
     def _add_to_session_cart(self, request, product, quantity_to_add):
         """
@@ -208,17 +206,15 @@ class AddToCartView(View):
         :type product: products.models.Product
         :param quantity_to_add: The quantity of the product to add.
         :type quantity_to_add: int
-        :return: True if the item was successfully added or updated, False
-        otherwise.
-        :rtype: bool
+        :return: The resulting quantity in the cart if the item was
+        successfully added or updated, None otherwise.
+        :rtype: Optional[int]
         """
 
-        guest_cart = request.session.setdefault(GUEST_CART_SESSION_ID, {})
-        product_id_str = str(product.id)
-        current_quantity_in_cart = guest_cart.get(product_id_str, {}).get(
-            'quantity', 0)
+        guest_cart = SessionCart(request.session)
+        current_quantity_in_cart = guest_cart.get(product.id)
         requested_total_quantity = current_quantity_in_cart + quantity_to_add
-        available_stock = product.stock_quantity
+        available_stock = product.available_quantity
 
         if requested_total_quantity > available_stock:
             can_add = available_stock - current_quantity_in_cart
@@ -242,19 +238,15 @@ class AddToCartView(View):
                 )
 
             messages.error(request, message)
-            return False
+            return None
 
-        if product_id_str in guest_cart:
-            guest_cart[product_id_str]['quantity'] += quantity_to_add
+        if current_quantity_in_cart:
             message = f'Updated quantity for {product.name} in your cart.'
-            messages.success(request, message)
         else:
-            guest_cart[product_id_str] = {'quantity': quantity_to_add}
             message = f'Added {quantity_to_add} x {product.name} to your cart.'
-            messages.success(request, message)
+        messages.success(request, message)
 
-        request.session.modified = True
-        return True
+        return guest_cart.add(product.id, quantity_to_add)
 
 
 class RemoveFromCartView(View):
@@ -298,6 +290,7 @@ class RemoveFromCartView(View):
             product_name = self._remove_from_session_cart(
                 request, product_id
             ) or product_name
+        invalidate_cart_summary(request)
 
         if product_name != 'Item':
             messages.success(request,
@@ -371,8 +364,7 @@ class RemoveFromCartView(View):
         :rtype: Optional[str]
         """
 
-        guest_cart = request.session.get(GUEST_CART_SESSION_ID, {})
-        product_id_str = str(product_id)
+        guest_cart = SessionCart(request.session)
         product_name_for_message = None
 
         try:
@@ -381,11 +373,222 @@ class RemoveFromCartView(View):
         except Product.DoesNotExist:
             product_name_for_message = 'Item'
 
-        if product_id_str in guest_cart:
-            del guest_cart[product_id_str]
-            request.session.modified = True
+        if guest_cart.remove(product_id):
             return product_name_for_message
         else:
             message = f'{product_name_for_message} was not found in your cart.'
             messages.warning(request, message)
             return None
+
+
+class CartUpdateView(View):
+    """
+    JSON endpoint that sets the quantities of several cart lines at once.
+
+    The request body is a JSON list of `{"product_id": ..., "quantity": ...}`
+    operations (or an object with that list under "items"). Each operation
+    sets the line's quantity; 0 removes the line. Lines can only be set for
+    existing, active products (any line can be removed). Quantities above
+    the available stock are clamped and reported. All operations are applied
+    together with a single product lookup, for database carts in one
+    transaction, and the response carries the new cart summary and sidebar
+    HTML so the front end can update without reloading the page.
+    """
+
+    max_operations = 100
+
+    def post(self, request, *args, **kwargs):
+        """
+        Process the POST request to apply the cart operations.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: A JsonResponse with the new cart summary, or the errors
+        with status 400 if the operations are invalid.
+        :rtype: django.http.JsonResponse
+        """
+
+        try:
+            operations = self._parse_operations(request.body)
+        except ValueError as error:
+            return JsonResponse({'status': 'error', 'errors': [str(error)]},
+                                status=400)
+
+        products = Product.objects.filter(is_active=True).only(
+            'pk', 'name', 'stock_quantity', 'reserved_quantity'
+        ).in_bulk(list(operations))
+        unavailable = sorted(
+            product_id for product_id, requested in operations.items()
+            if requested and product_id not in products
+        )
+        if unavailable:
+            errors = [f'Product {pk} does not exist or is not available.'
+                      for pk in unavailable]
+            return JsonResponse({'status': 'error', 'errors': errors},
+                                status=400)
+
+        quantities = {}
+        adjusted = []
+        for product_id, requested in operations.items():
+            if not requested:
+                quantities[product_id] = 0
+                continue
+            quantity = min(requested,
+                           products[product_id].available_quantity)
+            quantities[product_id] = quantity
+            if quantity != requested:
+                adjusted.append({'product_id': product_id,
+                                 'requested': requested,
+                                 'quantity': quantity})
+
+        if request.user.is_authenticated:
+            self._update_db_cart(request, quantities)
+        else:
+            self._update_session_cart(request, quantities)
+        invalidate_cart_summary(request)
+
+        contents = get_cart_snapshot(request)
+        cart_sidebar_html = render_to_string(
+            'cart/partials/cart_sidebar.html', contents.as_context(),
+            request=request)
+        return JsonResponse({
+            'status': 'success',
+            'cart': self._serialize(contents),
+            'adjusted': adjusted,
+            'cart_sidebar_html': cart_sidebar_html,
+        })
+
+    def _parse_operations(self, body):
+        """
+        Parses and validates the JSON operations.
+
+        Later operations for the same product replace earlier ones.
+
+        :param body: The raw request body.
+        :type body: bytes
+        :return: The requested quantities by product id.
+        :rtype: dict[int, int]
+        :raises ValueError: If the body is not a valid list of operations.
+        """
+
+        try:
+            data = json.loads(body or b'null')
+        except (TypeError, ValueError):
+            raise ValueError('The request body must be JSON.')
+
+        if isinstance(data, dict):
+            data = data.get('items')
+        if not isinstance(data, list) or not data:
+            raise ValueError('Expected a non-empty list of operations.')
+        if len(data) > self.max_operations:
+            raise ValueError(
+                f'At most {self.max_operations} operations are allowed.'
+            )
+
+        operations = {}
+        for operation in data:
+            try:
+                product_id = int(operation['product_id'])
+                quantity = int(operation['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(
+                    'Each operation needs an integer product_id and '
+                    'quantity.'
+                )
+            if quantity < 0:
+                raise ValueError('Quantities cannot be negative.')
+            operations[product_id] = quantity
+        return operations
+
+    def _update_db_cart(self, request, quantities):
+        """
+        Applies the quantities to an authenticated user's database cart.
+
+        Uses one query for the existing lines and at most one bulk insert,
+        one bulk update and one delete, all in one transaction.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param quantities: The new (stock-clamped) quantities by product id.
+        :type quantities: dict[int, int]
+        """
+
+        with transaction.atomic():
+            cart = Cart.for_user(request.user)
+            existing_items = {
+                item.product_id: item
+                for item in CartItem.objects.filter(
+                    cart=cart, product_id__in=list(quantities)
+                )
+            }
+
+            items_to_create = []
+            items_to_update = []
+            items_to_delete = []
+            for product_id, quantity in quantities.items():
+                cart_item = existing_items.get(product_id)
+                if quantity == 0:
+                    if cart_item is not None:
+                        items_to_delete.append(cart_item.pk)
+                elif cart_item is None:
+                    items_to_create.append(CartItem(
+                        cart=cart, product_id=product_id, quantity=quantity
+                    ))
+                elif cart_item.quantity != quantity:
+                    cart_item.quantity = quantity
+                    items_to_update.append(cart_item)
+
+            CartItem.objects.bulk_create(items_to_create)
+            CartItem.objects.bulk_update(items_to_update, ['quantity'])
+            if items_to_delete:
+                CartItem.objects.filter(pk__in=items_to_delete).delete()
+
+    def _update_session_cart(self, request, quantities):
+        """
+        Applies the quantities to a guest's session cart.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param quantities: The new (stock-clamped) quantities by product id.
+        :type quantities: dict[int, int]
+        """
+
+        guest_cart = SessionCart(request.session)
+        for product_id, quantity in quantities.items():
+            guest_cart.set(product_id, quantity)
+
+    def _serialize(self, contents):
+        """
+        Converts the cart contents into the JSON cart summary.
+
+        :param contents: The current cart contents.
+        :type contents: cart.snapshot.CartSnapshot
+        :return: The item count, total and lines of the cart.
+        :rtype: dict
+        """
+
+        lines = []
+        for item in contents.items:
+            if isinstance(item, CartItem):
+                product = item.product
+                quantity = item.quantity
+                total_price = item.total_price()
+            else:
+                product = item['product']
+                quantity = item['quantity']
+                total_price = item['total_price']
+            lines.append({
+                'product_id': product.pk,
+                'name': product.name,
+                'quantity': quantity,
+                'price': str(product.price),
+                'total_price': str(total_price),
+            })
+
+        return {
+            'item_count': contents.item_count,
+            'total': str(contents.total),
+            'items': lines,
+        }
@@ -735,7 +735,8 @@ class DashboardReviewListView(ListView):
     Displays a paginated list of product reviews for management.
 
     Allows filtering reviews by approval status (pending, approved, all)
-    and sorting by creation date, rating, product, or user. Includes
+    and sorting by creation date, rating, stored sentiment score, product,
+    or user. Includes
     functionality for approving/unapproving reviews.
     """
 
@@ -770,6 +771,8 @@ class DashboardReviewListView(ListView):
             '-created_on',
             'rating',
             '-rating',
+            'sentiment_score',
+            '-sentiment_score',
             'product__name',
             'user__username'
         ]
@@ -819,8 +822,9 @@ class DashboardReviewToggleApprovalView(View):
         Processes the POST request to toggle a review's approval status.
 
         Retrieves the review, flips its `is_approved` status, saves
-        the change, and redirects back to the review list with appropriate
-        query parameters.
+        the change (the product's rating aggregates are refreshed in the
+        same transaction), and redirects back to the review list with
+        appropriate query parameters.
 
         :param request: The HttpRequest object.
         :type request: django.http.HttpRequest
@@ -833,8 +837,9 @@ class DashboardReviewToggleApprovalView(View):
 
         review_pk = kwargs.get('pk')
         review = get_object_or_404(Review, pk=review_pk)
-        review.is_approved = not review.is_approved
-        review.save(update_fields=['is_approved', 'updated_on'])
+        with transaction.atomic():
+            review.is_approved = not review.is_approved
+            review.save(update_fields=['is_approved', 'updated_on'])
         action = 'approved' if review.is_approved else 'unapproved'
         message = (
             f'Review for "{review.product.name}" '
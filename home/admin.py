@@ -1,3 +1,30 @@
+"""
+Django admin configurations for the home application models.
+
+Registers the EmailOutbox model so queued and failed emails can be
+inspected.
+"""
+
 from django.contrib import admin
+from .models import EmailOutbox
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the EmailOutbox model.
+
+    Read-only except for the status, so failed emails can be set back to
+    pending once the cause is fixed.
+    """
+
+    list_display = ['subject', 'status', 'attempts', 'created_on',
+                    'sent_on']
+    list_filter = ['status']
+    search_fields = ['subject']
+    readonly_fields = ['subject', 'body', 'html_body', 'from_email', 'to',
+                       'attempts', 'last_error', 'next_attempt_at',
+                       'created_on', 'sent_on']
 
-# Register your models here.
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,73 @@
+"""
+Management command to deliver queued emails.
+
+Usage: python manage.py send_queued_emails [--batch-size 50]
+                                          [--interval 10]
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from home.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    """
+    Sends due `EmailOutbox` rows in claimed batches over one backend
+    connection per batch, within the per-minute rate cap, and records
+    their delivery state.
+
+    Emails left over by the rate cap, rescheduled after a failed attempt
+    or claimed by a stopped worker are sent by a later run, so the command
+    must run continuously: with `--interval` it keeps polling the outbox
+    (the `mailer` process of the Procfile).
+    """
+
+    help = 'Sends queued emails in rate-limited batches.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails sent per connection.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, polling the outbox every this many seconds '
+                 '(0 sends the pending emails once).'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        interval = options['interval']
+
+        while True:
+            totals = send_queued_emails(batch_size=batch_size)
+            if not interval or totals['sent'] or totals['failed']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {totals['sent']} emails ({totals['failed']} "
+                    f"failed, {totals['deferred']} deferred by the rate "
+                    f"limit)."
+                ))
+            if not interval:
+                return
+            time.sleep(interval)
+            # Long-running workers must not keep broken or expired
+            # database connections between polls.
+            close_old_connections()
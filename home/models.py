@@ -1,3 +1,77 @@
+"""
+Database models for the home application.
+
+Defines the outgoing email queue (`EmailOutbox`) shared by the site's
+features, with choices for delivery state (`EmailStatus`).
+"""
+
 from django.db import models
+from django.utils import timezone
+
+
+class EmailStatus(models.TextChoices):
+    """
+    Defines the delivery states of a queued email.
+    """
+
+    PENDING = 'PENDING', 'Pending'
+    SENDING = 'SENDING', 'Sending'
+    SENT = 'SENT', 'Sent'
+    FAILED = 'FAILED', 'Failed'
+
+
+class EmailOutbox(models.Model):
+    """
+    An email queued for delivery by the `send_queued_emails` command.
+
+    Requests only add rows here (see `home.outbox.queue_email`), so they
+    never wait for the mail server.
+
+    :param subject: The subject line.
+    :param body: The plain text body.
+    :param html_body: An HTML alternative of the body (optional).
+    :param from_email: The sender address.
+    :param to: The list of recipient addresses.
+    :param status: The delivery state (from EmailStatus choices).
+    :param attempts: The number of failed delivery attempts.
+    :param last_error: The error of the last failed attempt.
+    :param next_attempt_at: When a pending email is due, or when the claim
+                            of an email being sent expires.
+    :param created_on: Timestamp when the email was queued.
+    :param sent_on: Timestamp when the email was delivered to the backend.
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=EmailStatus.choices,
+                              default=EmailStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_on = models.DateTimeField(default=timezone.now)
+    sent_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Metadata options for the EmailOutbox model.
+        """
+
+        verbose_name_plural = 'email outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='email_outbox_queue_idx'),
+            models.Index(fields=['sent_on'], name='email_outbox_sent_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Returns the string representation of the queued email.
+
+        :return: A string showing the subject and recipients.
+        :rtype: str
+        """
 
-# Create your models here.
+        return f"{self.subject} to {', '.join(self.to)}"
@@ -0,0 +1,258 @@
+"""
+Queued delivery of outgoing email.
+
+Features queue messages with `queue_email` inside the request; the
+`send_queued_emails` command delivers them in batches. Each batch is
+claimed in a short transaction (marked as sending for `CLAIM_DURATION`)
+and then sent outside of it, reusing one backend connection (one SMTP
+session in production), so no database locks are held while the mail
+server responds. Deliveries are capped per minute with the
+`EMAIL_OUTBOX_RATE_PER_MINUTE` setting, and every message records whether
+and when it was sent. Failed messages are retried with exponential backoff
+and marked failed after `get_max_attempts()` attempts; claims of a worker
+that died while sending expire and are picked up again.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import EmailOutbox, EmailStatus
+
+DEFAULT_RATE_PER_MINUTE = 60
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60
+MAX_RETRY_DELAY = 60 * 60 * 6
+CLAIM_DURATION = timedelta(minutes=5)
+
+
+def get_rate_per_minute():
+    """
+    Returns how many emails may be sent per minute.
+
+    Configurable with the `EMAIL_OUTBOX_RATE_PER_MINUTE` setting.
+
+    :return: The rate cap.
+    :rtype: int
+    """
+
+    return getattr(settings, 'EMAIL_OUTBOX_RATE_PER_MINUTE',
+                   DEFAULT_RATE_PER_MINUTE)
+
+
+def get_max_attempts():
+    """
+    Returns how often delivery is attempted before an email is marked
+    failed.
+
+    Configurable with the `EMAIL_OUTBOX_MAX_ATTEMPTS` setting.
+
+    :return: The maximum number of attempts.
+    :rtype: int
+    """
+
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS',
+                   DEFAULT_MAX_ATTEMPTS)
+
+
+def get_retry_delay(attempts):
+    """
+    Returns how long to wait before retrying a failed delivery.
+
+    The delay doubles with every failed attempt, starting from the
+    `EMAIL_OUTBOX_RETRY_DELAY` setting (in seconds), up to
+    `MAX_RETRY_DELAY`.
+
+    :param attempts: The number of failed attempts so far.
+    :return: The delay before the next attempt.
+    :rtype: datetime.timedelta
+    """
+
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return timedelta(
+        seconds=min(base * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+    )
+
+
+def queue_email(subject, body, to, from_email=None, html_body=''):
+    """
+    Queues an email for delivery by the outbox worker.
+
+    :param subject: The subject line.
+    :param body: The plain text body.
+    :param to: The recipient addresses.
+    :type to: list[str]
+    :param from_email: The sender; `DEFAULT_FROM_EMAIL` if omitted.
+    :param html_body: An HTML alternative of the body (optional).
+    :return: The queued email.
+    :rtype: home.models.EmailOutbox
+    """
+
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def build_message(email, connection):
+    """
+    Builds the message to send for a queued email.
+
+    :param email: The queued email.
+    :type email: home.models.EmailOutbox
+    :param connection: The backend connection the message is sent with.
+    :return: The message.
+    :rtype: django.core.mail.EmailMultiAlternatives
+    """
+
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _record_failure(email, error, max_attempts):
+    """
+    Records a failed delivery attempt on a queued email.
+
+    The email is rescheduled with backoff, or marked failed once it
+    reached the maximum number of attempts.
+
+    :param email: The queued email.
+    :param error: The exception raised by the backend.
+    :param max_attempts: The attempts after which the email is given up.
+    :return: True if the email is now marked failed.
+    :rtype: bool
+    """
+
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= max_attempts:
+        email.status = EmailStatus.FAILED
+        return True
+    email.status = EmailStatus.PENDING
+    email.next_attempt_at = timezone.now() + get_retry_delay(email.attempts)
+    return False
+
+
+def _claim_batch(size):
+    """
+    Claims up to `size` due emails for sending, oldest first.
+
+    Pending emails that are due and emails whose claim expired are locked
+    (skipping emails locked by a concurrent worker), marked as sending
+    until the claim expires and returned. Must run in a transaction.
+
+    :param size: Maximum number of emails to claim.
+    :return: The claimed emails.
+    :rtype: list[home.models.EmailOutbox]
+    """
+
+    now = timezone.now()
+    batch = list(
+        EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            status__in=[EmailStatus.PENDING, EmailStatus.SENDING],
+            next_attempt_at__lte=now,
+        ).order_by('created_on', 'pk')[:size]
+    )
+    for email in batch:
+        email.status = EmailStatus.SENDING
+        email.next_attempt_at = now + CLAIM_DURATION
+    EmailOutbox.objects.bulk_update(batch, ['status', 'next_attempt_at'])
+    return batch
+
+
+def _send_batch(batch, max_attempts):
+    """
+    Sends claimed emails over one backend connection and records the
+    outcome on each of them (without saving).
+
+    :param batch: The claimed emails.
+    :param max_attempts: The attempts after which an email is given up.
+    :return: The number of sent and failed emails.
+    :rtype: tuple[int, int]
+    """
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            failed += _record_failure(email, e, max_attempts)
+        return sent, failed
+
+    try:
+        for email in batch:
+            # One message per call records each delivery separately; the
+            # open connection is reused.
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                failed += _record_failure(email, e, max_attempts)
+            else:
+                email.status = EmailStatus.SENT
+                email.sent_on = timezone.now()
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def send_queued_emails(batch_size=50):
+    """
+    Sends due emails, oldest first, in batches.
+
+    Each batch is claimed in its own short transaction, sent over one
+    backend connection without holding any lock, and its delivery state
+    is stored with one `bulk_update`. Sending stops once the per-minute
+    rate cap (counting emails sent or being sent) is reached; the rest
+    waits for the next run. Rescheduled emails are not due again during
+    the same run.
+
+    :param batch_size: Number of emails sent per connection.
+    :return: The number of sent and failed emails, and of due emails left
+             queued because of the rate cap.
+    :rtype: dict[str, int]
+    """
+
+    rate = get_rate_per_minute()
+    max_attempts = get_max_attempts()
+    totals = {'sent': 0, 'failed': 0, 'deferred': 0}
+
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            in_flight = EmailOutbox.objects.filter(
+                Q(status=EmailStatus.SENT,
+                  sent_on__gt=now - timedelta(minutes=1))
+                | Q(status=EmailStatus.SENDING, next_attempt_at__gt=now)
+            ).count()
+            allowance = min(batch_size, rate - in_flight)
+            if allowance <= 0:
+                totals['deferred'] = EmailOutbox.objects.filter(
+                    status__in=[EmailStatus.PENDING, EmailStatus.SENDING],
+                    next_attempt_at__lte=now,
+                ).count()
+                return totals
+            batch = _claim_batch(allowance)
+        if not batch:
+            return totals
+
+        sent, failed = _send_batch(batch, max_attempts)
+        totals['sent'] += sent
+        totals['failed'] += failed
+        EmailOutbox.objects.bulk_update(batch, [
+            'status', 'attempts', 'last_error', 'next_attempt_at', 'sent_on',
+        ])
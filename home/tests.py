@@ -2,14 +2,24 @@
 Unit tests for the RaspiMobile 'home' application.
 
 This module contains test cases for the views (`HomeView`, `AboutView`)
-and potentially forms or other components within the home app, ensuring
-they function as expected under various conditions.
+and the email outbox within the home app, ensuring they function as
+expected under various conditions.
 """
 
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.messages import get_messages
 from .forms import ContactForm
+from .models import EmailOutbox, EmailStatus
+from .outbox import queue_email, send_queued_emails
 
 
 class HomeViewTests(TestCase):
@@ -162,3 +172,106 @@ class AboutViewTests(TestCase):
         self.assertEqual(messages[0].level_tag, 'error')
         self.assertIn('Please correct the errors below', str(messages[0]))
         self.assertContains(response, 'Please correct the errors below')
+
+    def test_about_view_post_valid_data_queues_email(self):
+        """
+        Test POSTing valid data queues the email instead of sending it.
+        """
+
+        self.client.post(self.about_url, data=self.valid_data)
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertIn('Test Subject', email.subject)
+        self.assertIn('This is a test message.', email.body)
+
+
+class EmailOutboxTests(TestCase):
+    def queue(self, count):
+        """
+        Queues a number of emails.
+        """
+
+        for index in range(count):
+            queue_email(f'Order {index}', 'Thanks!', ['buyer@example.com'],
+                        html_body='<p>Thanks!</p>')
+
+    def test_worker_sends_batches_over_one_connection(self):
+        """
+        Test that the worker sends each batch over one connection and
+        records the delivery.
+        """
+
+        self.queue(5)
+        with mock.patch('home.outbox.get_connection',
+                        wraps=mail.get_connection) as get_connection:
+            out = StringIO()
+            call_command('send_queued_emails', '--batch-size', '2',
+                         stdout=out)
+
+        self.assertIn('Sent 5 emails', out.getvalue())
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Order 0')
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(EmailOutbox.objects.exclude(
+            status=EmailStatus.SENT, sent_on__isnull=False
+        ).exists())
+
+    @override_settings(EMAIL_OUTBOX_RATE_PER_MINUTE=2)
+    def test_worker_respects_rate_cap(self):
+        """
+        Test that no more emails are sent per minute than the rate cap.
+        """
+
+        self.queue(3)
+        self.assertEqual(send_queued_emails(),
+                         {'sent': 2, 'failed': 0, 'deferred': 1})
+        self.assertEqual(send_queued_emails(),
+                         {'sent': 0, 'failed': 0, 'deferred': 1})
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+                       EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        """
+        Test that failed deliveries are rescheduled with backoff, retried
+        once due and marked failed after the maximum number of attempts.
+        """
+
+        self.queue(1)
+        with mock.patch.object(EmailBackend, 'send_messages',
+                               side_effect=SMTPException('mailbox full')):
+            self.assertEqual(send_queued_emails()['failed'], 0)
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.status, EmailStatus.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at,
+                               timezone.now() + timedelta(seconds=50))
+            self.assertEqual(send_queued_emails(),
+                             {'sent': 0, 'failed': 0, 'deferred': 0})
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(send_queued_emails()['failed'], 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.FAILED)
+        self.assertEqual(email.last_error, 'SMTPException: mailbox full')
+        self.assertEqual(send_queued_emails()['sent'], 0)
+
+    def test_expired_claims_are_sent_again(self):
+        """
+        Test that emails claimed by a worker that stopped while sending
+        are only picked up again once the claim expired.
+        """
+
+        self.queue(1)
+        EmailOutbox.objects.update(
+            status=EmailStatus.SENDING,
+            next_attempt_at=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(send_queued_emails()['sent'], 0)
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails()['sent'], 1)
+        self.assertEqual(EmailOutbox.objects.get().status, EmailStatus.SENT)
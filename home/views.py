@@ -9,15 +9,13 @@ from django.views.generic import TemplateView
 from django.views.generic.edit import FormMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.shortcuts import redirect
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 
 from products.models import Product
-from django.db.models import Avg, Q
-from django.db.models.functions import Coalesce
 from .forms import ContactForm
+from .outbox import queue_email
 
 
 class HomeView(TemplateView):
@@ -34,8 +32,8 @@ class HomeView(TemplateView):
         """
         Adds featured and best-rated products to the template context.
 
-        Filters active, in-stock products, excluding placeholders, calculates
-        average ratings, and selects top products based on criteria.
+        Filters active, in-stock products, excluding placeholders, and selects
+        top products based on their stored rating aggregates.
 
         :param kwargs: Keyword arguments passed to the view.
         :return: Context dictionary with 'featured_products' and
@@ -49,18 +47,15 @@ class HomeView(TemplateView):
             stock_quantity__gt=0
         ).exclude(
             image='placeholder'
-        ).annotate(
-            calculated_average_rating=Avg('reviews__rating',
-                                          filter=Q(reviews__is_approved=True))
         )
         featured_products = base_queryset.filter(is_featured=True)[:3]
         featured_pks = list(featured_products.values_list('pk', flat=True))
         best_rated_products = base_queryset.exclude(
             pk__in=featured_pks
         ).filter(
-            calculated_average_rating__isnull=False
+            rating_count__gt=0
         ).order_by(
-            Coalesce('calculated_average_rating', 0).desc()
+            '-rating_avg', '-created_on'
         )[:2]
 
         context['featured_products'] = featured_products
@@ -117,11 +112,12 @@ class AboutView(FormMixin, TemplateView):
 
     def form_valid(self, form):
         """
-        Processes the valid contact form data, sends an email, and redirects.
+        Processes the valid contact form data, queues an email, and redirects.
 
-        Extracts cleaned data, formats an email message, attempts to send it
-        using settings-defined credentials, adds a success message, and
-        redirects to the success_url.
+        Extracts cleaned data, formats an email message, queues it for the
+        outbox worker (see `home.outbox`) so the request does not wait for
+        the mail server, adds a success message, and redirects to the
+        success_url.
 
         :param form: The validated instance of ContactForm.
         :type form: ContactForm
@@ -145,12 +141,11 @@ class AboutView(FormMixin, TemplateView):
         admin_email = settings.EMAIL_HOST_USER
 
         try:
-            send_mail(
+            queue_email(
                 subject=email_subject,
-                message=email_message,
+                body=email_message,
                 from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[admin_email, ],
-                fail_silently=False,
+                to=[admin_email, ],
             )
             message = (
                 'Thank you for your message! We will get back to you soon.'
@@ -1,13 +1,19 @@
 """
 Django admin configurations for the orders application models.
 
-Registers the Order, OrderItem, and DeliveryMethod models with the Django
-admin site, providing customized interfaces for managing order and
-delivery data.
+Registers the Order, OrderItem, DeliveryMethod, StockReservation and
+WebhookEvent models with the Django admin site, providing customized
+interfaces for managing order and delivery data.
 """
 
 from django.contrib import admin
-from .models import Order, OrderItem, DeliveryMethod
+from .models import (
+    DeliveryMethod,
+    Order,
+    OrderItem,
+    StockReservation,
+    WebhookEvent,
+)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -104,3 +110,47 @@ class DeliveryMethodAdmin(admin.ModelAdmin):
     list_display = ['name', 'price', 'is_active']
     list_filter = ['is_active']
     search_fields = ['name', 'description']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the StockReservation model.
+
+    Read-only, since holds must change together with the products'
+    reserved quantities (see `orders.reservations`).
+    """
+
+    list_display = ['product', 'quantity', 'holder', 'expires_at']
+    list_select_related = ['product']
+    search_fields = ['holder', 'product__name']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the WebhookEvent model.
+
+    Read-only except for the retry schedule, so failed events can be
+    inspected and, once the cause is fixed, set back to pending.
+    """
+
+    list_display = ['event_id', 'event_type', 'status', 'attempts',
+                    'next_attempt_at', 'received_on']
+    list_filter = ['status', 'provider', 'event_type']
+    search_fields = ['event_id']
+    readonly_fields = ['provider', 'event_id', 'event_type', 'payload',
+                       'attempts', 'last_error', 'received_on',
+                       'processed_on']
+
+    def has_add_permission(self, request):
+        return False
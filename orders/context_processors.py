@@ -15,8 +15,8 @@ def order_history_context(request):
 
     Fetches the latest 10 orders for the authenticated user and prepares a list
     of dictionaries containing key order details (number, date, status display,
-    status icon/color, confirmation URL) for easy display in templates
-    (e.g., sidebar).
+    status icon/color, confirmation and reorder URLs) for easy display in
+    templates (e.g., sidebar).
 
     :param request: The HttpRequest object, used to access the user.
     :type request: django.http.HttpRequest
@@ -73,6 +73,10 @@ def order_history_context(request):
                     'order_confirmation',
                     kwargs={'order_number': order.order_number}
                 ),
+                'reorder_url': reverse(
+                    'reorder',
+                    kwargs={'order_number': order.order_number}
+                ),
             })
 
     return {'user_orders': user_orders}
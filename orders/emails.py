@@ -1,27 +1,29 @@
 """
 Utility functions for sending order-related emails.
 
-Includes functions for sending order confirmation emails to customers after
+Includes functions for queuing order confirmation emails to customers after
 successful payment and order processing.
 """
 
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from decimal import Decimal
+from home.outbox import queue_email
 
 
-def send_confirmation_email(order):
+def queue_confirmation_email(order):
     """
-    Sends an order confirmation email to the customer.
+    Queues an order confirmation email to the customer.
 
-    Renders text and HTML versions of the email body using templates.
+    Renders text and HTML versions of the email body using templates and
+    adds the email to the outbox (see `home.outbox`), so the caller never
+    waits for the mail server.
     Requires the order object to have necessary details like shipping email
     and delivery method.
 
     :param order: The Order instance for which to send the confirmation.
     :type order: orders.models.Order
-    :return: True if the email was sent successfully, False otherwise.
+    :return: True if the email was queued successfully, False otherwise.
     :rtype: bool
     """
 
@@ -64,14 +66,13 @@ def send_confirmation_email(order):
             context  #
         )
 
-        msg = EmailMultiAlternatives(
+        queue_email(
             subject=full_subject,
             body=text_body,
+            html_body=html_body,
             from_email=settings.DEFAULT_FROM_EMAIL,
             to=[recipient_email]
         )
-        msg.attach_alternative(html_body, "text/html")
-        msg.send()
         return True
 
     except Exception as e:
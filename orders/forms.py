@@ -78,6 +78,9 @@ class OrderItemQuantityForm(forms.Form):
 
     Contains the quantity and a hidden field for the product ID. Includes
     validation to check quantity against available stock.
+
+    :param products: Already loaded products by id (e.g. those of the
+                     request's cart snapshot); other products are fetched.
     """
 
     quantity = forms.IntegerField(
@@ -88,12 +91,20 @@ class OrderItemQuantityForm(forms.Form):
     )
     product_id = forms.IntegerField(widget=forms.HiddenInput())
 
+    def __init__(self, *args, products=None, **kwargs):
+        """
+        Initializes the form with the already loaded products.
+        """
+        super().__init__(*args, **kwargs)
+        self.products = products or {}
+        self.product = None
+
     def clean(self):
         """
         Performs cross-field validation.
 
         Checks if the requested quantity exceeds the available stock for the
-        associated product.
+        associated product, which is stored as `self.product`.
 
         :return: The cleaned data dictionary.
         :rtype: dict
@@ -105,11 +116,14 @@ class OrderItemQuantityForm(forms.Form):
         product = None
 
         if product_id:
-            try:
-                product = Product.objects.get(pk=product_id)
-            except Product.DoesNotExist:
-                self.add_error('product_id', 'Invalid product selected.')
-                return cleaned_data
+            product = self.products.get(product_id)
+            if product is None:
+                try:
+                    product = Product.objects.get(pk=product_id)
+                except Product.DoesNotExist:
+                    self.add_error('product_id', 'Invalid product selected.')
+                    return cleaned_data
+            self.product = product
 
         if quantity is not None and product is not None:
             if quantity > product.stock_quantity:
@@ -0,0 +1,212 @@
+"""
+Durable inbox for payment webhooks.
+
+`StripeWebhookView` only verifies an event, stores it as a `WebhookEvent`
+and acknowledges it, so slower work (order updates, rendering confirmation
+emails) never delays the response and never makes the provider retry.
+Events are unique per provider event id; a retried delivery of a stored
+event is acknowledged without being stored again.
+
+The `process_webhook_events` command drains the inbox in batches. Each
+event is handled in its own savepoint; a failed event is retried later
+with exponential backoff and marked failed after `get_max_attempts()`
+attempts.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .emails import queue_confirmation_email
+from .models import Order, OrderStatus, WebhookEvent, WebhookEventStatus
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60 * 6
+
+
+def get_max_attempts():
+    """
+    Returns how often an event is attempted before it is marked failed.
+
+    Configurable with the `WEBHOOK_MAX_ATTEMPTS` setting.
+
+    :return: The maximum number of attempts.
+    :rtype: int
+    """
+
+    return getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def get_retry_delay(attempts):
+    """
+    Returns how long to wait before retrying a failed event.
+
+    The delay doubles with every failed attempt, starting from the
+    `WEBHOOK_RETRY_DELAY` setting (in seconds), up to `MAX_RETRY_DELAY`.
+
+    :param attempts: The number of failed attempts so far.
+    :return: The delay before the next attempt.
+    :rtype: datetime.timedelta
+    """
+
+    base = getattr(settings, 'WEBHOOK_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return timedelta(
+        seconds=min(base * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+    )
+
+
+def record_webhook_event(event, provider='stripe'):
+    """
+    Stores a verified webhook event in the inbox.
+
+    :param event: The event as received, with 'id' and 'type' keys.
+    :type event: dict
+    :param provider: The service that sent the event.
+    :return: True if the event is new, False if it was already received.
+    :rtype: bool
+    """
+
+    _, created = WebhookEvent.objects.get_or_create(
+        provider=provider,
+        event_id=event['id'],
+        defaults={'event_type': event['type'], 'payload': event},
+    )
+    return created
+
+
+def _get_order_number(payload):
+    """
+    Returns the order number from a PaymentIntent event's metadata.
+
+    :param payload: The event payload.
+    :return: The order number, or None if it is missing.
+    :rtype: str | None
+    """
+
+    intent = payload['data']['object']
+    return (intent.get('metadata') or {}).get('order_number')
+
+
+def handle_payment_intent_succeeded(payload):
+    """
+    Handles the 'payment_intent.succeeded' event from Stripe.
+
+    Updates the order status to 'PROCESSING' if it was 'PENDING' and
+    queues the confirmation email. Events without a known order are
+    ignored.
+
+    :param payload: The event payload.
+    :type payload: dict
+    """
+
+    order_number = _get_order_number(payload)
+    if not order_number:
+        return
+
+    order = Order.objects.select_related(
+        'delivery_method', 'cart', 'user'
+    ).filter(order_number=order_number).first()
+    if order is None:
+        return
+
+    if order.status == OrderStatus.PENDING:
+        order.status = OrderStatus.PROCESSING
+        order.save(update_fields=['status'])
+
+    queue_confirmation_email(order)
+
+
+def handle_payment_intent_failed(payload):
+    """
+    Handles the 'payment_intent.payment_failed' event from Stripe.
+
+    Updates the order status to 'FAILED' if it was 'PENDING'. Events
+    without a known order are ignored.
+
+    :param payload: The event payload.
+    :type payload: dict
+    """
+
+    order_number = _get_order_number(payload)
+    if order_number:
+        Order.objects.filter(
+            order_number=order_number, status=OrderStatus.PENDING
+        ).update(status=OrderStatus.FAILED)
+
+
+EVENT_HANDLERS = {
+    ('stripe', 'payment_intent.succeeded'): handle_payment_intent_succeeded,
+    ('stripe', 'payment_intent.payment_failed'): handle_payment_intent_failed,
+}
+
+
+def process_webhook_event(event):
+    """
+    Runs the handler of an inbox event; events without one are no-ops.
+
+    :param event: The inbox event.
+    :type event: orders.models.WebhookEvent
+    :raises Exception: Any error of the handler, to be retried.
+    """
+
+    handler = EVENT_HANDLERS.get((event.provider, event.event_type))
+    if handler is not None:
+        handler(event.payload)
+
+
+def process_webhook_inbox(batch_size=100):
+    """
+    Processes all due inbox events, oldest first, in batches.
+
+    Each batch is one transaction that locks only its own events (skipping
+    events locked by a concurrent worker) and stores their outcome with
+    one `bulk_update`. Failed events are rescheduled, so a batch never
+    picks them up again during the same run.
+
+    :param batch_size: Number of events processed per batch.
+    :return: The number of processed, rescheduled and failed events.
+    :rtype: dict[str, int]
+    """
+
+    max_attempts = get_max_attempts()
+    totals = {'processed': 0, 'retried': 0, 'failed': 0}
+
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            batch = list(
+                WebhookEvent.objects.select_for_update(
+                    skip_locked=True
+                ).filter(
+                    status=WebhookEventStatus.PENDING,
+                    next_attempt_at__lte=now,
+                ).order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return totals
+
+            for event in batch:
+                try:
+                    with transaction.atomic():
+                        process_webhook_event(event)
+                except Exception as e:
+                    event.attempts += 1
+                    event.last_error = f"{type(e).__name__}: {e}"
+                    if event.attempts >= max_attempts:
+                        event.status = WebhookEventStatus.FAILED
+                        totals['failed'] += 1
+                    else:
+                        event.next_attempt_at = (
+                            now + get_retry_delay(event.attempts)
+                        )
+                        totals['retried'] += 1
+                else:
+                    event.status = WebhookEventStatus.PROCESSED
+                    event.processed_on = timezone.now()
+                    totals['processed'] += 1
+
+            WebhookEvent.objects.bulk_update(batch, [
+                'status', 'attempts', 'next_attempt_at', 'last_error',
+                'processed_on',
+            ])
@@ -0,0 +1,71 @@
+"""
+Management command to process the webhook inbox.
+
+Usage: python manage.py process_webhook_events [--batch-size 100]
+                                              [--interval 5]
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from orders.inbox import process_webhook_inbox
+
+
+class Command(BaseCommand):
+    """
+    Handles the due `WebhookEvent` rows stored by the webhook view, in
+    batches, rescheduling failed events with exponential backoff.
+
+    Payments are only reflected on orders once their events are
+    processed, so the command must run continuously: with `--interval` it
+    keeps polling the inbox (the `worker` process of the Procfile).
+    """
+
+    help = 'Processes stored webhook events in batches.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of events processed per transaction.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, polling the inbox every this many seconds '
+                 '(0 processes the due events once).'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        interval = options['interval']
+
+        while True:
+            totals = process_webhook_inbox(batch_size=batch_size)
+            if not interval or any(totals.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {totals['processed']} webhook events "
+                    f"({totals['retried']} rescheduled, "
+                    f"{totals['failed']} failed)."
+                ))
+            if not interval:
+                return
+            time.sleep(interval)
+            # Long-running workers must not keep broken or expired
+            # database connections between polls.
+            close_old_connections()
@@ -0,0 +1,69 @@
+"""
+Management command to release expired checkout stock reservations.
+
+Usage: python manage.py sweep_stock_reservations [--batch-size 500]
+                                                [--interval 60]
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from orders.reservations import sweep_expired_reservations
+
+
+class Command(BaseCommand):
+    """
+    Deletes expired `StockReservation` rows in batches and returns their
+    units to the products' available stock.
+
+    Expired holds keep counting against the available stock until they are
+    swept, so the command must run frequently: with `--interval` it keeps
+    sweeping (the `sweep` process of the Procfile).
+    """
+
+    help = 'Releases expired stock reservations in batches.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of reservations released per transaction.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, sweeping every this many seconds '
+                 '(0 sweeps once).'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        interval = options['interval']
+
+        while True:
+            released = sweep_expired_reservations(batch_size=batch_size)
+            if not interval or released:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Released {released} expired stock reservations.'
+                ))
+            if not interval:
+                return
+            time.sleep(interval)
+            # Long-running workers must not keep broken or expired
+            # database connections between polls.
+            close_old_connections()
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_checkout_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stripe_amount',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='stripe_client_secret',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='stripe_payment_intent_id',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -2,8 +2,10 @@
 Database models for the orders application.
 
 Defines the structure for storing order information (`Order`), the items
-within each order (`OrderItem`), and available delivery methods
-(`DeliveryMethod`). Includes choices for order status (`OrderStatus`).
+within each order (`OrderItem`), available delivery methods
+(`DeliveryMethod`), checkout stock holds (`StockReservation`) and received
+payment webhooks (`WebhookEvent`). Includes choices for order status
+(`OrderStatus`).
 """
 
 from django.db import models
@@ -11,7 +13,9 @@ from django.conf import settings
 from cart.models import Cart
 from products.models import Product
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
+import secrets
 import uuid
 
 
@@ -29,6 +33,16 @@ class OrderStatus(models.TextChoices):
     FAILED = 'FAILED', 'Failed'
 
 
+class WebhookEventStatus(models.TextChoices):
+    """
+    Defines the processing states of an inbox WebhookEvent.
+    """
+
+    PENDING = 'PENDING', 'Pending'
+    PROCESSED = 'PROCESSED', 'Processed'
+    FAILED = 'FAILED', 'Failed'
+
+
 class DeliveryMethod(models.Model):
     """
     Represents a shipping/delivery option available to customers.
@@ -81,8 +95,17 @@ class Order(models.Model):
     :param date_ordered: Timestamp when the order was created.
     :param date_updated: Timestamp when the order was last updated.
     :param status: The current status of the order (from OrderStatus choices).
+    :param checkout_token: The idempotency token of the checkout form
+                           submission that created the order (optional).
+    :param stripe_payment_intent_id: The id of the order's Stripe
+                                     PaymentIntent, once created.
+    :param stripe_client_secret: The client secret of that PaymentIntent.
+    :param stripe_amount: The amount, in cents, the PaymentIntent was last
+                          created or updated with.
     """
 
+    CHECKOUT_TOKEN_LENGTH = 43
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.SET_NULL, null=True, blank=True,
                              related_name='orders')
@@ -112,6 +135,14 @@ class Order(models.Model):
     date_updated = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=OrderStatus.choices,
                               default=OrderStatus.PENDING)
+    checkout_token = models.CharField(max_length=64, null=True, blank=True,
+                                      editable=False)
+    stripe_payment_intent_id = models.CharField(max_length=255, blank=True,
+                                                editable=False)
+    stripe_client_secret = models.CharField(max_length=255, blank=True,
+                                            editable=False)
+    stripe_amount = models.PositiveIntegerField(null=True, blank=True,
+                                                editable=False)
 
     class Meta:
         """
@@ -119,6 +150,10 @@ class Order(models.Model):
         """
 
         ordering = ['-date_ordered']
+        constraints = [
+            models.UniqueConstraint(fields=['checkout_token'],
+                                    name='unique_order_checkout_token'),
+        ]
 
     def __str__(self):
         """
@@ -140,6 +175,17 @@ class Order(models.Model):
 
         return uuid.uuid4().hex.upper()
 
+    @classmethod
+    def generate_checkout_token(cls):
+        """
+        Generates a random idempotency token for a checkout form.
+
+        :return: A URL-safe token of `CHECKOUT_TOKEN_LENGTH` characters.
+        :rtype: str
+        """
+
+        return secrets.token_urlsafe(32)
+
     def update_total(self):
         """
         Recalculates the order total based on its items and delivery cost,
@@ -237,3 +283,111 @@ class OrderItem(models.Model):
         current_price = self.product.price if self.product else self.price
         self.lineitem_total = current_price * self.quantity
         super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+    """
+    A short-lived hold on product stock, placed when a customer starts
+    checkout.
+
+    Each product's `reserved_quantity` equals the sum of its reservation
+    rows, expired or not, until expired rows are swept; the helpers in
+    `orders.reservations` keep both in step.
+
+    :param holder: The cart owner holding the stock ('user:<id>' or
+                   'session:<key>', see `cart.cache.get_cart_owner`).
+    :param product: ForeignKey to the held Product.
+    :param quantity: The number of units held.
+    :param expires_at: When the hold lapses.
+    :param created_on: Timestamp when the hold was placed.
+    """
+
+    holder = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,
+                                related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        Metadata options for the StockReservation model.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'],
+                                    name='unique_holder_product_reservation'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'],
+                         name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Returns the string representation of the reservation.
+
+        :return: A string showing quantity, product and holder.
+        :rtype: str
+        """
+
+        return f"{self.quantity} x {self.product_id} held by {self.holder}"
+
+
+class WebhookEvent(models.Model):
+    """
+    A verified webhook event waiting for, or done with, processing.
+
+    The webhook view only stores events here and acknowledges them; the
+    `process_webhook_events` command handles them (see `orders.inbox`).
+    Events are unique per provider event id, so provider retries of an
+    event already received are dropped.
+
+    :param provider: The service that sent the event (e.g. "stripe").
+    :param event_id: The provider's id of the event.
+    :param event_type: The provider's event type.
+    :param payload: The event as received.
+    :param status: The processing state (from WebhookEventStatus choices).
+    :param attempts: The number of failed processing attempts.
+    :param next_attempt_at: When the event is due for (re)processing.
+    :param last_error: The error of the last failed attempt.
+    :param received_on: Timestamp when the event was received.
+    :param processed_on: Timestamp when the event was processed.
+    """
+
+    provider = models.CharField(max_length=20, default='stripe')
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20,
+                              choices=WebhookEventStatus.choices,
+                              default=WebhookEventStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_on = models.DateTimeField(auto_now_add=True)
+    processed_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Metadata options for the WebhookEvent model.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'],
+                                    name='unique_provider_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='webhook_event_due_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Returns the string representation of the webhook event.
+
+        :return: A string showing provider, type and event id.
+        :rtype: str
+        """
+
+        return f"{self.provider} {self.event_type} ({self.event_id})"
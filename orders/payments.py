@@ -0,0 +1,102 @@
+"""
+Stripe PaymentIntent handling for orders.
+
+Each order keeps one PaymentIntent. Its id, client secret and amount are
+stored on the `Order` when it is created, so later visits of the payment
+page (refreshes, the back button, retries) reuse it without contacting
+Stripe. The intent is only updated when the order total changed, and only
+replaced when Stripe no longer accepts changes to it (e.g. it was
+canceled).
+"""
+
+from django.conf import settings
+import stripe
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+
+def get_stripe_amount(order):
+    """
+    Returns the order total in the smallest currency unit.
+
+    :param order: The order.
+    :type order: orders.models.Order
+    :return: The amount in cents.
+    :rtype: int
+    """
+
+    return int(order.order_total * 100)
+
+
+def create_payment_intent(order, user_id=None, replace=False):
+    """
+    Creates a PaymentIntent for the order and stores it on the order.
+
+    The first intent of an order is created with an idempotency key, so
+    concurrent first visits of the payment page share one intent.
+
+    :param order: The order.
+    :type order: orders.models.Order
+    :param user_id: The id of the paying user, if authenticated.
+    :param replace: True if the order's stored intent is being replaced.
+    :return: The client secret of the new intent.
+    :rtype: str
+    :raises stripe.error.StripeError: If Stripe refuses the request.
+    """
+
+    amount = get_stripe_amount(order)
+    options = {}
+    if not replace:
+        options['idempotency_key'] = f'order-{order.order_number}-intent'
+
+    intent = stripe.PaymentIntent.create(
+        amount=amount,
+        currency='eur',
+        metadata={
+            'order_number': order.order_number,
+            'user_id': user_id,
+        },
+        **options
+    )
+    order.stripe_payment_intent_id = intent.id
+    order.stripe_client_secret = intent.client_secret
+    order.stripe_amount = amount
+    order.save(update_fields=['stripe_payment_intent_id',
+                              'stripe_client_secret', 'stripe_amount'])
+    return intent.client_secret
+
+
+def get_payment_intent_secret(order, user_id=None):
+    """
+    Returns the client secret of the order's PaymentIntent.
+
+    Reuses the stored intent without calling Stripe while the order total
+    is unchanged. Otherwise the intent's amount is updated, or a new
+    intent is created if there is none or Stripe refuses the update.
+
+    :param order: The order.
+    :type order: orders.models.Order
+    :param user_id: The id of the paying user, if authenticated.
+    :return: The client secret to confirm the payment with.
+    :rtype: str
+    :raises stripe.error.StripeError: If Stripe refuses the request.
+    """
+
+    if not order.stripe_payment_intent_id or not order.stripe_client_secret:
+        return create_payment_intent(order, user_id)
+
+    amount = get_stripe_amount(order)
+    if order.stripe_amount == amount:
+        return order.stripe_client_secret
+
+    try:
+        stripe.PaymentIntent.modify(
+            order.stripe_payment_intent_id,
+            amount=amount,
+        )
+    except stripe.error.InvalidRequestError:
+        return create_payment_intent(order, user_id, replace=True)
+
+    order.stripe_amount = amount
+    order.save(update_fields=['stripe_amount'])
+    return order.stripe_client_secret
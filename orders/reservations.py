@@ -0,0 +1,308 @@
+"""
+Temporary stock reservations for checkout.
+
+Starting checkout places holds (`StockReservation` rows with an expiry) on
+the cart's products. Each product keeps the total it has on hold in
+`Product.reserved_quantity`, updated incrementally with single-row
+conditional UPDATEs, so the stock available to other customers is
+`stock_quantity - reserved_quantity` without summing holds or locking the
+product row for a whole checkout.
+
+Placing an order converts the holder's holds into a stock decrement with
+a single conditional UPDATE covering every product, issued at the end of
+the order transaction; the product rows are only locked by that UPDATE,
+not for the whole checkout.
+Expired holds keep counting until they are swept, in batches, by
+`sweep_expired_reservations` (the `sweep_stock_reservations` command), or
+when a new hold on the same product would not fit otherwise.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from products.cache import bump_product_versions
+from products.models import Product
+from .models import StockReservation
+
+DEFAULT_RESERVATION_MINUTES = 15
+
+
+def get_reservation_ttl():
+    """
+    Returns how long checkout holds last.
+
+    Configurable in minutes with the `STOCK_RESERVATION_MINUTES` setting.
+
+    :return: The lifetime of a hold.
+    :rtype: datetime.timedelta
+    """
+
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_MINUTES',
+                                     DEFAULT_RESERVATION_MINUTES))
+
+
+def _change_reserved(product_id, delta, stock_needed=None):
+    """
+    Changes a product's `reserved_quantity` in one UPDATE.
+
+    :param product_id: The primary key of the product.
+    :param delta: The change of the reserved quantity.
+    :param stock_needed: If given, only apply the change when this many
+                         units are still unreserved.
+    :return: True if the product was updated.
+    :rtype: bool
+    """
+
+    products = Product.objects.filter(pk=product_id)
+    if stock_needed is not None:
+        products = products.filter(
+            stock_quantity__gte=F('reserved_quantity') + stock_needed
+        )
+    return bool(products.update(reserved_quantity=F('reserved_quantity')
+                                + delta))
+
+
+def _release(reservations):
+    """
+    Deletes reservations and returns their units to available stock.
+
+    :param reservations: (pk, product id, quantity) tuples.
+    :return: The number of deleted reservations.
+    :rtype: int
+    """
+
+    released = {}
+    for _, product_id, quantity in reservations:
+        released[product_id] = released.get(product_id, 0) + quantity
+    for product_id, quantity in released.items():
+        _change_reserved(product_id, -quantity)
+    StockReservation.objects.filter(
+        pk__in=[pk for pk, _, _ in reservations]
+    ).delete()
+    return len(reservations)
+
+
+def release_expired_for_product(product_id, exclude_holder=None):
+    """
+    Sweeps the expired holds of one product.
+
+    :param product_id: The primary key of the product.
+    :param exclude_holder: A holder whose holds are left alone (the one
+                           currently adjusting them).
+    :return: The number of released holds.
+    :rtype: int
+    """
+
+    with transaction.atomic():
+        expired = StockReservation.objects.select_for_update().filter(
+            product_id=product_id, expires_at__lte=timezone.now()
+        )
+        if exclude_holder is not None:
+            expired = expired.exclude(holder=exclude_holder)
+        return _release(list(
+            expired.values_list('pk', 'product_id', 'quantity')
+        ))
+
+
+def sweep_expired_reservations(batch_size=500):
+    """
+    Releases all expired holds, in batches.
+
+    Each batch is one transaction that locks only its own reservation rows
+    (skipping rows locked by a concurrent sweep) and issues one UPDATE per
+    affected product.
+
+    :param batch_size: Number of holds released per batch.
+    :return: The number of released holds.
+    :rtype: int
+    """
+
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(
+                    skip_locked=True
+                ).filter(
+                    expires_at__lte=timezone.now()
+                ).order_by('pk').values_list(
+                    'pk', 'product_id', 'quantity'
+                )[:batch_size]
+            )
+            if not batch:
+                return released
+            released += _release(batch)
+
+
+def reserve_stock(holder, quantities):
+    """
+    Places or refreshes a holder's holds to match the given quantities.
+
+    Existing holds are adjusted by the difference and their expiry is
+    extended; holds on products no longer requested are released. A hold
+    that cannot grow because the stock is taken keeps its previous size.
+
+    :param holder: The cart owner, see `cart.cache.get_cart_owner`.
+    :type holder: str
+    :param quantities: The quantities to hold by product id.
+    :type quantities: dict[int, int]
+    :return: The ids of the products that could not be held in full.
+    :rtype: list[int]
+    """
+
+    expires_at = timezone.now() + get_reservation_ttl()
+    shortfalls = []
+
+    with transaction.atomic():
+        existing = {
+            reservation.product_id: reservation
+            for reservation in StockReservation.objects.select_for_update()
+            .filter(holder=holder)
+        }
+
+        _release([
+            (reservation.pk, product_id, reservation.quantity)
+            for product_id, reservation in existing.items()
+            if quantities.get(product_id, 0) <= 0
+        ])
+
+        to_create = []
+        to_update = []
+        for product_id, quantity in quantities.items():
+            if quantity <= 0:
+                continue
+            reservation = existing.get(product_id)
+            held = reservation.quantity if reservation else 0
+            delta = quantity - held
+
+            if delta > 0 and not (
+                _change_reserved(product_id, delta, stock_needed=delta)
+                or (release_expired_for_product(product_id,
+                                                exclude_holder=holder)
+                    and _change_reserved(product_id, delta,
+                                         stock_needed=delta))
+            ):
+                shortfalls.append(product_id)
+                quantity = held
+            elif delta < 0:
+                _change_reserved(product_id, delta)
+
+            if reservation is not None:
+                reservation.quantity = quantity
+                reservation.expires_at = expires_at
+                to_update.append(reservation)
+            elif quantity > 0:
+                to_create.append(StockReservation(
+                    holder=holder, product_id=product_id, quantity=quantity,
+                    expires_at=expires_at
+                ))
+
+        StockReservation.objects.bulk_create(to_create)
+        StockReservation.objects.bulk_update(to_update,
+                                             ['quantity', 'expires_at'])
+
+    return shortfalls
+
+
+def release_reservations(holder):
+    """
+    Releases all holds of a holder.
+
+    :param holder: The cart owner, see `cart.cache.get_cart_owner`.
+    :type holder: str
+    :return: The number of released holds.
+    :rtype: int
+    """
+
+    with transaction.atomic():
+        return _release(list(
+            StockReservation.objects.select_for_update().filter(
+                holder=holder
+            ).values_list('pk', 'product_id', 'quantity')
+        ))
+
+
+def convert_reservations(holder, quantities):
+    """
+    Takes ordered quantities out of stock, consuming the holder's holds.
+
+    Must run inside the order's transaction. The holder's holds are
+    locked, then a single conditional UPDATE decrements the stock of every
+    product by the ordered quantity and its reserved quantity by the
+    converted hold, provided the stock not held by others covers the
+    order. Products without a hold (e.g. an expired, swept one) are taken
+    from unreserved stock. Remaining holds of the holder are released.
+
+    If the UPDATE does not match every product, it is rolled back to a
+    savepoint and the products are read again to report which ones are
+    short.
+
+    :param holder: The cart owner, or None if the order has no holds.
+    :type holder: str | None
+    :param quantities: The ordered quantities by product id.
+    :type quantities: dict[int, int]
+    :return: The ids of the products without enough stock; if any, the
+             caller must roll back the transaction.
+    :rtype: list[int]
+    """
+
+    if not quantities:
+        return []
+
+    holds = []
+    if holder:
+        holds = list(
+            StockReservation.objects.select_for_update().filter(
+                holder=holder
+            ).values_list('pk', 'product_id', 'quantity')
+        )
+    held = {product_id: quantity for _, product_id, quantity in holds}
+
+    def per_product(values):
+        return Case(
+            *[When(pk=product_id, then=Value(value))
+              for product_id, value in values.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    ordered = per_product(quantities)
+    converted = per_product(
+        {product_id: held.get(product_id, 0) for product_id in quantities}
+    )
+    sid = transaction.savepoint()
+    updated = Product.objects.filter(
+        pk__in=quantities,
+        stock_quantity__gte=F('reserved_quantity') - converted + ordered,
+    ).update(
+        stock_quantity=F('stock_quantity') - ordered,
+        reserved_quantity=F('reserved_quantity') - converted,
+    )
+    if updated != len(quantities):
+        transaction.savepoint_rollback(sid)
+        products = Product.objects.in_bulk(list(quantities))
+        failed = [
+            product_id for product_id, quantity in sorted(quantities.items())
+            if product_id not in products
+            or products[product_id].stock_quantity
+            < products[product_id].reserved_quantity
+            - held.get(product_id, 0) + quantity
+        ]
+        # The stock may have been freed since the UPDATE; the order is
+        # refused all the same.
+        return failed or sorted(quantities)
+    transaction.savepoint_commit(sid)
+
+    _release([
+        (pk, product_id, quantity) for pk, product_id, quantity in holds
+        if product_id not in quantities
+    ])
+    StockReservation.objects.filter(
+        pk__in=[pk for pk, product_id, _ in holds if product_id in quantities]
+    ).delete()
+    # update() sends no signals, so the detail pages showing the stock
+    # are invalidated explicitly.
+    bump_product_versions(quantities)
+    return []
@@ -1,3 +1,681 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from home.outbox import send_queued_emails
+from products.models import Product
+import stripe
+from .models import (
+    DeliveryMethod,
+    Order,
+    OrderItem,
+    OrderStatus,
+    StockReservation,
+    WebhookEvent,
+    WebhookEventStatus,
+)
+from .inbox import process_webhook_inbox
+from .reservations import (
+    convert_reservations,
+    release_reservations,
+    reserve_stock,
+)
 
-# Create your tests here.
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        """
+        Set up a product with limited stock.
+        """
+
+        self.product = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                              stock_quantity=5)
+
+    def refresh(self):
+        """
+        Reloads the product and returns its available quantity.
+        """
+
+        self.product.refresh_from_db()
+        return self.product.available_quantity
+
+    def test_holds_reduce_available_stock(self):
+        """
+        Test that holds are counted incrementally, adjusted on refresh and
+        refused when the stock is held by others.
+        """
+
+        self.assertEqual(reserve_stock('user:1', {self.product.pk: 3}), [])
+        self.assertEqual(self.refresh(), 2)
+
+        self.assertEqual(reserve_stock('user:2', {self.product.pk: 3}),
+                         [self.product.pk])
+        self.assertFalse(
+            StockReservation.objects.filter(holder='user:2').exists()
+        )
+
+        reserve_stock('user:1', {self.product.pk: 1})
+        self.assertEqual(self.refresh(), 4)
+        release_reservations('user:1')
+        self.assertEqual(self.refresh(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_swept(self):
+        """
+        Test that expired holds are released by the sweep command, and
+        reclaimed on demand when a new hold would not fit.
+        """
+
+        reserve_stock('user:1', {self.product.pk: 4})
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(reserve_stock('user:2', {self.product.pk: 3}), [])
+        self.assertEqual(self.refresh(), 2)
+
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        out = StringIO()
+        call_command('sweep_stock_reservations', '--batch-size=1',
+                     stdout=out)
+        self.assertIn('Released 1 expired', out.getvalue())
+        self.assertEqual(self.refresh(), 5)
+
+    def test_convert_takes_stock_and_releases_holds(self):
+        """
+        Test that converting holds decrements stock and reserved quantity,
+        and that orders exceeding the unreserved stock are refused.
+        """
+
+        other = Product.objects.create(name='Case', price=Decimal('5'),
+                                       stock_quantity=2)
+        reserve_stock('user:1', {self.product.pk: 2, other.pk: 1})
+        reserve_stock('user:2', {self.product.pk: 3})
+
+        self.assertEqual(
+            convert_reservations('user:1', {self.product.pk: 3, other.pk: 1}),
+            [self.product.pk]
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.stock_quantity, 2)
+        self.assertEqual(
+            convert_reservations('user:1', {self.product.pk: 2}), []
+        )
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertEqual(self.product.reserved_quantity, 3)
+        self.assertEqual(other.reserved_quantity, 0)
+        self.assertFalse(
+            StockReservation.objects.filter(holder='user:1').exists()
+        )
+
+    def test_product_save_keeps_reserved_quantity(self):
+        """
+        Test that saving a product loaded before a hold does not overwrite
+        the reserved quantity.
+        """
+
+        stale = Product.objects.get(pk=self.product.pk)
+        reserve_stock('user:1', {self.product.pk: 2})
+        stale.name = 'Pi 5 8GB'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 2)
+        self.assertEqual(self.product.name, 'Pi 5 8GB')
+
+
+class CheckoutReservationTests(TestCase):
+    def setUp(self):
+        """
+        Set up a logged-in user with a cart and a delivery method.
+        """
+
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer',
+                                             password='password')
+        self.product = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                              stock_quantity=3)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.delivery = DeliveryMethod.objects.create(name='Standard',
+                                                      price=Decimal('5'))
+        self.client.login(username='buyer', password='password')
+
+    def checkout_data(self, quantity):
+        """
+        Returns valid checkout POST data for the product.
+        """
+
+        return {
+            'shipping-full_name': 'Ada Buyer',
+            'shipping-email': 'ada@example.com',
+            'shipping-address1': '1 Main Street',
+            'shipping-city': 'Dublin',
+            'shipping-zipcode': 'D01',
+            'shipping-country': 'Ireland',
+            'delivery-delivery_method': self.delivery.pk,
+            'items-TOTAL_FORMS': 1,
+            'items-INITIAL_FORMS': 1,
+            'items-0-product_id': self.product.pk,
+            'items-0-quantity': quantity,
+        }
+
+    def test_checkout_holds_stock_and_order_converts_it(self):
+        """
+        Test that opening checkout reserves the cart and placing the order
+        takes the stock and consumes the hold.
+        """
+
+        self.client.get(reverse('checkout'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 2)
+
+        response = self.client.post(reverse('checkout'),
+                                    self.checkout_data(2))
+        order = Order.objects.get()
+        self.assertRedirects(
+            response,
+            reverse('payment_page',
+                    kwargs={'order_number': order.order_number}),
+            fetch_redirect_response=False
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+        self.assertEqual(self.product.reserved_quantity, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_loads_cart_products_once(self):
+        """
+        Test that the checkout view and the cart sidebar share one cart
+        snapshot, so the products are read once per render.
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('checkout'))
+        self.assertContains(response, 'Pi 5')
+        product_selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "products_product"' in query['sql']
+        ]
+        self.assertEqual(len(product_selects), 1)
+
+    def test_order_query_count_does_not_grow_with_cart(self):
+        """
+        Test that placing an order locks, writes and takes stock for all
+        lines with a fixed number of queries, at the locked prices.
+        """
+
+        def place_order(data):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('checkout'), data)
+            return len(queries.captured_queries)
+
+        single = place_order(self.checkout_data(1))
+        Order.objects.all().delete()
+
+        data = self.checkout_data(1)
+        extras = [
+            Product.objects.create(name=f'HAT {index}', stock_quantity=5,
+                                   price=Decimal('10'))
+            for index in range(3)
+        ]
+        for index, product in enumerate(extras, start=1):
+            data[f'items-{index}-product_id'] = product.pk
+            data[f'items-{index}-quantity'] = 2
+            CartItem.objects.create(cart=Cart.objects.get(user=self.user),
+                                    product=product, quantity=2)
+        data['items-TOTAL_FORMS'] = data['items-INITIAL_FORMS'] = 4
+        Product.objects.filter(pk=extras[0].pk).update(price=Decimal('12'))
+
+        self.assertEqual(place_order(data), single)
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 4)
+        self.assertEqual(order.order_total, Decimal('149'))
+        self.assertEqual(
+            order.items.get(product=extras[0]).lineitem_total, Decimal('24')
+        )
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in extras])
+                 .values_list('stock_quantity', flat=True)),
+            [3, 3, 3]
+        )
+
+    def test_stock_held_by_others_is_not_sold(self):
+        """
+        Test that an order cannot take stock reserved by another customer.
+        """
+
+        reserve_stock('user:other', {self.product.pk: 2})
+        self.client.post(reverse('checkout'), self.checkout_data(2))
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertEqual(self.product.reserved_quantity, 2)
+
+
+class CheckoutIdempotencyTests(TestCase):
+    def setUp(self):
+        """
+        Set up a logged-in user with a cart and the checkout form's token.
+        """
+
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer',
+                                             password='password')
+        self.product = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                              stock_quantity=9)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.delivery = DeliveryMethod.objects.create(name='Standard',
+                                                      price=Decimal('5'))
+        self.client.login(username='buyer', password='password')
+        response = self.client.get(reverse('checkout'))
+        self.token = response.context['checkout_token']
+        self.data = {
+            'checkout_token': self.token,
+            'shipping-full_name': 'Ada Buyer',
+            'shipping-email': 'ada@example.com',
+            'shipping-address1': '1 Main Street',
+            'shipping-city': 'Dublin',
+            'shipping-zipcode': 'D01',
+            'shipping-country': 'Ireland',
+            'delivery-delivery_method': self.delivery.pk,
+            'items-TOTAL_FORMS': 1,
+            'items-INITIAL_FORMS': 1,
+            'items-0-product_id': self.product.pk,
+            'items-0-quantity': 2,
+        }
+
+    def test_checkout_form_embeds_token(self):
+        """
+        Test that the checkout page issues a token in a hidden field.
+        """
+
+        self.assertEqual(len(self.token), Order.CHECKOUT_TOKEN_LENGTH)
+        response = self.client.get(reverse('checkout'))
+        self.assertContains(response, 'name="checkout_token"')
+        self.assertNotEqual(response.context['checkout_token'], self.token)
+
+    def test_repeated_submission_reuses_order(self):
+        """
+        Test that submitting the same form twice creates one order, takes
+        the stock once and redirects both times to its payment page.
+        """
+
+        first = self.client.post(reverse('checkout'), self.data)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.post(reverse('checkout'), self.data)
+
+        order = Order.objects.get()
+        self.assertEqual(order.checkout_token, self.token)
+        payment_url = reverse('payment_page',
+                              kwargs={'order_number': order.order_number})
+        self.assertRedirects(first, payment_url,
+                             fetch_redirect_response=False)
+        self.assertRedirects(second, payment_url,
+                             fetch_redirect_response=False)
+        self.assertFalse(any(
+            'FOR UPDATE' in query['sql'] or query['sql'].startswith('UPDATE')
+            for query in queries.captured_queries
+        ))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+
+    def test_new_token_places_new_order(self):
+        """
+        Test that a newly issued token places a separate order, and that
+        forms without a token still work.
+        """
+
+        self.client.post(reverse('checkout'), self.data)
+        response = self.client.get(reverse('checkout'))
+        self.data['checkout_token'] = response.context['checkout_token']
+        self.client.post(reverse('checkout'), self.data)
+        del self.data['checkout_token']
+        self.client.post(reverse('checkout'), self.data)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_token_not_issued_to_session_is_ignored(self):
+        """
+        Test that a token the session was not issued neither finds another
+        order nor is stored on the new one.
+        """
+
+        self.client.post(reverse('checkout'), self.data)
+        self.client.logout()
+        self.client.login(username='buyer', password='password')
+
+        response = self.client.post(reverse('checkout'), self.data)
+        self.assertEqual(Order.objects.count(), 2)
+        order = Order.objects.latest('pk')
+        self.assertIsNone(order.checkout_token)
+        self.assertRedirects(
+            response,
+            reverse('payment_page',
+                    kwargs={'order_number': order.order_number}),
+            fetch_redirect_response=False,
+        )
+
+
+class ReorderViewTests(TestCase):
+    def setUp(self):
+        """
+        Set up a past order with an available, a scarce and an inactive
+        product.
+        """
+
+        cache.clear()
+        self.user = User.objects.create_user(username='regular',
+                                             password='password')
+        self.pi = Product.objects.create(name='Pi 5', price=Decimal('80'),
+                                         stock_quantity=10)
+        self.fan = Product.objects.create(name='Fan', price=Decimal('4'),
+                                          stock_quantity=1)
+        self.retired = Product.objects.create(name='Pi 3', price=Decimal('30'),
+                                              stock_quantity=5,
+                                              is_active=False)
+        self.order = Order.objects.create(
+            user=self.user, shipping_full_name='Reg',
+            status=OrderStatus.DELIVERED,
+            shipping_email='reg@example.com', shipping_address1='1 Street',
+            shipping_city='Cork', shipping_zipcode='T12',
+            shipping_country='Ireland',
+        )
+        for product, quantity in ((self.pi, 2), (self.fan, 3),
+                                  (self.retired, 1)):
+            OrderItem.objects.create(order=self.order, product=product,
+                                     price=product.price, quantity=quantity)
+        self.url = reverse('reorder',
+                           kwargs={'order_number': self.order.order_number})
+
+    def test_reorder_merges_lines_and_reports_clamps(self):
+        """
+        Test that reordering merges into the existing cart in bulk, clamps
+        to stock, skips inactive products and reports both.
+        """
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.pi, quantity=1)
+        self.client.login(username='regular', password='password')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url)
+        self.assertRedirects(response, reverse('checkout'),
+                             fetch_redirect_response=False)
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.pi.pk: 3, self.fan.pk: 1}
+        )
+        item_reads = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "orders_orderitem"' in query['sql']
+        ]
+        self.assertEqual(len(item_reads), 1)
+        self.assertIn('"products_product"', item_reads[0])
+
+        messages = [str(m) for m in response.wsgi_request._messages]
+        self.assertIn('Only 1 of 3 x Fan could be added due to limited '
+                      'stock.', messages)
+        self.assertIn('Pi 3 is no longer available.', messages)
+
+    def test_guest_reorder_fills_session_cart(self):
+        """
+        Test that guest orders are reordered into the session cart.
+        """
+
+        self.order.user = None
+        self.order.save()
+        self.client.post(self.url)
+        self.assertEqual(
+            self.client.session['guest_cart'],
+            [2, self.pi.pk, 2, self.fan.pk, 1]
+        )
+
+    def test_other_users_orders_cannot_be_reordered(self):
+        """
+        Test that users cannot reorder someone else's order.
+        """
+
+        User.objects.create_user(username='other', password='password')
+        self.client.login(username='other', password='password')
+        self.client.post(self.url)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class StripeStub:
+    """
+    A local stand-in for `stripe.PaymentIntent` that records every call
+    instead of contacting Stripe.
+    """
+
+    def __init__(self, frozen=()):
+        self.calls = []
+        self.frozen = set(frozen)
+
+    def create(self, **params):
+        self.calls.append(('create', params))
+        intent_id = f'pi_{len(self.calls)}'
+        return SimpleNamespace(id=intent_id,
+                               client_secret=f'{intent_id}_secret')
+
+    def modify(self, intent_id, **params):
+        self.calls.append(('modify', intent_id, params))
+        if intent_id in self.frozen:
+            raise stripe.error.InvalidRequestError(
+                'This PaymentIntent can no longer be updated.', 'amount'
+            )
+        return SimpleNamespace(id=intent_id)
+
+
+@override_settings(STRIPE_PUBLIC_KEY='pk_test')
+class PaymentIntentReuseTests(TestCase):
+    def setUp(self):
+        """
+        Set up a logged-in user with a pending order.
+        """
+
+        self.user = User.objects.create_user(username='payer',
+                                             password='password')
+        delivery = DeliveryMethod.objects.create(name='Standard',
+                                                 price=Decimal('5'))
+        self.order = Order.objects.create(
+            user=self.user, shipping_full_name='Pay Er',
+            shipping_email='payer@example.com', shipping_address1='1 Street',
+            shipping_city='Galway', shipping_zipcode='H91',
+            shipping_country='Ireland', delivery_method=delivery,
+            order_total=Decimal('85.00'),
+        )
+        self.url = reverse('payment_page',
+                           kwargs={'order_number': self.order.order_number})
+        self.client.login(username='payer', password='password')
+
+    def visit(self, stub, times=1):
+        """
+        Opens the payment page with the Stripe stub in place and returns
+        the client secret of the last visit.
+        """
+
+        with mock.patch.object(stripe, 'PaymentIntent', stub):
+            for _ in range(times):
+                response = self.client.get(self.url)
+        return response.context['client_secret']
+
+    def test_intent_is_created_once_and_reused(self):
+        """
+        Test that repeated visits create one intent and then reuse its
+        stored client secret without calling Stripe.
+        """
+
+        stub = StripeStub()
+        self.assertEqual(self.visit(stub, times=3), 'pi_1_secret')
+        self.assertEqual(len(stub.calls), 1)
+        self.assertEqual(stub.calls[0][1]['amount'], 8500)
+        self.assertIn('idempotency_key', stub.calls[0][1])
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.stripe_payment_intent_id, 'pi_1')
+        self.assertEqual(self.order.stripe_amount, 8500)
+
+    def test_changed_total_updates_the_intent(self):
+        """
+        Test that a changed order total updates the existing intent once.
+        """
+
+        stub = StripeStub()
+        self.visit(stub)
+        Order.objects.filter(pk=self.order.pk).update(
+            order_total=Decimal('90.00')
+        )
+        self.assertEqual(self.visit(stub, times=2), 'pi_1_secret')
+        self.assertEqual(
+            stub.calls[1:], [('modify', 'pi_1', {'amount': 9000})]
+        )
+
+    def test_intent_is_replaced_when_it_cannot_be_updated(self):
+        """
+        Test that a new intent is created when Stripe refuses to update
+        the stored one.
+        """
+
+        stub = StripeStub(frozen=['pi_1'])
+        self.visit(stub)
+        Order.objects.filter(pk=self.order.pk).update(
+            order_total=Decimal('90.00')
+        )
+        self.assertEqual(self.visit(stub), 'pi_3_secret')
+        self.assertEqual([call[0] for call in stub.calls],
+                         ['create', 'modify', 'create'])
+        self.assertNotIn('idempotency_key', stub.calls[2][1])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.stripe_payment_intent_id, 'pi_3')
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        """
+        Set up a pending order paid by a Stripe PaymentIntent.
+        """
+
+        delivery = DeliveryMethod.objects.create(name='Standard',
+                                                 price=Decimal('5'))
+        self.order = Order.objects.create(
+            shipping_full_name='Web Hook', shipping_email='hook@example.com',
+            shipping_address1='1 Street', shipping_city='Limerick',
+            shipping_zipcode='V94', shipping_country='Ireland',
+            delivery_method=delivery, order_total=Decimal('85.00'),
+        )
+
+    def post_event(self, event_id, event_type='payment_intent.succeeded',
+                   signature=None):
+        """
+        Posts a Stripe event to the webhook, signed with the test secret.
+        """
+
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': {
+                'object': 'payment_intent',
+                'metadata': {'order_number': self.order.order_number},
+            }},
+        })
+        timestamp = int(time.time())
+        if signature is None:
+            signature = hmac.new(b'whsec_test',
+                                 f'{timestamp}.{payload}'.encode(),
+                                 hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('stripe_webhook'), payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+
+    def test_webhook_stores_event_and_acknowledges(self):
+        """
+        Test that the webhook only stores verified events, once per event
+        id, without touching the order or sending email.
+        """
+
+        self.assertEqual(self.post_event('evt_1').status_code, 200)
+        self.assertEqual(self.post_event('evt_1').status_code, 200)
+        self.assertEqual(
+            self.post_event('evt_2', signature='0' * 64).status_code, 400
+        )
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.event_id, 'evt_1')
+        self.assertEqual(event.status, WebhookEventStatus.PENDING)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.PENDING)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_processes_events(self):
+        """
+        Test that the worker command updates the order, queues the
+        confirmation and marks the event processed.
+        """
+
+        self.post_event('evt_1')
+        out = StringIO()
+        call_command('process_webhook_events', stdout=out)
+        self.assertIn('Processed 1 webhook events', out.getvalue())
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.PROCESSING)
+        self.assertEqual(len(mail.outbox), 0)
+        send_queued_emails()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['hook@example.com'])
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.PROCESSED)
+        self.assertIsNotNone(event.processed_on)
+
+        self.post_event('evt_1')
+        self.assertEqual(process_webhook_inbox()['processed'], 0)
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2, WEBHOOK_RETRY_DELAY=30)
+    def test_failed_events_back_off_and_give_up(self):
+        """
+        Test that failing events are rescheduled with backoff and marked
+        failed after the maximum number of attempts.
+        """
+
+        self.post_event('evt_1', event_type='payment_intent.payment_failed')
+        broken = mock.Mock(side_effect=RuntimeError('database away'))
+        key = ('stripe', 'payment_intent.payment_failed')
+
+        with mock.patch.dict('orders.inbox.EVENT_HANDLERS', {key: broken}):
+            self.assertEqual(process_webhook_inbox()['retried'], 1)
+            event = WebhookEvent.objects.get()
+            self.assertEqual(event.attempts, 1)
+            self.assertEqual(event.last_error, 'RuntimeError: database away')
+            self.assertGreater(event.next_attempt_at,
+                               timezone.now() + timedelta(seconds=25))
+
+            self.assertEqual(process_webhook_inbox()['retried'], 0)
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(process_webhook_inbox()['failed'], 1)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEventStatus.FAILED)
+        self.assertEqual(broken.call_count, 2)
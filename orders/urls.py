@@ -7,7 +7,12 @@ and the Stripe webhook endpoint.
 """
 
 from django.urls import path
-from .views import CreateOrderView, PaymentView, OrderConfirmationView
+from .views import (
+    CreateOrderView,
+    PaymentView,
+    OrderConfirmationView,
+    ReorderView,
+)
 from .webhooks import StripeWebhookView
 
 urlpatterns = [
@@ -29,6 +34,12 @@ urlpatterns = [
         OrderConfirmationView.as_view(),
         name='order_confirmation'
     ),
+    # URL for adding a past order's items back to the cart
+    path(
+        'reorder/<str:order_number>/',
+        ReorderView.as_view(),
+        name='reorder'
+    ),
     # URL for the Stripe webhook handler
     path(
         'stripe/webhook/',
@@ -11,14 +11,17 @@ from django.shortcuts import render, redirect, get_object_or_404, reverse
 from django.views import View
 from django.contrib import messages
 from dataclasses import dataclass
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.conf import settings
 from cart.models import Cart, CartItem
-from cart.context_processors import cart_context
-from cart.constants import GUEST_CART_SESSION_ID
-from products.models import Product
+from cart.cache import get_cart_owner, invalidate_cart_summary
+from cart.snapshot import get_cart_snapshot
+from cart.quantities import merge_into_cart
+from cart.session import SessionCart
 from .models import Order, OrderItem, DeliveryMethod, OrderStatus
 from .forms import DeliveryMethodForm, OrderItemFormSet
+from .payments import get_payment_intent_secret
+from .reservations import convert_reservations, reserve_stock
 from profiles.forms import ShippingAddressForm
 from profiles.models import ShippingAddress as ProfileShippingAddress
 from decimal import Decimal
@@ -65,15 +68,20 @@ class CreateOrderView(View):
     """
 
     template_name = 'orders/checkout.html'
+    checkout_tokens_session_key = 'checkout_tokens'
+    max_checkout_tokens = 10
 
     def get(self, request, *args, **kwargs):
         """
         Handles GET requests for the checkout page.
 
-        Retrieves cart contents, initializes shipping, delivery, and item
-        forms. Pre-populates shipping form if user is authenticated and
-        has a saved address. Populates the context with necessary data for
-        rendering the checkout template.
+        Retrieves cart contents from the request's cart snapshot (shared
+        with the context processor, so the cart and its products are loaded
+        once per render), places short-lived stock reservations for
+        them, initializes shipping, delivery, and item forms. Pre-populates
+        shipping form if user is authenticated and has a saved address.
+        Populates the context with necessary data for rendering the
+        checkout template, including a fresh checkout token.
 
         :param request: The HttpRequest object.
         :type request: django.http.HttpRequest
@@ -83,8 +91,8 @@ class CreateOrderView(View):
         :rtype: django.http.HttpResponse
         """
 
-        cart_data = cart_context(request)
-        current_cart_items = cart_data.get('current_cart_items', [])
+        cart_snapshot = get_cart_snapshot(request, fresh=True)
+        current_cart_items = cart_snapshot.items
 
         if not current_cart_items:
             messages.warning(
@@ -94,7 +102,6 @@ class CreateOrderView(View):
             return redirect(reverse('product_list'))
 
         initial_formset_data = []
-        product_ids = []
         for item in current_cart_items:
             product_obj = None
             quantity = 0
@@ -110,9 +117,25 @@ class CreateOrderView(View):
                 initial_formset_data.append(
                     {'product_id': product_id, 'quantity': quantity}
                 )
-                product_ids.append(product_id)
 
-        products_in_cart = Product.objects.in_bulk(list(set(product_ids)))
+        products_in_cart = cart_snapshot.products
+
+        holder = get_cart_owner(request)
+        if holder:
+            quantities = {}
+            for data in initial_formset_data:
+                product_id = data['product_id']
+                quantities[product_id] = (
+                    quantities.get(product_id, 0) + data['quantity']
+                )
+            for product_id in reserve_stock(holder, quantities):
+                message = (
+                    f"{products_in_cart[product_id].name} is in high "
+                    f"demand and could not be reserved for you. It may "
+                    f"sell out before you complete your order."
+                )
+                messages.warning(request, message)
+
         initial_shipping_data = None
 
         if request.user.is_authenticated:
@@ -160,27 +183,85 @@ class CreateOrderView(View):
             'shipping_form': shipping_form,
             'delivery_form': delivery_form,
             'order_item_formset': order_item_formset,
-            'current_cart_total': cart_data.get(
-                'current_cart_total',
-                Decimal('0.00')
-            ),
-            'current_cart_item_count': cart_data.get(
-                'current_cart_item_count',
-                0
-            ),
             'delivery_costs_data': delivery_costs_dict,
+            'checkout_token': self.issue_checkout_token(request),
         }
         return render(request, self.template_name, context)
 
+    def issue_checkout_token(self, request):
+        """
+        Issues a new checkout token and remembers it in the session.
+
+        Only the `max_checkout_tokens` most recent tokens are kept, so the
+        session stays small; an older form is submitted without a token.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :return: The new token.
+        :rtype: str
+        """
+
+        token = Order.generate_checkout_token()
+        tokens = request.session.get(self.checkout_tokens_session_key, [])
+        request.session[self.checkout_tokens_session_key] = (
+            tokens + [token]
+        )[-self.max_checkout_tokens:]
+        return token
+
+    def get_checkout_token(self, request):
+        """
+        Returns the checkout token submitted with the form, if it was
+        issued to this session.
+
+        Tokens stay in the session after the order is placed, so repeated
+        submissions of the same form still find its order.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :return: The token, or None if it is missing or unknown.
+        :rtype: str | None
+        """
+
+        token = request.POST.get('checkout_token')
+        if token and token in request.session.get(
+                self.checkout_tokens_session_key, []):
+            return token
+        return None
+
+    def get_submitted_order(self, checkout_token):
+        """
+        Returns the order already placed with a checkout token, if any.
+
+        :param checkout_token: The token submitted with the checkout form.
+        :type checkout_token: str | None
+        :return: The existing order, or None.
+        :rtype: orders.models.Order | None
+        """
+
+        if not checkout_token:
+            return None
+        return Order.objects.filter(
+            checkout_token=checkout_token
+        ).only('order_number').first()
+
     def post(self, request, *args, **kwargs):
         """
         Handles POST requests for submitting the checkout form.
 
-        Validates shipping, delivery, and item forms. If valid, creates
-        an Order and associated OrderItems within a transaction, updates
-        product stock, saves the shipping address to the profile if requested,
-        and redirects to the payment page. If invalid, re-renders the checkout
-        page with errors.
+        Validates shipping, delivery, and item forms, resolving the item
+        products from the request's cart snapshot. If valid, converts the
+        stock reservations placed when checkout started into a single
+        guarded stock decrement (see `orders.reservations`), creates the
+        Order and bulk-creates its OrderItems at the snapshot prices within
+        a transaction, saves the shipping address to the profile if
+        requested, and redirects to the payment page. If the stock is short
+        or the forms are invalid, the transaction is rolled back and the
+        checkout page is re-rendered with errors.
+
+        The form carries a checkout token issued to the session that is
+        stored on the order; a repeated submission of the same form is
+        redirected to the payment page of the order it created without
+        redoing any work. Tokens not issued to the session are ignored.
 
         :param request: The HttpRequest object.
         :type request: django.http.HttpRequest
@@ -190,6 +271,19 @@ class CreateOrderView(View):
         :rtype: django.http.HttpResponse
         """
 
+        checkout_token = self.get_checkout_token(request)
+
+        # A repeated submission (double click, browser retry) continues
+        # with the order it already created instead of placing another.
+        submitted_order = self.get_submitted_order(checkout_token)
+        if submitted_order is not None:
+            return redirect(
+                reverse(
+                    'payment_page',
+                    kwargs={'order_number': submitted_order.order_number}
+                )
+            )
+
         shipping_form = ShippingAddressForm(
             request.POST,
             prefix='shipping'
@@ -198,9 +292,11 @@ class CreateOrderView(View):
             request.POST,
             prefix='delivery'
         )
+        cart_snapshot = get_cart_snapshot(request, fresh=True)
         order_item_formset = OrderItemFormSet(
             request.POST,
-            prefix='items'
+            prefix='items',
+            form_kwargs={'products': cart_snapshot.products}
         )
 
         users_cart = None
@@ -272,12 +368,13 @@ class CreateOrderView(View):
                             request.user if request.user.is_authenticated
                             else None
                         ),
-                        'cart': users_cart
+                        'cart': users_cart,
+                        'checkout_token': checkout_token,
                     }
 
-                    order = Order.objects.create(**order_data)
-                    final_ord_total = Decimal('0.00')
-                    products_to_update = {}
+                    ordered_quantities = {}
+                    forms_by_product = {}
+                    lines = []
 
                     for form in order_item_formset:
                         cleaned_data = form.cleaned_data
@@ -292,10 +389,8 @@ class CreateOrderView(View):
                             messages.error(request, message)
                             raise ValueError("Invalid item data in formset.")
 
-                        try:
-                            product = Product.objects.select_for_update().get(
-                                id=product_id)
-                        except Product.DoesNotExist:
+                        product = form.product
+                        if product is None:
                             message = (
                                 f"Sorry, a product in your order "
                                 f"(ID: {product_id}) is no longer available. "
@@ -306,36 +401,52 @@ class CreateOrderView(View):
                                 f"Product not found: {product_id}"
                             )
 
-                        if product.stock_quantity < quantity:
-                            msg = (
-                                f"Insufficient stock for {product.name}. "
-                                f"Only {product.stock_quantity} available."
-                            )
-                            form.add_error('quantity', msg)
-                            message = (
-                                f"Not enough stock for {product.name}. "
-                                f"Please adjust the quantity."
-                            )
-                            messages.error(request, message)
-                            raise ValueError(
-                                f"Insufficient stock for {product.name}"
-                            )
-
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            price=product.price,
-                            quantity=quantity,
+                        lines.append((product.id, quantity, product.price))
+                        ordered_quantities[product.id] = (
+                            ordered_quantities.get(product.id, 0) + quantity
                         )
-                        final_ord_total += (product.price * Decimal(quantity))
-                        products_to_update[product] = quantity
+                        forms_by_product[product.id] = (form, product)
+
+                    # The stock of all products is taken with one guarded
+                    # UPDATE, so the cost of placing an order does not grow
+                    # with the size of the cart.
+                    failed = convert_reservations(get_cart_owner(request),
+                                                  ordered_quantities)
+                    for product_id in failed:
+                        form, product = forms_by_product[product_id]
+                        form.add_error(
+                            'quantity',
+                            f"Insufficient stock for {product.name}."
+                        )
+                        message = (
+                            f"Not enough stock for {product.name}. "
+                            f"Please adjust the quantity."
+                        )
+                        messages.error(request, message)
+                    if failed:
+                        raise ValueError("Insufficient stock.")
 
-                    for product, ord_quantity in products_to_update.items():
-                        product.stock_quantity -= ord_quantity
-                        product.save(update_fields=['stock_quantity'])
+                    order_items = []
+                    final_ord_total = Decimal('0.00')
+                    for product_id, quantity, price in lines:
+                        # bulk_create() skips OrderItem.save(), so the line
+                        # total is computed here.
+                        lineitem_total = price * quantity
+                        order_items.append(OrderItem(
+                            product_id=product_id,
+                            price=price,
+                            quantity=quantity,
+                            lineitem_total=lineitem_total,
+                        ))
+                        final_ord_total += lineitem_total
 
-                    order.order_total = final_ord_total + delivery_method.price
-                    order.save(update_fields=['order_total'])
+                    order = Order.objects.create(
+                        order_total=final_ord_total + delivery_method.price,
+                        **order_data
+                    )
+                    for order_item in order_items:
+                        order_item.order = order
+                    OrderItem.objects.bulk_create(order_items)
                     messages.info(
                         request,
                         "Order details saved successfully!"
@@ -349,6 +460,24 @@ class CreateOrderView(View):
 
             except ValueError as e:
                 pass
+            except IntegrityError:
+                # A concurrent submission with the same token won the race.
+                submitted_order = self.get_submitted_order(checkout_token)
+                if submitted_order is not None:
+                    return redirect(
+                        reverse(
+                            'payment_page',
+                            kwargs={
+                                'order_number': submitted_order.order_number
+                            }
+                        )
+                    )
+                message = (
+                    "An unexpected error occurred while creating "
+                    "your order. Please try again or contact support "
+                    "if the problem persists."
+                )
+                messages.error(request, message)
             except Exception as e:
                 message = (
                     "An unexpected error occurred while creating "
@@ -363,53 +492,19 @@ class CreateOrderView(View):
                 "Please correct the errors highlighted below."
             )
 
-        cart_data = cart_context(request)
         delivery_methods = DeliveryMethod.objects.filter(is_active=True)
         delivery_costs_dict = {str(method.id): method.price for method in
                                delivery_methods}
 
-        product_ids_from_post = []
-        if order_item_formset.is_bound:
-            for i in range(order_item_formset.total_form_count()):
-                key = f'{order_item_formset.prefix}-{i}-product_id'
-                pid_str = request.POST.get(key)
-                if pid_str:
-                    try:
-                        product_ids_from_post.append(int(pid_str))
-                    except (ValueError, TypeError):
-                        pass
-
-        products_for_formset = Product.objects.in_bulk(
-            list(set(product_ids_from_post))
-        )
-
-        for form in order_item_formset.forms:
-            pid_str = form.data.get(f'{form.prefix}-product_id')
-            pid = None
-            if pid_str:
-                try:
-                    pid = int(pid_str)
-                except (ValueError, TypeError):
-                    pass
-
-            if pid:
-                form.product = products_for_formset.get(pid)
-            else:
-                form.product = None
-
+        # The forms resolved their products while validating.
         context = {
             'shipping_form': shipping_form,
             'delivery_form': delivery_form,
             'order_item_formset': order_item_formset,
-            'current_cart_total': cart_data.get(
-                'current_cart_total',
-                Decimal('0.00')
-            ),
-            'current_cart_item_count': cart_data.get(
-                'current_cart_item_count',
-                0
-            ),
             'delivery_costs_data': delivery_costs_dict,
+            'checkout_token': (
+                checkout_token or self.issue_checkout_token(request)
+            ),
         }
         return render(request, self.template_name, context)
 
@@ -418,8 +513,9 @@ class PaymentView(View):
     """
     Handles displaying the payment page for a specific order.
 
-    Initializes a Stripe Payment Intent, retrieves the order details,
-    and renders the payment form including the Stripe Elements integration.
+    Initializes or reuses the order's Stripe Payment Intent, retrieves the
+    order details, and renders the payment form including the Stripe
+    Elements integration.
     Performs checks to ensure the order exists, belongs to the user
     (if authenticated), and is in a payable status (PENDING).
     """
@@ -430,9 +526,10 @@ class PaymentView(View):
         """
         Handles GET requests for the payment page.
 
-        Fetches the order, validates permissions and order status, creates
-        a Stripe Payment Intent, and renders the payment template with
-        necessary context.
+        Fetches the order, validates permissions and order status, gets the
+        order's Stripe Payment Intent (created on the first visit and
+        reused afterwards, see `orders.payments`), and renders the payment
+        template with necessary context.
 
         :param request: The HttpRequest object.
         :type request: django.http.HttpRequest
@@ -485,18 +582,9 @@ class PaymentView(View):
             )
             return redirect(reverse('checkout'))
 
-        stripe_total = int(order.order_total * 100)
-
         try:
             u_id = request.user.id if request.user.is_authenticated else None
-            intent = stripe.PaymentIntent.create(
-                amount=stripe_total,
-                currency='eur',
-                metadata={
-                    'order_number': order.order_number,
-                    'user_id': u_id,
-                }
-            )
+            client_secret = get_payment_intent_secret(order, u_id)
         except stripe.error.StripeError as e:
             messages.error(
                 request,
@@ -518,7 +606,7 @@ class PaymentView(View):
             'order': order,
             'subtotal': subtotal,
             'stripe_public_key': settings.STRIPE_PUBLIC_KEY,
-            'client_secret': intent.client_secret,
+            'client_secret': client_secret,
         }
         return render(request, self.template_name, context)
 
@@ -654,12 +742,14 @@ class OrderConfirmationView(View):
                 )
 
             if redirect_status == 'succeeded':
-                guest_cart_id = GUEST_CART_SESSION_ID
                 if order.cart:
                     CartItem.objects.filter(cart=order.cart).delete()
-                elif not order.user and guest_cart_id in request.session:
-                    del request.session[guest_cart_id]
-                    request.session.modified = True
+                    invalidate_cart_summary(user_id=order.cart.user_id)
+                elif not order.user:
+                    session_cart = SessionCart(request.session)
+                    if session_cart:
+                        session_cart.clear()
+                        invalidate_cart_summary(request)
         else:
             success_statuses = {
                 OrderStatus.PROCESSING,
@@ -702,3 +792,123 @@ class OrderConfirmationView(View):
         }
 
         return render(request, self.template_name, context)
+
+
+class ReorderView(View):
+    """
+    Adds the lines of a past order back to the current cart.
+
+    The order's items, with the current stock and active status of their
+    products, are read in one query. The lines are then merged into the
+    cart in one bulk operation (database carts) or one session write
+    (guest carts), clamped to the available stock. Lines that could not be
+    added in full are reported.
+    """
+
+    def post(self, request, order_number, *args, **kwargs):
+        """
+        Handles POST requests to reorder a past order.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param order_number: The unique identifier for the order.
+        :type order_number: str
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: A redirect to the checkout page, or back to the order if
+                 nothing could be added.
+        :rtype: django.http.HttpResponseRedirect
+        """
+
+        order = get_object_or_404(Order, order_number=order_number)
+
+        if order.user is not None and order.user != request.user:
+            messages.error(request, "Permission Denied.")
+            return redirect(reverse('product_list'))
+
+        order_items = OrderItem.objects.filter(order=order).select_related(
+            'product'
+        ).only(
+            'quantity', 'product', 'product__name',
+            'product__stock_quantity', 'product__reserved_quantity',
+            'product__is_active'
+        )
+
+        quantities = {}
+        names = {}
+        stock = {}
+        for item in order_items:
+            product = item.product
+            quantities[product.pk] = (
+                quantities.get(product.pk, 0) + item.quantity
+            )
+            names[product.pk] = product.name
+            if product.is_active:
+                stock[product.pk] = product.available_quantity
+
+        if request.user.is_authenticated:
+            with transaction.atomic():
+                added = merge_into_cart(Cart.for_user(request.user),
+                                        quantities, stock)
+        else:
+            added = self._merge_into_session_cart(request, quantities, stock)
+        invalidate_cart_summary(request)
+
+        for product_id, quantity in quantities.items():
+            quantity_added = added.get(product_id, 0)
+            if quantity_added == quantity:
+                continue
+            if product_id not in stock:
+                message = f"{names[product_id]} is no longer available."
+            elif quantity_added:
+                message = (
+                    f"Only {quantity_added} of {quantity} x "
+                    f"{names[product_id]} could be added due to "
+                    f"limited stock."
+                )
+            else:
+                message = (
+                    f"{names[product_id]} could not be added; there is no "
+                    f"more stock available."
+                )
+            messages.warning(request, message)
+
+        if not any(added.values()):
+            messages.error(request, "No items from this order could be "
+                                    "added to your cart.")
+            return redirect(reverse(
+                'order_confirmation',
+                kwargs={'order_number': order.order_number}
+            ))
+
+        messages.success(
+            request,
+            f"Items from order #{order.order_number} were added to your cart."
+        )
+        return redirect(reverse('checkout'))
+
+    def _merge_into_session_cart(self, request, quantities, stock):
+        """
+        Adds the quantities to a guest's session cart, clamped to stock.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param quantities: The quantities to add by product id.
+        :type quantities: dict[int, int]
+        :param stock: The available stock by product id.
+        :type stock: dict[int, int]
+        :return: The quantities actually added by product id.
+        :rtype: dict[int, int]
+        """
+
+        session_cart = SessionCart(request.session)
+        added = {}
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                continue
+            current_quantity = session_cart.get(product_id)
+            new_quantity = min(current_quantity + quantity, stock[product_id])
+            added[product_id] = max(new_quantity - current_quantity, 0)
+            if added[product_id]:
+                session_cart.set(product_id, new_quantity)
+        return added
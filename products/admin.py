@@ -14,6 +14,8 @@ from .models import (
     ProductSpecification,
     Review
 )
+from .ratings import refresh_rating_aggregates
+from django.db import transaction
 from django.utils.html import format_html
 
 
@@ -58,7 +60,8 @@ class ProductAdmin(admin.ModelAdmin):
     for specifications.
     """
 
-    list_display = ('name', 'price', 'created_on', 'updated_on', 'image_tag')
+    list_display = ('name', 'price', 'rating_avg', 'rating_count',
+                    'created_on', 'updated_on', 'image_tag')
     search_fields = ('name',)
     inlines = [ProductSpecificationInline]
 
@@ -118,7 +121,8 @@ class ReviewAdmin(admin.ModelAdmin):
     provides a bulk action to approve multiple reviews.
     """
 
-    list_display = ('product', 'user', 'rating', 'is_approved', 'created_on')
+    list_display = ('product', 'user', 'rating', 'sentiment_score',
+                    'is_approved', 'created_on')
     list_filter = ('rating', 'created_on', 'is_approved')
     search_fields = ('user__username', 'product__name', 'comment')
     readonly_fields = ('created_on', 'updated_on')
@@ -130,12 +134,18 @@ class ReviewAdmin(admin.ModelAdmin):
         Bulk action to approve selected reviews.
 
         Updates the `is_approved` field to True for all reviews in
-        the queryset.
+        the queryset and refreshes the rating aggregates of the affected
+        products in the same transaction (`update()` sends no signals).
 
         :param request: The HttpRequest object.
         :param queryset: The QuerySet of selected Review objects.
         """
 
-        queryset.update(is_approved=True)
+        with transaction.atomic():
+            product_ids = set(
+                queryset.values_list('product_id', flat=True)
+            )
+            queryset.update(is_approved=True)
+            refresh_rating_aggregates(product_ids)
 
     approve_reviews.short_description = "Approve selected reviews"
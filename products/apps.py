@@ -1,7 +1,8 @@
 """
 Application configuration for the products app.
 
-Defines the configuration class for the 'products' Django application.
+Defines the configuration class for the 'products' Django application,
+including importing signals when the app is ready.
 """
 
 from django.apps import AppConfig
@@ -14,3 +15,13 @@ class ProductsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        """
+        Called when the Django application registry is fully populated.
+
+        Used here to import the application's signal handlers, ensuring
+        the search index is kept in sync once the application starts.
+        """
+
+        import products.signals  # noqa
@@ -0,0 +1,212 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+`PrefixIndex` keeps every searchable key (product names, SKUs and category
+names, plus each word-suffix of them so "pi" finds "Raspberry Pi 5") in one
+sorted list. A lookup is a binary search followed by a short forward scan,
+so it stays well below a millisecond and never touches the database.
+
+Each process holds one index. It is built at startup (`warm_prefix_index`
+is called from the WSGI module) or on first use, and rebuilt when the
+catalog cache version changes (product and category saves bump it, see
+`products.signals`) or after `MAX_INDEX_AGE` seconds, which bounds staleness
+for worker processes that did not see the change themselves.
+"""
+
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from django.db import DatabaseError
+from .cache import get_catalog_version
+from .models import Category, Product
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+MAX_INDEX_AGE = 60 * 5
+MAX_SUGGESTIONS = 20
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    Normalizes text for prefix matching (case folded, single spaced).
+
+    :param text: The text to normalize.
+    :return: The normalized text.
+    :rtype: str
+    """
+
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    A compact, immutable prefix index over suggestion entries.
+
+    :param entries: A sequence of (kind, reference, label, keys) tuples,
+                    where kind is PRODUCT or CATEGORY, reference is the
+                    product id or category slug, label is the displayed
+                    text and keys are the texts that should match.
+    """
+
+    def __init__(self, entries):
+        self.entries = []
+        postings = []
+
+        for kind, reference, label, keys in entries:
+            entry_id = len(self.entries)
+            self.entries.append((kind, reference, label))
+            for key in {normalize(key) for key in keys if key}:
+                for match in WORD_RE.finditer(key):
+                    postings.append((key[match.start():], entry_id))
+
+        postings.sort()
+        self.keys = [key for key, _ in postings]
+        self.entry_ids = array('I', (entry_id for _, entry_id in postings))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prefix, limit=8):
+        """
+        Returns the entries with a key starting with the prefix.
+
+        Entries whose whole label starts with the prefix are listed before
+        those matching at a later word; ties keep alphabetical order.
+
+        :param prefix: The text typed so far.
+        :param limit: Maximum number of results.
+        :return: Up to `limit` (kind, reference, label) tuples.
+        :rtype: list[tuple]
+        """
+
+        prefix = normalize(prefix)
+        if not prefix or limit < 1:
+            return []
+
+        matches = []
+        seen = set()
+        position = bisect_left(self.keys, prefix)
+        while (position < len(self.keys) and len(matches) < limit * 4
+               and self.keys[position].startswith(prefix)):
+            entry_id = self.entry_ids[position]
+            position += 1
+            if entry_id in seen:
+                continue
+            seen.add(entry_id)
+            matches.append(entry_id)
+
+        matches.sort(key=lambda entry_id: (
+            not normalize(self.entries[entry_id][2]).startswith(prefix),
+            self.entries[entry_id][0] != CATEGORY,
+            self.entries[entry_id][2].casefold(),
+        ))
+        return [self.entries[entry_id] for entry_id in matches[:limit]]
+
+    def memory_usage(self):
+        """
+        Estimates the memory held by the index.
+
+        Counts the containers, the key strings and the entry tuples with
+        their strings (shared objects are counted once).
+
+        :return: The approximate size in bytes.
+        :rtype: int
+        """
+
+        seen = set()
+        total = 0
+        objects = [self.entries, self.keys, self.entry_ids]
+        objects.extend(self.keys)
+        for entry in self.entries:
+            objects.append(entry)
+            objects.extend(entry)
+
+        for obj in objects:
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+        return total
+
+
+def build_prefix_index():
+    """
+    Builds a prefix index of active products and all categories.
+
+    Uses two queries reading only the indexed columns.
+
+    :return: The new index.
+    :rtype: PrefixIndex
+    """
+
+    products = Product.objects.filter(is_active=True).values_list(
+        'pk', 'name', 'sku'
+    )
+    categories = Category.objects.values_list('slug', 'name')
+    entries = [
+        (PRODUCT, pk, name, (name, sku)) for pk, name, sku in products
+    ]
+    entries.extend(
+        (CATEGORY, slug, name, (name,)) for slug, name in categories
+    )
+    return PrefixIndex(entries)
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'version': None, 'built_at': 0.0}
+
+
+def _is_stale(version):
+    """
+    Checks whether this process's index must be (re)built.
+
+    :param version: The current catalog cache version.
+    :return: True if the index is missing, outdated or too old.
+    :rtype: bool
+    """
+
+    return (
+        _state['index'] is None
+        or _state['version'] != version
+        or time.monotonic() - _state['built_at'] > MAX_INDEX_AGE
+    )
+
+
+def get_prefix_index():
+    """
+    Returns this process's prefix index, (re)building it when it is
+    missing, the catalog version changed or it is older than
+    `MAX_INDEX_AGE`.
+
+    The new index is built completely before it replaces the old one, so
+    concurrent lookups never see a partial index.
+
+    :return: A current prefix index.
+    :rtype: PrefixIndex
+    """
+
+    version = get_catalog_version()
+    if _is_stale(version):
+        with _lock:
+            if _is_stale(version):
+                index = build_prefix_index()
+                _state.update(index=index, version=version,
+                              built_at=time.monotonic())
+    return _state['index']
+
+
+def warm_prefix_index():
+    """
+    Builds the prefix index ahead of the first request.
+
+    Database errors (e.g. before the first migration) are ignored; the
+    index is then built on first use instead.
+    """
+
+    try:
+        get_prefix_index()
+    except DatabaseError:
+        pass
@@ -0,0 +1,124 @@
+"""
+Cache versioning helpers for the products application.
+
+Cached catalog data is keyed on a version number instead of being deleted
+key by key: bumping the version makes every previously cached entry
+unreachable, and the stale entries simply expire. Versions only work if
+every process reads them from the same cache, see `CACHES` in the
+settings.
+
+Versions are bumped by the model signals (see `products.signals`), so
+changes made without them, such as queryset updates or a related
+product's own changes, are only picked up when the cached entries
+expire. Entries are therefore cached for a few minutes only.
+
+Versions start from the current time in milliseconds, so a version key
+evicted from the cache never restarts at a number that old entries may
+still be stored under. Bumps are deferred until the current transaction
+commits, so a concurrent request cannot cache the old data under the new
+version before the change is visible.
+"""
+
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+PRODUCT_VERSION_KEY = 'products:product_version:{}'
+
+
+def _initial_version():
+    """
+    :return: A fresh version number based on the current time.
+    :rtype: int
+    """
+
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """
+    Returns the version stored under a key, initializing it if missing.
+
+    :param key: The cache key of the version.
+    :return: The version number.
+    :rtype: int
+    """
+
+    return cache.get_or_set(key, _initial_version, timeout=None)
+
+
+def _bump_version(key):
+    """
+    Increments the version stored under a key.
+
+    :param key: The cache key of the version.
+    """
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def bump_versions(keys):
+    """
+    Increments the versions stored under keys once the current transaction
+    commits.
+
+    :param keys: The cache keys of the versions.
+    """
+
+    keys = set(keys)
+
+    def bump():
+        for key in keys:
+            _bump_version(key)
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog-wide cache version.
+
+    :return: The version number.
+    :rtype: int
+    """
+
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Invalidates all catalog-wide cached data (e.g. facet counts).
+
+    Called whenever a product, category or specification changes; the
+    bump happens when the current transaction commits.
+    """
+
+    bump_versions([CATALOG_VERSION_KEY])
+
+
+def get_product_version(product_id):
+    """
+    Returns the cache version of a single product's cached data.
+
+    :param product_id: The primary key of the product.
+    :return: The version number.
+    :rtype: int
+    """
+
+    return get_version(PRODUCT_VERSION_KEY.format(product_id))
+
+
+def bump_product_versions(product_ids):
+    """
+    Invalidates the cached data (e.g. the detail page) of products once
+    the current transaction commits.
+
+    :param product_ids: Primary keys of the changed products.
+    """
+
+    bump_versions(PRODUCT_VERSION_KEY.format(pk) for pk in product_ids)
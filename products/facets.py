@@ -0,0 +1,135 @@
+"""
+Faceted navigation counts for the product list.
+
+Computes, for the current search and filter state, how many products fall
+into each category and each specification value. Both facet families are
+produced by one UNION ALL of two grouped queries, so the cost does not grow
+with the number of facets, and the result is cached per normalized filter
+key and catalog version. Changes that do not bump the catalog version
+(see `products.cache`) show once the entry expires.
+"""
+
+import hashlib
+import json
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Min, Value
+from .cache import get_catalog_version
+from .filters import parse_spec_filter
+from .models import Product, ProductSpecification
+
+FACET_CACHE_TIMEOUT = 60 * 2
+CATEGORY_FACET = 'category'
+SPECIFICATION_FACET = 'spec'
+
+
+def facet_cache_key(search_query, category_slugs, spec_filters=()):
+    """
+    Builds the cache key for a filter state.
+
+    The search query and specification filters are case and whitespace
+    normalized and the filters are de-duplicated and sorted, so equivalent
+    URLs share an entry.
+
+    :param search_query: The raw search string (or None).
+    :param category_slugs: The selected category slugs.
+    :param spec_filters: The raw "<type>:<value>" specification filters.
+    :return: A cache key including the current catalog version.
+    :rtype: str
+    """
+
+    specs = {parse_spec_filter(raw) for raw in spec_filters} - {None}
+    normalized = {
+        'q': ' '.join((search_query or '').lower().split()),
+        'category': sorted(set(category_slugs)),
+        'spec': sorted(specs),
+    }
+    digest = hashlib.md5(
+        json.dumps(normalized, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return f'products:facets:{get_catalog_version()}:{digest}'
+
+
+def compute_facets(category_base, spec_base):
+    """
+    Counts products per category and per specification value.
+
+    Specification values are grouped by their normalized form and labelled
+    with one of the spellings in use.
+
+    :param category_base: Product queryset the category counts are taken
+                          over (the filter state without the category
+                          filter itself, so other categories stay
+                          selectable).
+    :param spec_base: Product queryset the specification counts are taken
+                      over (the full filter state).
+    :return: A dict with 'categories' (category id -> count) and
+             'specifications' (a list of dicts with 'spec_type_id',
+             'name' and 'values', a list of (value, count) pairs).
+    :rtype: dict
+    """
+
+    category_rows = Product.categories.through.objects.filter(
+        product_id__in=category_base.order_by().values('pk')
+    ).annotate(
+        kind=Value(CATEGORY_FACET, output_field=CharField()),
+        key=F('category_id'),
+        name=F('category__name'),
+        value_key=Value('', output_field=CharField()),
+    ).values('kind', 'key', 'name', 'value_key').annotate(
+        label=Min(Value('', output_field=CharField())),
+        product_count=Count('product_id', distinct=True)
+    ).order_by()
+
+    spec_rows = ProductSpecification.objects.filter(
+        product_id__in=spec_base.order_by().values('pk')
+    ).annotate(
+        kind=Value(SPECIFICATION_FACET, output_field=CharField()),
+        key=F('spec_type_id'),
+        name=F('spec_type__name'),
+        value_key=F('normalized_value'),
+    ).values('kind', 'key', 'name', 'value_key').annotate(
+        label=Min('value'),
+        product_count=Count('product_id', distinct=True)
+    ).order_by()
+
+    categories = {}
+    spec_types = {}
+    for row in category_rows.union(spec_rows, all=True):
+        if row['kind'] == CATEGORY_FACET:
+            categories[row['key']] = row['product_count']
+        else:
+            spec_type = spec_types.setdefault(row['key'], {
+                'spec_type_id': row['key'],
+                'name': row['name'],
+                'values': [],
+            })
+            spec_type['values'].append((row['label'], row['product_count']))
+
+    specifications = sorted(spec_types.values(), key=lambda s: s['name'])
+    for spec_type in specifications:
+        spec_type['values'].sort(key=lambda item: (-item[1], item[0]))
+
+    return {'categories': categories, 'specifications': specifications}
+
+
+def get_facets(search_query, category_slugs, spec_filters, category_base,
+               spec_base):
+    """
+    Returns cached facet counts for a filter state, computing them on a
+    cache miss.
+
+    :param search_query: The raw search string (or None).
+    :param category_slugs: The selected category slugs.
+    :param spec_filters: The raw "<type>:<value>" specification filters.
+    :param category_base: See `compute_facets`.
+    :param spec_base: See `compute_facets`.
+    :return: The facet counts, as returned by `compute_facets`.
+    :rtype: dict
+    """
+
+    key = facet_cache_key(search_query, category_slugs, spec_filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(category_base, spec_base)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
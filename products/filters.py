@@ -0,0 +1,124 @@
+"""
+Structured specification filters for product listings.
+
+Filters arrive as 'spec' GET parameters of the form "<type name>:<value>",
+e.g. `?spec=RAM:8GB&spec=Storage:128GB`. Values of the same specification
+type are alternatives (OR); different types must all match (AND).
+
+Matching uses `ProductSpecification` as an inverted index: one grouped
+query over the (spec_type, normalized_value, product) index selects the
+products matching every requested type, however many filters are given,
+instead of joining the specification table once per filter.
+"""
+
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from .models import (
+    ProductSpecification,
+    SpecificationType,
+    normalize_spec_value,
+)
+
+SPEC_SEPARATOR = ':'
+
+
+def parse_spec_filter(raw):
+    """
+    Splits a "<type name>:<value>" filter into its normalized parts.
+
+    :param raw: The raw filter string.
+    :return: A (type name, normalized value) tuple, or None if malformed.
+    :rtype: tuple[str, str] | None
+    """
+
+    name, separator, value = raw.partition(SPEC_SEPARATOR)
+    name = ' '.join(name.casefold().split())
+    value = normalize_spec_value(value)
+    if not separator or not name or not value:
+        return None
+    return name, value
+
+
+def parse_spec_filters(raw_filters):
+    """
+    Parses 'spec' parameters and resolves the type names.
+
+    Malformed filters are ignored. Type names are matched case
+    insensitively with one query. Several types may share a name that
+    differs only in case or spacing; requested names resolving to
+    overlapping types are merged, so every type belongs to one filter.
+
+    :param raw_filters: The raw filter strings.
+    :return: A list of (spec type ids, normalized values) tuples, one per
+             distinct requested type; the ids are empty for unknown names.
+    :rtype: list[tuple[frozenset[int], frozenset[str]]]
+    """
+
+    values_by_name = {}
+    for raw in raw_filters:
+        parsed = parse_spec_filter(raw)
+        if parsed:
+            values_by_name.setdefault(parsed[0], set()).add(parsed[1])
+
+    if not values_by_name:
+        return []
+
+    names = Q()
+    for name in values_by_name:
+        names |= Q(name__iexact=name)
+    type_ids_by_name = {}
+    for pk, name in SpecificationType.objects.filter(names).values_list(
+        'pk', 'name'
+    ):
+        key = ' '.join(name.casefold().split())
+        type_ids_by_name.setdefault(key, set()).add(pk)
+
+    groups = []
+    for name, values in sorted(values_by_name.items()):
+        type_ids = set(type_ids_by_name.get(name, ()))
+        values = set(values)
+        if type_ids:
+            for group in [g for g in groups if g[0] & type_ids]:
+                groups.remove(group)
+                type_ids |= group[0]
+                values |= group[1]
+        groups.append((type_ids, values))
+
+    return [
+        (frozenset(type_ids), frozenset(values))
+        for type_ids, values in groups
+    ]
+
+
+def filter_by_specs(queryset, spec_filters):
+    """
+    Restricts a product queryset to products matching all spec filters.
+
+    :param queryset: A Product queryset.
+    :param spec_filters: Filters as returned by `parse_spec_filters`.
+    :return: The filtered queryset.
+    :rtype: django.db.models.QuerySet
+    """
+
+    if not spec_filters:
+        return queryset
+
+    condition = Q()
+    groups = []
+    for index, (type_ids, values) in enumerate(spec_filters):
+        if not type_ids:
+            return queryset.none()
+        condition |= Q(spec_type_id__in=type_ids, normalized_value__in=values)
+        groups.append(When(spec_type_id__in=type_ids, then=Value(index)))
+
+    # Each matching row counts for the filter its type belongs to, so a
+    # product matching one filter through several types counts once.
+    matching = ProductSpecification.objects.filter(condition).values(
+        'product_id'
+    ).annotate(
+        matched_filters=Count(
+            Case(*groups, output_field=IntegerField()), distinct=True
+        )
+    ).filter(
+        matched_filters=len(spec_filters)
+    ).values('product_id')
+    return queryset.filter(pk__in=matching)
@@ -7,7 +7,7 @@ incorporates basic sentiment analysis for automatic approval suggestions.
 
 from django import forms
 from .models import Review
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from .sentiment import get_approval_threshold, score_text
 
 RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
 
@@ -43,9 +43,10 @@ class ReviewForm(forms.ModelForm):
         """
         Overrides the default save method to include sentiment analysis.
 
-        Calculates the sentiment polarity of the review comment using VADER.
-        Sets `is_approved` to True if the compound sentiment score is
-        non-negative (>= 0.05 threshold used here), suggesting automatic
+        Calculates the sentiment polarity of the review comment using the
+        shared VADER analyzer and stores the compound score on the review.
+        Sets `is_approved` to True if the compound sentiment score reaches
+        the approval threshold (0.05 by default), suggesting automatic
         approval for positive reviews.
 
         :param commit: If True, saves the instance to the database.
@@ -56,10 +57,8 @@ class ReviewForm(forms.ModelForm):
         """
 
         review = super().save(commit=False)
-        analyzer = SentimentIntensityAnalyzer()
-        comment_text = review.comment
-        vs = analyzer.polarity_scores(comment_text)
-        review.is_approved = vs['compound'] >= 0.05
+        review.sentiment_score = score_text(review.comment)
+        review.is_approved = review.sentiment_score >= get_approval_threshold()
 
         if commit:
             review.save()
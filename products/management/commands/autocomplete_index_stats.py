@@ -0,0 +1,38 @@
+"""
+Management command to report the size of the autocomplete prefix index.
+
+Usage: python manage.py autocomplete_index_stats
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from products.autocomplete import build_prefix_index
+
+
+class Command(BaseCommand):
+    """
+    Builds the autocomplete prefix index and prints its entry and key
+    counts, approximate memory footprint and build time, so the footprint
+    can be tracked against the catalog size.
+    """
+
+    help = 'Reports the size of the autocomplete prefix index.'
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        started = time.perf_counter()
+        index = build_prefix_index()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Entries: {len(index)}\n'
+            f'Keys: {len(index.keys)}\n'
+            f'Memory: {index.memory_usage() / 1024:.1f} KiB\n'
+            f'Build time: {elapsed * 1000:.1f} ms'
+        )
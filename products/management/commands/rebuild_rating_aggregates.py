@@ -0,0 +1,55 @@
+"""
+Management command to rebuild the stored product rating aggregates.
+
+Usage: python manage.py rebuild_rating_aggregates
+"""
+
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.ratings import refresh_rating_aggregates
+
+
+class Command(BaseCommand):
+    """
+    Recomputes `rating_avg`, `rating_count` and `rating_histogram` for
+    every product from its approved reviews.
+
+    The aggregates are normally maintained on every review change; this
+    command repairs them after bulk changes made outside the ORM.
+    """
+
+    help = 'Rebuilds the stored rating aggregates of every product.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products refreshed per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        product_ids = list(
+            Product.objects.order_by('pk').values_list('pk', flat=True)
+        )
+
+        for start in range(0, len(product_ids), batch_size):
+            refresh_rating_aggregates(product_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating aggregates for {len(product_ids)} products.'
+        ))
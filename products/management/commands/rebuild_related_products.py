@@ -0,0 +1,106 @@
+"""
+Management command to rebuild the precomputed related products.
+
+Usage: python manage.py rebuild_related_products [--batch-size 200]
+                                                [--queued] [--interval 60]
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from products.models import Product
+from products.related import (
+    refresh_queued_related_products,
+    refresh_related_products,
+)
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the `RelatedProduct` rows of every product from shared
+    categories, shared specification values and co-purchases.
+
+    Catalog changes only rescore the changed product; with `--queued` the
+    command instead rescores the products around the queued changes, and
+    with `--interval` it keeps polling the queue (the `related` process of
+    the Procfile). Co-purchase scores only change with a full rebuild, so
+    it should also be scheduled periodically (e.g. nightly).
+    """
+
+    help = 'Rebuilds the related products of every product.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of products scored per transaction.'
+        )
+        parser.add_argument(
+            '--queued',
+            action='store_true',
+            help='Only refresh the products around queued catalog changes.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='With --queued, keep running, polling the queue every this '
+                 'many seconds (0 drains the queue once).'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        if options['queued']:
+            self.refresh_queued(batch_size, options['interval'])
+            return
+
+        product_ids = list(
+            Product.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        written = 0
+
+        for start in range(0, len(product_ids), batch_size):
+            written += refresh_related_products(
+                product_ids[start:start + batch_size]
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} related product entries for '
+            f'{len(product_ids)} products.'
+        ))
+
+    def refresh_queued(self, batch_size, interval):
+        """
+        Drains the refresh queue, once or continuously.
+
+        :param batch_size: Number of entries and products per transaction.
+        :param interval: Seconds between polls; 0 drains the queue once.
+        """
+
+        while True:
+            totals = refresh_queued_related_products(batch_size=batch_size)
+            if not interval or totals['queued']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Refreshed {totals['refreshed']} products around "
+                    f"{totals['queued']} queued changes."
+                ))
+            if not interval:
+                return
+            time.sleep(interval)
+            # Long-running workers must not keep broken or expired
+            # database connections between polls.
+            close_old_connections()
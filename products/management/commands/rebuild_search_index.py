@@ -0,0 +1,62 @@
+"""
+Management command to rebuild the product full-text search index.
+
+Usage: python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+from products.search import update_search_document
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the search document of every product.
+
+    Normally the index is maintained by signal handlers; this command is
+    intended for the initial load and for recovering from bulk changes made
+    outside the ORM (e.g. `QuerySet.update()` or raw SQL).
+    """
+
+    help = 'Rebuilds the full-text search document for every product.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of products indexed per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        batch_size = max(options['batch_size'], 1)
+        product_ids = list(
+            Product.objects.order_by('pk').values_list('pk', flat=True)
+        )
+
+        for start in range(0, len(product_ids), batch_size):
+            batch_ids = product_ids[start:start + batch_size]
+            with transaction.atomic():
+                products = Product.objects.filter(
+                    pk__in=batch_ids
+                ).prefetch_related('categories')
+                for product in products:
+                    update_search_document(product)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt search documents for {len(product_ids)} products.'
+        ))
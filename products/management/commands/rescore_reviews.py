@@ -0,0 +1,171 @@
+"""
+Management command to (re)score review sentiment in batches.
+
+Usage: python manage.py rescore_reviews [--only-missing] [--remoderate]
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Review
+from products.ratings import refresh_rating_aggregates
+from products.sentiment import get_approval_threshold, score_batch
+
+
+class Command(BaseCommand):
+    """
+    Recomputes `Review.sentiment_score` for historic reviews.
+
+    Reviews are read in primary key order in chunks. The chunks are scored
+    by a pool of worker processes (each loading the VADER lexicon once)
+    while the main process writes finished chunks back with `bulk_update`,
+    so memory use stays bounded by the number of chunks in flight.
+
+    With `--remoderate`, approval is also recomputed from the current
+    threshold and the rating aggregates of affected products are
+    refreshed.
+    """
+
+    help = 'Rescores review sentiment in chunks using a process pool.'
+
+    def add_arguments(self, parser):
+        """
+        Adds command line arguments.
+
+        :param parser: The argument parser of the command.
+        """
+
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of reviews scored and written per chunk.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of scoring processes (1 scores in-process).'
+        )
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Only score reviews without a sentiment score.'
+        )
+        parser.add_argument(
+            '--remoderate',
+            action='store_true',
+            help='Recompute approval from the current threshold.'
+        )
+
+    def iter_chunks(self, chunk_size, only_missing):
+        """
+        Yields chunks of (review id, comment) pairs in primary key order.
+
+        Uses keyset pagination on the primary key, so each chunk costs one
+        indexed query however far the scan has progressed.
+
+        :param chunk_size: Number of reviews per chunk.
+        :param only_missing: True to skip reviews that already have a score.
+        :return: A generator of lists of (id, comment) pairs.
+        """
+
+        queryset = Review.objects.order_by('pk')
+        if only_missing:
+            queryset = queryset.filter(sentiment_score__isnull=True)
+
+        last_pk = 0
+        while True:
+            chunk = list(
+                queryset.filter(pk__gt=last_pk).values_list(
+                    'pk', 'comment'
+                )[:chunk_size]
+            )
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            yield chunk
+
+    def write_scores(self, scores, remoderate, threshold):
+        """
+        Stores a chunk of scores (and approvals) in one transaction.
+
+        :param scores: A list of (review id, compound score) pairs.
+        :param remoderate: True to recompute `is_approved` as well.
+        :param threshold: The approval threshold.
+        :return: The number of reviews whose approval changed.
+        :rtype: int
+        """
+
+        score_by_id = dict(scores)
+        reviews = list(
+            Review.objects.filter(pk__in=score_by_id).only(
+                'pk', 'product_id', 'is_approved', 'sentiment_score'
+            )
+        )
+        changed_products = set()
+        approvals_changed = 0
+
+        for review in reviews:
+            review.sentiment_score = score_by_id[review.pk]
+            if remoderate:
+                approved = review.sentiment_score >= threshold
+                if approved != review.is_approved:
+                    review.is_approved = approved
+                    changed_products.add(review.product_id)
+                    approvals_changed += 1
+
+        fields = ['sentiment_score']
+        if remoderate:
+            fields.append('is_approved')
+
+        with transaction.atomic():
+            Review.objects.bulk_update(reviews, fields)
+            # bulk_update() sends no signals, so refresh explicitly.
+            refresh_rating_aggregates(changed_products)
+
+        return approvals_changed
+
+    def handle(self, *args, **options):
+        """
+        Executes the command.
+
+        :param args: Positional arguments.
+        :param options: Parsed command line options.
+        """
+
+        chunk_size = max(options['chunk_size'], 1)
+        workers = max(options['workers'], 1)
+        remoderate = options['remoderate']
+        threshold = get_approval_threshold()
+        chunks = self.iter_chunks(chunk_size, options['only_missing'])
+        totals = {'scored': 0, 'approvals_changed': 0}
+
+        def write(scores):
+            totals['approvals_changed'] += self.write_scores(
+                scores, remoderate, threshold
+            )
+            totals['scored'] += len(scores)
+
+        if workers == 1:
+            for chunk in chunks:
+                write(score_batch(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(score_batch, chunk))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+
+        message = f"Scored {totals['scored']} reviews."
+        if remoderate:
+            message += (
+                f" Approval changed for {totals['approvals_changed']} "
+                f"reviews."
+            )
+        self.stdout.write(self.style.SUCCESS(message))
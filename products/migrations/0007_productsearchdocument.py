@@ -0,0 +1,127 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FTS_TABLE = "products_productsearch_fts"
+DOCUMENT_TABLE = "products_productsearchdocument"
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the database specific full-text index for search documents.
+
+    PostgreSQL gets a generated, weighted tsvector column with a GIN index.
+    SQLite gets an FTS5 virtual table keyed by product id.
+    """
+
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+            f") STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX products_search_vector_gin "
+            f"ON {DOCUMENT_TABLE} USING GIN (search_vector)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    """
+    Drops the database specific full-text index.
+    """
+
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS products_search_vector_gin"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def populate_search_documents(apps, schema_editor):
+    """
+    Builds a search document for every existing product.
+    """
+
+    Product = apps.get_model("products", "Product")
+    ProductSpecification = apps.get_model("products", "ProductSpecification")
+    ProductSearchDocument = apps.get_model("products", "ProductSearchDocument")
+    is_sqlite = schema_editor.connection.vendor == "sqlite"
+
+    for product in Product.objects.prefetch_related("categories"):
+        title = " ".join(filter(None, [product.name, product.sku]))
+        spec_parts = []
+        for name, value in ProductSpecification.objects.filter(
+            product=product
+        ).values_list("spec_type__name", "value"):
+            spec_parts.extend([name, value])
+        body = " ".join(
+            filter(
+                None,
+                [
+                    product.description,
+                    *[category.name for category in product.categories.all()],
+                    *spec_parts,
+                ],
+            )
+        )
+        ProductSearchDocument.objects.update_or_create(
+            product=product, defaults={"title": title, "body": body}
+        )
+        if is_sqlite:
+            schema_editor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) "
+                f"VALUES (%s, %s, %s)",
+                [product.pk, title, body],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_review"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("title", models.TextField(blank=True)),
+                ("body", models.TextField(blank=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="productspecification",
+            unique_together={("product", "spec_type")},
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(
+            populate_search_documents, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:18
+
+import products.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """
+    Computes the stored rating aggregates from existing approved reviews.
+    """
+
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    histograms = {}
+
+    rows = (
+        Review.objects.filter(is_approved=True)
+        .values("product_id", "rating")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        histogram = histograms.setdefault(row["product_id"], [0, 0, 0, 0, 0])
+        histogram[row["rating"] - 1] = row["count"]
+
+    for product_id, histogram in histograms.items():
+        rating_count = sum(histogram)
+        rating_total = sum(
+            star * count for star, count in enumerate(histogram, start=1)
+        )
+        Product.objects.filter(pk=product_id).update(
+            rating_avg=round(rating_total / rating_count, 2),
+            rating_count=rating_count,
+            rating_histogram=histogram,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_productsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_histogram",
+            field=models.JSONField(
+                default=products.models.default_rating_histogram,
+                editable=False,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-rating_avg", "-created_on"],
+                name="product_rating_idx",
+            ),
+        ),
+        migrations.RunPython(
+            backfill_rating_aggregates, migrations.RunPython.noop
+        ),
+    ]
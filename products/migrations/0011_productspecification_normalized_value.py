@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+def backfill_normalized_values(apps, schema_editor):
+    """
+    Normalizes the values of existing specifications.
+    """
+
+    ProductSpecification = apps.get_model("products", "ProductSpecification")
+    specifications = list(ProductSpecification.objects.only("id", "value"))
+    for specification in specifications:
+        specification.normalized_value = "".join(
+            specification.value.casefold().split()
+        )
+    ProductSpecification.objects.bulk_update(
+        specifications, ["normalized_value"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_review_product_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productspecification',
+            name='normalized_value',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='productspecification',
+            index=models.Index(fields=['spec_type', 'normalized_value', 'product'], name='spec_value_product_idx'),
+        ),
+        migrations.RunPython(
+            backfill_normalized_values, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductRefresh',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='products.product')),
+                ('requested_on', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
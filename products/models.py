@@ -3,15 +3,43 @@ Database models for the products application.
 
 Defines the structure for storing product information (`Product`), categories
 (`Category`), product specifications
-(`SpecificationType`, ProductSpecification`), and customer reviews (`Review`).
+(`SpecificationType`, ProductSpecification`), customer reviews (`Review`),
+the full-text search document for each product (`ProductSearchDocument`),
+the precomputed related products (`RelatedProduct`) and the queue of
+pending related product refreshes (`RelatedProductRefresh`).
 """
 
-from django.db import models
+from django.db import DatabaseError, models, transaction
 from cloudinary.models import CloudinaryField
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
-from django.db.models import Avg
+
+
+def default_rating_histogram():
+    """
+    Returns an empty per-star rating histogram.
+
+    :return: A list of five zero counts, index 0 holding 1-star reviews.
+    :rtype: list[int]
+    """
+
+    return [0, 0, 0, 0, 0]
+
+
+def normalize_spec_value(value):
+    """
+    Normalizes a specification value for exact-match filtering.
+
+    Case and whitespace differences are ignored, so "8 GB", "8gb" and
+    "8GB" are treated as the same value.
+
+    :param value: The specification value as entered.
+    :return: The normalized value.
+    :rtype: str
+    """
+
+    return ''.join(value.casefold().split())
 
 
 class Category(models.Model):
@@ -57,12 +85,19 @@ class Product(models.Model):
     :param description: A detailed description of the product.
     :param sku: Stock Keeping Unit (optional, unique identifier).
     :param stock_quantity: The number of units currently in stock.
+    :param reserved_quantity: The number of units held by checkout stock
+                              reservations (see `orders.reservations`).
     :param is_featured: Boolean indicating if the product should be featured
                         (e.g., on homepage).
     :param is_active: Boolean indicating if the product is available
                       for sale/visible.
     :param created_on: Timestamp when the product was added.
     :param updated_on: Timestamp when the product was last updated.
+    :param rating_avg: Stored average rating of approved reviews
+                       (0 if none).
+    :param rating_count: Stored number of approved reviews.
+    :param rating_histogram: Stored per-star counts of approved reviews,
+                             index 0 holding 1-star reviews.
     """
 
     name = models.CharField(max_length=255)
@@ -74,18 +109,29 @@ class Product(models.Model):
     sku = models.CharField(max_length=50, unique=True, blank=True, null=True,
                            default=None)
     stock_quantity = models.PositiveIntegerField(default=0)
+    reserved_quantity = models.PositiveIntegerField(default=0,
+                                                    editable=False)
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
 
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_histogram = models.JSONField(default=default_rating_histogram,
+                                        editable=False)
+
     class Meta:
         """
         Metadata options for the Product model.
         """
 
         ordering = ['-created_on']
+        indexes = [
+            models.Index(fields=['-rating_avg', '-created_on'],
+                         name='product_rating_idx'),
+        ]
 
     def __str__(self):
         """
@@ -97,20 +143,74 @@ class Product(models.Model):
 
         return self.name
 
+    # Maintained only by targeted updates (`products.ratings` and
+    # `orders.reservations`), never written back by a plain save().
+    UPDATE_ONLY_FIELDS = frozenset({
+        'reserved_quantity', 'rating_avg', 'rating_count', 'rating_histogram',
+    })
+
+    def save(self, *args, **kwargs):
+        """
+        Overrides the save method so that saving a loaded product never
+        writes back the `UPDATE_ONLY_FIELDS`.
+
+        The reserved quantity and the rating aggregates are only changed by
+        atomic updates; writing back the values loaded with the product
+        (e.g. from the dashboard edit form) would undo holds or reviews
+        processed in the meantime. All other fields are saved as usual.
+
+        A save restricted this way cannot insert a row, so it runs in a
+        savepoint and, if the product was deleted concurrently, is repeated
+        without the restriction, re-creating the row as a plain save would.
+
+        :param args: Additional positional arguments for the save method.
+        :param kwargs: Additional keyword arguments for the save method.
+        """
+
+        if self._state.adding or kwargs.get('update_fields') is not None:
+            super().save(*args, **kwargs)
+            return
+
+        skipped = self.UPDATE_ONLY_FIELDS | self.get_deferred_fields()
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in skipped
+        ]
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except DatabaseError:
+            if Product.objects.filter(pk=self.pk).exists():
+                raise
+            kwargs['update_fields'] = None
+            super().save(*args, **kwargs)
+
+    @property
+    def available_quantity(self):
+        """
+        Returns the stock not held by checkout reservations.
+
+        :return: `stock_quantity` minus `reserved_quantity`, at least 0.
+        :rtype: int
+        """
+
+        return max(self.stock_quantity - self.reserved_quantity, 0)
+
     @property
     def average_rating(self):
         """
-        Calculates the average rating based on approved reviews for this
+        Returns the average rating based on approved reviews for this
         product.
 
+        Reads the stored `rating_avg` aggregate, which is maintained by
+        `products.ratings` whenever reviews change.
+
         :return: The average rating as a float, or 0 if no approved
                  reviews exist.
         :rtype: float
         """
 
-        avg = self.reviews.filter(is_approved=True).aggregate(
-            average=Avg('rating'))
-        return avg.get('average') or 0
+        return self.rating_avg or 0
 
 
 class SpecificationType(models.Model):
@@ -147,15 +247,24 @@ class ProductSpecification(models.Model):
     Links a Product to a SpecificationType and stores the corresponding value
     (e.g., Product: "T-Shirt", SpecType: "Color", Value: "Red").
 
+    The table doubles as the inverted index used by specification filters:
+    the composite (spec_type, normalized_value, product) index maps each
+    normalized attribute value to its product ids without touching the
+    table rows.
+
     :param product: ForeignKey to the Product this specification belongs to.
     :param spec_type: ForeignKey to the SpecificationType (e.g., "Color").
     :param value: The actual value of the specification (e.g., "Red").
+    :param normalized_value: The value normalized by `normalize_spec_value`,
+                             maintained on save.
     """
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE,
                                 related_name='specifications')
     spec_type = models.ForeignKey(SpecificationType, on_delete=models.CASCADE)
     value = models.CharField(max_length=255)
+    normalized_value = models.CharField(max_length=255, editable=False,
+                                        default='')
 
     class Meta:
         """
@@ -163,6 +272,27 @@ class ProductSpecification(models.Model):
         """
 
         unique_together = ('product', 'spec_type')
+        indexes = [
+            models.Index(
+                fields=['spec_type', 'normalized_value', 'product'],
+                name='spec_value_product_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Overrides the save method to keep `normalized_value` in sync with
+        `value`.
+
+        :param args: Additional positional arguments for the save method.
+        :param kwargs: Additional keyword arguments for the save method.
+        """
+
+        self.normalized_value = normalize_spec_value(self.value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_value'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -190,6 +320,8 @@ class Review(models.Model):
     :param updated_on: Timestamp when the review was last updated.
     :param is_approved: Boolean indicating if the review is visible to
                         other users.
+    :param sentiment_score: The VADER compound score of the comment
+                            (-1 to 1), or None if not scored yet.
     """
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE,
@@ -203,6 +335,8 @@ class Review(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=False)
+    sentiment_score = models.FloatField(null=True, blank=True,
+                                        editable=False)
 
     class Meta:
         """
@@ -213,6 +347,12 @@ class Review(models.Model):
         unique_together = ('product', 'user')
         verbose_name = 'Product Review'
         verbose_name_plural = 'Product Reviews'
+        indexes = [
+            models.Index(fields=['product', 'is_approved', '-created_on'],
+                         name='review_product_recent_idx'),
+            models.Index(fields=['is_approved', 'sentiment_score'],
+                         name='review_sentiment_idx'),
+        ]
 
     def __str__(self):
         """
@@ -226,3 +366,112 @@ class Review(models.Model):
             f'Review for "{self.product.name}" '
             f'by {self.user.username} ({self.rating}/5)'
         )
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Stores the denormalized full-text search document for a product.
+
+    The document is rebuilt whenever the product, its categories or its
+    specifications change (see `products.signals`). The database specific
+    index is created by the migration: a weighted `tsvector` column with a
+    GIN index on PostgreSQL, or an FTS5 virtual table on SQLite.
+
+    :param product: OneToOne relationship to the indexed Product.
+    :param title: High-weight text (product name and SKU).
+    :param body: Low-weight text (description, category names and
+                 specification types and values).
+    :param updated_on: Timestamp when the document was last rebuilt.
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE,
+                                   primary_key=True,
+                                   related_name='search_document')
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        Returns a string representation of the search document.
+
+        :return: A string naming the indexed product.
+        :rtype: str
+        """
+
+        return f'Search document for product {self.product_id}'
+
+
+class RelatedProduct(models.Model):
+    """
+    Stores a precomputed "related product" recommendation.
+
+    Rows are derived from shared categories, shared specification values
+    and co-purchases (see `products.related`), so the product detail page
+    reads its recommendations with a single indexed lookup.
+
+    :param product: ForeignKey to the Product the recommendation is for.
+    :param related: ForeignKey to the recommended Product.
+    :param score: The relatedness score; higher is more related.
+    :param updated_on: Timestamp when the score was last computed.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,
+                                related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE,
+                                related_name='+')
+    score = models.FloatField()
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """
+        Metadata options for the RelatedProduct model.
+        """
+
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', '-score'],
+                         name='related_product_score_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the recommendation.
+
+        :return: A string naming both products and the score.
+        :rtype: str
+        """
+
+        return (
+            f'{self.related_id} related to {self.product_id} '
+            f'({self.score:.2f})'
+        )
+
+
+class RelatedProductRefresh(models.Model):
+    """
+    Queues a refresh of the related products around a changed product.
+
+    A catalog change rescores the changed product right away; the other
+    products whose recommendations it may enter or leave are rescored
+    later by the `rebuild_related_products --queued` worker (see
+    `products.related`). A product is queued at most once.
+
+    :param product: The changed Product, also the primary key.
+    :param requested_on: Timestamp when the refresh was first requested.
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE,
+                                   primary_key=True,
+                                   related_name='+')
+    requested_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """
+        Returns a string representation of the queued refresh.
+
+        :return: A string naming the product.
+        :rtype: str
+        """
+
+        return f'Refresh related products around {self.product_id}'
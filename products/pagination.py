@@ -0,0 +1,253 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+OFFSET pagination makes the database walk and discard every row before the
+requested page and needs a `COUNT(*)` over the whole filtered queryset to
+render page links. `KeysetPaginator` instead continues from the sort key of
+the last (or first) row shown, so every page costs the same single indexed
+query and no count is taken.
+
+Cursors are opaque, signed tokens; a tampered cursor or one issued for a
+different ordering raises `InvalidCursor`.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+CURSOR_SALT = 'products.pagination.cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a cursor cannot be decoded or does not match the ordering.
+    """
+
+
+def _serialize_value(value):
+    """
+    Converts a sort key value into a JSON friendly value without losing
+    precision (datetimes keep their microseconds).
+
+    :param value: The value read from a model instance.
+    :return: A JSON serializable representation of the value.
+    """
+
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CursorPage:
+    """
+    A single page of results produced by `KeysetPaginator`.
+
+    Mirrors the parts of `django.core.paginator.Page` used by templates.
+
+    :param object_list: The objects on this page.
+    :param paginator: The KeysetPaginator that produced the page.
+    :param next_cursor: Cursor of the following page, or None.
+    :param previous_cursor: Cursor of the preceding page, or None.
+    """
+
+    is_cursor_page = True
+    number = None
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        """
+        :return: True if a following page exists.
+        :rtype: bool
+        """
+
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        """
+        :return: True if a preceding page exists.
+        :rtype: bool
+        """
+
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        """
+        :return: True if any other page exists.
+        :rtype: bool
+        """
+
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by the values of its ordering fields.
+
+    The ordering must be unique (end with the primary key) so every row has
+    a distinct position. Field names may refer to annotations.
+
+    :param queryset: The queryset to paginate (its ordering is replaced).
+    :param per_page: Number of objects per page.
+    :param ordering: A sequence of field names, '-' prefixed for
+                     descending order, e.g. ('-created_on', '-id').
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def _to_python(self, field_name, value):
+        """
+        Converts a decoded cursor value back to the field's Python type.
+
+        Annotations (which are not model fields) are treated as floats.
+
+        :param field_name: The ordering field or annotation name.
+        :param value: The JSON decoded value.
+        :return: The value converted for use in a queryset filter.
+        """
+
+        try:
+            field = self.queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return float(value)
+        return field.to_python(value)
+
+    def encode_cursor(self, obj, direction=NEXT):
+        """
+        Builds a signed cursor positioned on the given object.
+
+        :param obj: The boundary object (last row for NEXT, first row
+                    for PREVIOUS).
+        :param direction: NEXT or PREVIOUS.
+        :return: An opaque, URL safe cursor string.
+        :rtype: str
+        """
+
+        payload = {
+            'o': list(self.ordering),
+            'd': direction,
+            'v': [_serialize_value(getattr(obj, name))
+                  for name in self.fields],
+        }
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """
+        Validates a cursor and extracts its direction and key values.
+
+        :param cursor: The cursor string from the request.
+        :return: A (direction, values) tuple.
+        :rtype: tuple[str, list]
+        :raises InvalidCursor: If the cursor is malformed, tampered with or
+                               was issued for another ordering.
+        """
+
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+            direction = payload['d']
+            values = payload['v']
+            ordering = tuple(payload['o'])
+        except (signing.BadSignature, KeyError, TypeError):
+            raise InvalidCursor('Malformed cursor.')
+
+        if (ordering != self.ordering or direction not in (NEXT, PREVIOUS)
+                or len(values) != len(self.fields)):
+            raise InvalidCursor('Cursor does not match the ordering.')
+
+        try:
+            values = [self._to_python(name, value)
+                      for name, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor('Malformed cursor value.')
+        return direction, values
+
+    def _seek_filter(self, values, forward):
+        """
+        Builds the row-value comparison that selects rows after (or before)
+        the cursor position, e.g. for ('-price', '-id'):
+        price < p OR (price = p AND id < i).
+
+        :param values: The decoded cursor key values.
+        :param forward: True to select rows after the cursor.
+        :return: The filter expression.
+        :rtype: django.db.models.Q
+        """
+
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            field = self.fields[index]
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_index in range(index):
+                clause &= Q(**{self.fields[prev_index]: values[prev_index]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Returns the page following (or preceding) the cursor position.
+
+        Fetches one extra row to detect whether another page exists in
+        the direction of travel.
+
+        :param cursor: A cursor from a previous page, or None for the
+                       first page.
+        :return: The requested page.
+        :rtype: CursorPage
+        :raises InvalidCursor: If the cursor is invalid.
+        """
+
+        queryset = self.queryset
+        forward = True
+        has_cursor = cursor is not None
+
+        if has_cursor:
+            direction, values = self.decode_cursor(cursor)
+            forward = direction == NEXT
+            queryset = queryset.filter(self._seek_filter(values, forward))
+
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering
+            )
+
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        next_cursor = None
+        previous_cursor = None
+        if rows:
+            if (has_more if forward else has_cursor):
+                next_cursor = self.encode_cursor(rows[-1], NEXT)
+            if (has_cursor if forward else has_more):
+                previous_cursor = self.encode_cursor(rows[0], PREVIOUS)
+
+        return CursorPage(rows, self, next_cursor, previous_cursor)
@@ -0,0 +1,87 @@
+"""
+Maintenance of the denormalized product rating aggregates.
+
+`Product.rating_avg`, `Product.rating_count` and `Product.rating_histogram`
+are stored on the product row so listings can sort and display ratings
+without joining and grouping reviews on every request. They are recomputed
+here, inside a transaction that locks the affected product rows, whenever
+reviews are created, deleted or (un)approved, which also invalidates the
+products' cached detail pages.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+from .cache import bump_product_versions
+from .models import Product, Review, default_rating_histogram
+
+
+def compute_rating_aggregates(product_ids):
+    """
+    Computes rating aggregates from approved reviews for several products.
+
+    Uses a single grouped query over the reviews table.
+
+    :param product_ids: An iterable of Product primary keys.
+    :type product_ids: Iterable[int]
+    :return: A mapping of product id to a dict with 'rating_avg',
+             'rating_count' and 'rating_histogram'.
+    :rtype: dict[int, dict]
+    """
+
+    histograms = {pk: default_rating_histogram() for pk in product_ids}
+    rows = Review.objects.filter(
+        product_id__in=list(histograms),
+        is_approved=True
+    ).values('product_id', 'rating').annotate(
+        count=Count('id')
+    ).order_by()
+
+    for row in rows:
+        histograms[row['product_id']][row['rating'] - 1] = row['count']
+
+    aggregates = {}
+    for product_id, histogram in histograms.items():
+        rating_count = sum(histogram)
+        rating_total = sum(
+            star * count for star, count in enumerate(histogram, start=1)
+        )
+        aggregates[product_id] = {
+            'rating_avg': (
+                round(rating_total / rating_count, 2) if rating_count else 0
+            ),
+            'rating_count': rating_count,
+            'rating_histogram': histogram,
+        }
+    return aggregates
+
+
+def refresh_rating_aggregates(product_ids):
+    """
+    Recomputes and stores the rating aggregates of the given products.
+
+    Locks the product rows (in primary key order, to avoid deadlocks) for
+    the duration of the update so concurrent review changes are applied
+    one after another, and bumps the products' cache versions.
+
+    :param product_ids: An iterable of Product primary keys.
+    :type product_ids: Iterable[int]
+    :return: A mapping of product id to the stored aggregate values.
+    :rtype: dict[int, dict]
+    """
+
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+
+    with transaction.atomic():
+        locked_ids = list(
+            Product.objects.select_for_update().filter(
+                pk__in=product_ids
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        aggregates = compute_rating_aggregates(locked_ids)
+        for product_id, values in aggregates.items():
+            Product.objects.filter(pk=product_id).update(**values)
+        bump_product_versions(locked_ids)
+
+    return aggregates
@@ -0,0 +1,255 @@
+"""
+Related product scoring for the products application.
+
+Scores every pair of active products by what they have in common and stores
+the best matches per product in `RelatedProduct`:
+
+- shared categories (`CATEGORY_WEIGHT` per category),
+- shared specification values (`SPECIFICATION_WEIGHT` per value),
+- co-purchases, i.e. paid orders containing both products
+  (`CO_PURCHASE_WEIGHT` per order).
+
+Each signal is one grouped self-join, so scoring a batch of products costs
+three queries regardless of the batch size.
+
+A catalog change only rescores the changed product in the request
+(`refresh_related_products_around`) and queues a `RelatedProductRefresh`;
+the products whose lists it may enter or leave are rescored by the worker
+(`refresh_queued_related_products`).
+"""
+
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F
+from orders.models import OrderItem, OrderStatus
+from .cache import bump_product_versions
+from .models import (
+    Product,
+    ProductSpecification,
+    RelatedProduct,
+    RelatedProductRefresh,
+)
+
+CATEGORY_WEIGHT = 3.0
+SPECIFICATION_WEIGHT = 1.0
+CO_PURCHASE_WEIGHT = 2.0
+MAX_RELATED_PRODUCTS = 8
+PAID_ORDER_STATUSES = (
+    OrderStatus.PROCESSING,
+    OrderStatus.SHIPPED,
+    OrderStatus.DELIVERED,
+)
+
+
+def _shared_category_counts(product_ids):
+    """
+    Counts the categories each product shares with other active products.
+
+    :param product_ids: The products to score.
+    :return: Rows of (product id, related id, shared count).
+    :rtype: django.db.models.QuerySet
+    """
+
+    return Product.categories.through.objects.annotate(
+        source_id=F('category__products')
+    ).filter(
+        source_id__in=product_ids,
+        product__is_active=True,
+    ).exclude(
+        product_id=F('source_id')
+    ).values_list(
+        'source_id', 'product_id'
+    ).annotate(shared=Count('category_id')).order_by()
+
+
+def _shared_specification_counts(product_ids):
+    """
+    Counts the specification values (same type and value) each product
+    shares with other active products.
+
+    :param product_ids: The products to score.
+    :return: Rows of (product id, related id, shared count).
+    :rtype: django.db.models.QuerySet
+    """
+
+    return ProductSpecification.objects.annotate(
+        source_id=F('spec_type__productspecification__product_id'),
+        source_value=F('spec_type__productspecification__value'),
+    ).filter(
+        source_id__in=product_ids,
+        value=F('source_value'),
+        product__is_active=True,
+    ).exclude(
+        product_id=F('source_id')
+    ).values_list(
+        'source_id', 'product_id'
+    ).annotate(shared=Count('id')).order_by()
+
+
+def _co_purchase_counts(product_ids):
+    """
+    Counts the paid orders each product was bought in together with other
+    active products.
+
+    :param product_ids: The products to score.
+    :return: Rows of (product id, related id, order count).
+    :rtype: django.db.models.QuerySet
+    """
+
+    return OrderItem.objects.annotate(
+        source_id=F('order__items__product_id')
+    ).filter(
+        source_id__in=product_ids,
+        order__status__in=PAID_ORDER_STATUSES,
+        product__is_active=True,
+    ).exclude(
+        product_id=F('source_id')
+    ).values_list(
+        'source_id', 'product_id'
+    ).annotate(shared=Count('order_id', distinct=True)).order_by()
+
+
+def compute_related_products(product_ids, limit=MAX_RELATED_PRODUCTS):
+    """
+    Scores the related products of the given products.
+
+    :param product_ids: The products to score.
+    :param limit: Maximum number of related products kept per product.
+    :return: A mapping of product id to a list of (related id, score)
+             pairs, best first.
+    :rtype: dict[int, list[tuple[int, float]]]
+    """
+
+    product_ids = list(product_ids)
+    scores = defaultdict(lambda: defaultdict(float))
+    sources = (
+        (_shared_category_counts, CATEGORY_WEIGHT),
+        (_shared_specification_counts, SPECIFICATION_WEIGHT),
+        (_co_purchase_counts, CO_PURCHASE_WEIGHT),
+    )
+
+    for rows, weight in sources:
+        for product_id, related_id, shared in rows(product_ids):
+            scores[product_id][related_id] += shared * weight
+
+    return {
+        product_id: sorted(
+            related.items(), key=lambda item: (-item[1], -item[0])
+        )[:limit]
+        for product_id, related in scores.items()
+    }
+
+
+def refresh_related_products(product_ids):
+    """
+    Recomputes and stores the related products of the given products.
+
+    Existing rows for the products are replaced; products with nothing in
+    common with any other active product end up with no rows. The
+    products' cache versions are bumped.
+
+    :param product_ids: The products to refresh.
+    :return: The number of RelatedProduct rows written.
+    :rtype: int
+    """
+
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+
+    related = compute_related_products(product_ids)
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id,
+                       score=score)
+        for product_id, entries in related.items()
+        for related_id, score in entries
+    ]
+
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows)
+        bump_product_versions(product_ids)
+    return len(rows)
+
+
+def refresh_related_products_around(product_id):
+    """
+    Refreshes recommendations after a product changed.
+
+    Recomputes the product's own related products and queues the refresh
+    of the other products' lists, which the changed product may enter or
+    leave (e.g. when it is deactivated), for the worker.
+
+    :param product_id: The changed product.
+    :return: The number of RelatedProduct rows written.
+    :rtype: int
+    """
+
+    written = refresh_related_products([product_id])
+    RelatedProductRefresh.objects.bulk_create(
+        [RelatedProductRefresh(product_id=product_id)],
+        ignore_conflicts=True,
+    )
+    return written
+
+
+def _products_around(product_ids):
+    """
+    Returns the products whose related products may change with the given
+    ones: those recommending them now and those sharing a category or a
+    specification value with them (including each other).
+
+    :param product_ids: The changed products.
+    :return: The primary keys of the affected products.
+    :rtype: set[int]
+    """
+
+    affected = set(
+        RelatedProduct.objects.filter(
+            related_id__in=product_ids
+        ).values_list('product_id', flat=True)
+    )
+    for rows in (_shared_category_counts, _shared_specification_counts):
+        affected.update(
+            related_id for _, related_id, _ in rows(product_ids)
+        )
+    return affected
+
+
+def refresh_queued_related_products(batch_size=100):
+    """
+    Refreshes the related products around all queued products, in batches.
+
+    Each batch claims its queue entries (skipping entries claimed by a
+    concurrent worker) and collects the affected products in one short
+    transaction, then rescores them in chunks of `batch_size`. Entries
+    lost to a failure are caught up by the full rebuild.
+
+    :param batch_size: Number of queue entries and of products handled
+                       per transaction.
+    :return: The number of handled queue entries and refreshed products.
+    :rtype: dict[str, int]
+    """
+
+    totals = {'queued': 0, 'refreshed': 0}
+
+    while True:
+        with transaction.atomic():
+            product_ids = list(
+                RelatedProductRefresh.objects.select_for_update(
+                    skip_locked=True
+                ).order_by('requested_on').values_list(
+                    'product_id', flat=True
+                )[:batch_size]
+            )
+            if not product_ids:
+                return totals
+            affected = sorted(_products_around(product_ids))
+            RelatedProductRefresh.objects.filter(
+                product_id__in=product_ids
+            ).delete()
+
+        for start in range(0, len(affected), batch_size):
+            refresh_related_products(affected[start:start + batch_size])
+        totals['queued'] += len(product_ids)
+        totals['refreshed'] += len(affected)
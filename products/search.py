@@ -0,0 +1,215 @@
+"""
+Full-text search support for the products application.
+
+Maintains one `ProductSearchDocument` per product and queries it through the
+database's native full-text engine instead of OR-ing `icontains` lookups
+across joined tables:
+
+- PostgreSQL: a generated, weighted `tsvector` column with a GIN index
+  (created by migration `0007_productsearchdocument`).
+- SQLite: an FTS5 virtual table kept in sync from Python, used for local
+  development and the test suite.
+
+Other database backends fall back to the original `icontains` search.
+"""
+
+import re
+from django.db import connection
+from django.db.models import Q, FloatField, Value
+from django.db.models.expressions import RawSQL
+from .models import Product, ProductSpecification, ProductSearchDocument
+
+FTS_TABLE = 'products_productsearch_fts'
+SEARCH_CONFIG = 'english'
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_search_document(product):
+    """
+    Builds the searchable text for a product.
+
+    Uses prefetched `categories` when they are available on the instance;
+    specifications are read with a single joined query.
+
+    :param product: The Product instance to index.
+    :type product: products.models.Product
+    :return: A (title, body) tuple of weighted document text.
+    :rtype: tuple[str, str]
+    """
+
+    title = ' '.join(filter(None, [product.name, product.sku]))
+    category_names = [category.name for category in product.categories.all()]
+    spec_parts = []
+    specifications = ProductSpecification.objects.filter(
+        product=product
+    ).values_list('spec_type__name', 'value')
+    for spec_type_name, value in specifications:
+        spec_parts.append(spec_type_name)
+        spec_parts.append(value)
+
+    body = ' '.join(
+        filter(None, [product.description, *category_names, *spec_parts])
+    )
+    return title, body
+
+
+def update_search_document(product):
+    """
+    Rebuilds and stores the search document for a single product.
+
+    On SQLite the FTS5 row is replaced as well; on PostgreSQL the generated
+    `search_vector` column is refreshed by the database itself.
+
+    :param product: The Product instance to index.
+    :type product: products.models.Product
+    """
+
+    title, body = build_search_document(product)
+    ProductSearchDocument.objects.update_or_create(
+        product=product,
+        defaults={'title': title, 'body': body}
+    )
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [product.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body) '
+                f'VALUES (%s, %s, %s)',
+                [product.pk, title, body]
+            )
+
+
+def update_search_documents(product_ids):
+    """
+    Rebuilds the search documents for several products.
+
+    :param product_ids: An iterable of Product primary keys.
+    :type product_ids: Iterable[int]
+    """
+
+    products = Product.objects.filter(pk__in=list(product_ids))
+    for product in products.prefetch_related('categories'):
+        update_search_document(product)
+
+
+def remove_search_document(product_id):
+    """
+    Removes the FTS5 row of a deleted product.
+
+    The `ProductSearchDocument` row itself is removed by the cascade.
+
+    :param product_id: The primary key of the deleted Product.
+    :type product_id: int
+    """
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [product_id]
+            )
+
+
+def _search_terms(search_query):
+    """
+    Splits a raw user query into plain word terms.
+
+    Punctuation and operators are dropped so user input can never be
+    interpreted as full-text query syntax.
+
+    :param search_query: The raw search string.
+    :type search_query: str
+    :return: A list of lower-cased terms.
+    :rtype: list[str]
+    """
+
+    return [term.lower() for term in TERM_RE.findall(search_query or '')]
+
+
+def _legacy_search(queryset, search_query):
+    """
+    Filters products with the original multi-field `icontains` search.
+
+    Used for database backends without a supported full-text engine.
+
+    :param queryset: The Product queryset to filter.
+    :param search_query: The raw search string.
+    :return: The filtered queryset annotated with a constant `search_rank`.
+    :rtype: django.db.models.QuerySet
+    """
+
+    return queryset.filter(
+        Q(name__icontains=search_query) |
+        Q(description__icontains=search_query) |
+        Q(sku__icontains=search_query) |
+        Q(categories__name__icontains=search_query) |
+        Q(specifications__value__icontains=search_query) |
+        Q(specifications__spec_type__name__icontains=search_query)
+    ).distinct().annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+
+def search_products(queryset, search_query):
+    """
+    Restricts a Product queryset to full-text matches of the query.
+
+    Every term must match (prefix matching is used so partial words still
+    find results). The queryset is annotated with `search_rank`, where a
+    higher value means a more relevant product; name and SKU matches weigh
+    more than description, category and specification matches.
+
+    :param queryset: The Product queryset to filter.
+    :type queryset: django.db.models.QuerySet
+    :param search_query: The raw search string entered by the user.
+    :type search_query: str
+    :return: The filtered and annotated queryset.
+    :rtype: django.db.models.QuerySet
+    """
+
+    terms = _search_terms(search_query)
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    document_table = ProductSearchDocument._meta.db_table
+
+    if not terms:
+        return _legacy_search(queryset, search_query)
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        match_sql = (
+            f"SELECT product_id FROM {document_table} "
+            f"WHERE search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)"
+        )
+        rank_sql = (
+            f"SELECT ts_rank_cd(d.search_vector, "
+            f"to_tsquery('{SEARCH_CONFIG}', %s)) "
+            f"FROM {document_table} d "
+            f"WHERE d.product_id = {product_table}.id"
+        )
+        params = (tsquery,)
+    elif connection.vendor == 'sqlite':
+        fts_query = ' '.join(f'"{term}"*' for term in terms)
+        match_sql = (
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        rank_sql = (
+            f'SELECT -bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = {product_table}.id'
+        )
+        params = (fts_query,)
+    else:
+        return _legacy_search(queryset, search_query)
+
+    return queryset.filter(
+        id__in=RawSQL(match_sql, params)
+    ).annotate(
+        search_rank=RawSQL(rank_sql, params, output_field=FloatField())
+    )
@@ -0,0 +1,74 @@
+"""
+VADER sentiment scoring for product reviews.
+
+Loading `SentimentIntensityAnalyzer` reads and parses the VADER lexicon from
+disk, so one analyzer is created lazily per process and reused for every
+review. The module does not touch the database, which keeps it usable from
+the worker processes of the `rescore_reviews` command.
+"""
+
+import threading
+from django.conf import settings
+
+DEFAULT_APPROVAL_THRESHOLD = 0.05
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer():
+    """
+    Returns the process-wide VADER analyzer, loading it on first use.
+
+    :return: The shared analyzer.
+    :rtype: vaderSentiment.vaderSentiment.SentimentIntensityAnalyzer
+    """
+
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                from vaderSentiment.vaderSentiment import (
+                    SentimentIntensityAnalyzer,
+                )
+                _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def get_approval_threshold():
+    """
+    Returns the compound score from which reviews are auto-approved.
+
+    Configurable with the `REVIEW_APPROVAL_THRESHOLD` setting.
+
+    :return: The threshold, between -1 and 1.
+    :rtype: float
+    """
+
+    return getattr(settings, 'REVIEW_APPROVAL_THRESHOLD',
+                   DEFAULT_APPROVAL_THRESHOLD)
+
+
+def score_text(text):
+    """
+    Computes the VADER compound sentiment score of a text.
+
+    :param text: The text to score.
+    :return: The compound score, from -1 (negative) to 1 (positive).
+    :rtype: float
+    """
+
+    return get_analyzer().polarity_scores(text)['compound']
+
+
+def score_batch(items):
+    """
+    Scores a batch of texts; used as the worker function of the
+    `rescore_reviews` process pool.
+
+    :param items: A list of (key, text) pairs.
+    :return: A list of (key, compound score) pairs.
+    :rtype: list[tuple]
+    """
+
+    return [(key, score_text(text)) for key, text in items]
@@ -0,0 +1,452 @@
+"""
+Signal handlers for the products application.
+
+Keeps the denormalized product search documents (`ProductSearchDocument`)
+in sync whenever a product, its categories or its specifications change,
+and the stored product rating aggregates in sync whenever reviews change.
+Catalog changes also bump the catalog cache version, which invalidates the
+cached facet counts, and refresh the precomputed related products
+(`RelatedProduct`) of the changed product, queueing the products around it
+for the worker (see `products.related`). Changes to a product or its
+specifications bump that product's cache version, which invalidates its
+cached detail page.
+"""
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db.models.query import QuerySet
+from django.dispatch import receiver
+from .models import (
+    Category,
+    Product,
+    SpecificationType,
+    ProductSpecification,
+    Review,
+)
+from .cache import bump_catalog_version, bump_product_versions
+from .ratings import refresh_rating_aggregates
+from .related import refresh_related_products_around
+from .search import (
+    update_search_document,
+    update_search_documents,
+    remove_search_document,
+)
+
+# Set on a Category by its pre_clear signal; post_clear has no pk_set.
+CLEARED_PRODUCTS_ATTR = '_cleared_product_ids'
+
+
+def _is_product_deletion(origin):
+    """
+    Checks whether a delete signal was caused by deleting products.
+
+    Child rows (e.g. specifications, reviews) are deleted before their
+    product, so recomputing derived product data at that point would be
+    wasted work.
+
+    :param origin: The `origin` argument sent with delete signals.
+    :return: True if the deletion originated from Product objects.
+    :rtype: bool
+    """
+
+    if isinstance(origin, Product):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Product
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Rebuilds the search document after a product is saved.
+
+    :param sender: The Product model class.
+    :param instance: The saved Product instance.
+    :param raw: True when loading fixtures; indexing is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if raw:
+        return
+    update_search_document(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    """
+    Removes a deleted product from the full-text index.
+
+    :param sender: The Product model class.
+    :param instance: The deleted Product instance.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    remove_search_document(instance.pk)
+
+
+def _changed_product_ids(instance, reverse, pk_set):
+    """
+    Returns the products affected by a change of `Product.categories`.
+
+    :param instance: The Product (forward) or Category (reverse) instance.
+    :param reverse: True if the change was made from the Category side.
+    :param pk_set: Primary keys of the related objects that changed, or
+                   None for a clear.
+    :return: The primary keys of the affected products.
+    :rtype: list[int]
+    """
+
+    if not reverse:
+        return [instance.pk]
+    if pk_set is None:
+        return list(getattr(instance, CLEARED_PRODUCTS_ATTR, ()))
+    return list(pk_set)
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def remember_cleared_category_products(sender, instance, action, reverse,
+                                       **kwargs):
+    """
+    Remembers a category's products before `category.products.clear()`.
+
+    The post_clear signal does not say which products lost the category,
+    so they are stored on the category for the handlers below.
+
+    :param sender: The intermediate model of `Product.categories`.
+    :param instance: The Product (forward) or Category (reverse) instance.
+    :param action: The m2m action, e.g. 'pre_clear'.
+    :param reverse: True if the change was made from the Category side.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if action == 'pre_clear' and reverse:
+        setattr(instance, CLEARED_PRODUCTS_ATTR, list(
+            instance.products.values_list('pk', flat=True)
+        ))
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def index_product_on_categories_change(sender, instance, action, reverse,
+                                       pk_set, **kwargs):
+    """
+    Rebuilds search documents when product categories are changed.
+
+    Handles changes made from either side of the relation
+    (`product.categories` or `category.products`).
+
+    :param sender: The intermediate model of `Product.categories`.
+    :param instance: The Product (forward) or Category (reverse) instance.
+    :param action: The m2m action, e.g. 'post_add'.
+    :param reverse: True if the change was made from the Category side.
+    :param pk_set: Primary keys of the related objects that changed.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        update_search_document(instance)
+    else:
+        product_ids = _changed_product_ids(instance, reverse, pk_set)
+        if product_ids:
+            update_search_documents(product_ids)
+
+
+@receiver(post_save, sender=Category)
+def index_products_on_category_save(sender, instance, created, raw=False,
+                                    **kwargs):
+    """
+    Rebuilds the search documents of a category's products after the
+    category is saved (e.g. renamed).
+
+    :param sender: The Category model class.
+    :param instance: The saved Category instance.
+    :param created: True if the category was just created.
+    :param raw: True when loading fixtures; indexing is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if created or raw:
+        return
+    update_search_documents(
+        instance.products.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=SpecificationType)
+def index_products_on_spec_type_save(sender, instance, created, raw=False,
+                                     **kwargs):
+    """
+    Rebuilds the search documents of products using a specification type
+    after the type is saved (e.g. renamed).
+
+    :param sender: The SpecificationType model class.
+    :param instance: The saved SpecificationType instance.
+    :param created: True if the specification type was just created.
+    :param raw: True when loading fixtures; indexing is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if created or raw:
+        return
+    update_search_documents(
+        ProductSpecification.objects.filter(
+            spec_type=instance
+        ).values_list('product_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ProductSpecification)
+def index_product_on_spec_save(sender, instance, raw=False, **kwargs):
+    """
+    Rebuilds the product's search document after a specification is saved.
+
+    :param sender: The ProductSpecification model class.
+    :param instance: The saved ProductSpecification instance.
+    :param raw: True when loading fixtures; indexing is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if raw:
+        return
+    update_search_documents([instance.product_id])
+
+
+@receiver(post_delete, sender=ProductSpecification)
+def index_product_on_spec_delete(sender, instance, origin=None, **kwargs):
+    """
+    Rebuilds the product's search document after a specification is
+    deleted, unless the product itself is being deleted.
+
+    :param sender: The ProductSpecification model class.
+    :param instance: The deleted ProductSpecification instance.
+    :param origin: The object or queryset the deletion originated from.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if _is_product_deletion(origin):
+        return
+    update_search_documents([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SpecificationType)
+@receiver(post_delete, sender=SpecificationType)
+@receiver(post_save, sender=ProductSpecification)
+@receiver(post_delete, sender=ProductSpecification)
+def invalidate_catalog_cache(sender, update_fields=None, **kwargs):
+    """
+    Bumps the catalog cache version after any catalog row is saved or
+    deleted, so cached facet counts and the autocomplete index are rebuilt.
+
+    Product saves limited to the stock quantity (e.g. at checkout) do not
+    affect either and are skipped.
+
+    :param sender: The model class of the changed row.
+    :param update_fields: The fields passed to `save()`, if any.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if update_fields is not None and set(update_fields) <= {'stock_quantity'}:
+        return
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_catalog_cache_on_categories_change(sender, action, **kwargs):
+    """
+    Bumps the catalog cache version after product categories change.
+
+    :param sender: The intermediate model of `Product.categories`.
+    :param action: The m2m action, e.g. 'post_add'.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_cache_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Bumps the product's cache version after it is saved.
+
+    :param sender: The Product model class.
+    :param instance: The saved Product instance.
+    :param raw: True when loading fixtures.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    bump_product_versions([instance.pk])
+
+
+@receiver(post_save, sender=ProductSpecification)
+@receiver(post_delete, sender=ProductSpecification)
+def invalidate_product_cache_on_spec_change(sender, instance, **kwargs):
+    """
+    Bumps the product's cache version after one of its specifications is
+    saved or deleted.
+
+    :param sender: The ProductSpecification model class.
+    :param instance: The changed ProductSpecification instance.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    bump_product_versions([instance.product_id])
+
+
+@receiver(post_save, sender=SpecificationType)
+def invalidate_product_cache_on_spec_type_save(sender, instance, created,
+                                               **kwargs):
+    """
+    Bumps the cache versions of the products using a specification type
+    after the type is saved (e.g. renamed).
+
+    :param sender: The SpecificationType model class.
+    :param instance: The saved SpecificationType instance.
+    :param created: True if the specification type was just created.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if created:
+        return
+    bump_product_versions(
+        ProductSpecification.objects.filter(
+            spec_type=instance
+        ).values_list('product_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Product)
+def refresh_related_on_product_save(sender, instance, created, raw=False,
+                                    update_fields=None, **kwargs):
+    """
+    Refreshes related products after an existing product is saved.
+
+    Saves limited to other fields (e.g. stock updates at checkout) cannot
+    change the scores and are skipped. New products are scored once their
+    categories or specifications are added.
+
+    :param sender: The Product model class.
+    :param instance: The saved Product instance.
+    :param created: True if the product was just created.
+    :param raw: True when loading fixtures; the refresh is skipped.
+    :param update_fields: The fields passed to `save()`, if any.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if created or raw:
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    refresh_related_products_around(instance.pk)
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def refresh_related_on_categories_change(sender, instance, action, reverse,
+                                         pk_set, **kwargs):
+    """
+    Refreshes related products when product categories are changed.
+
+    :param sender: The intermediate model of `Product.categories`.
+    :param instance: The Product (forward) or Category (reverse) instance.
+    :param action: The m2m action, e.g. 'post_add'.
+    :param reverse: True if the change was made from the Category side.
+    :param pk_set: Primary keys of the related objects that changed.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    for product_id in _changed_product_ids(instance, reverse, pk_set):
+        refresh_related_products_around(product_id)
+
+
+@receiver(post_save, sender=ProductSpecification)
+def refresh_related_on_spec_save(sender, instance, raw=False, **kwargs):
+    """
+    Refreshes the product's related products after a specification is
+    saved.
+
+    :param sender: The ProductSpecification model class.
+    :param instance: The saved ProductSpecification instance.
+    :param raw: True when loading fixtures; the refresh is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if raw:
+        return
+    refresh_related_products_around(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductSpecification)
+def refresh_related_on_spec_delete(sender, instance, origin=None, **kwargs):
+    """
+    Refreshes the product's related products after a specification is
+    deleted, unless the product itself is being deleted.
+
+    :param sender: The ProductSpecification model class.
+    :param instance: The deleted ProductSpecification instance.
+    :param origin: The object or queryset the deletion originated from.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if _is_product_deletion(origin):
+        return
+    refresh_related_products_around(instance.product_id)
+
+
+def _apply_rating_aggregates(review, aggregates):
+    """
+    Copies freshly stored rating aggregates onto the review's product
+    instance, if it is already loaded, so callers holding that instance
+    see the new values without reloading it.
+
+    :param review: The Review whose product was refreshed.
+    :param aggregates: The mapping returned by `refresh_rating_aggregates`.
+    """
+
+    values = aggregates.get(review.product_id)
+    if values and Review.product.is_cached(review):
+        for field_name, value in values.items():
+            setattr(review.product, field_name, value)
+
+
+@receiver(post_save, sender=Review)
+def refresh_ratings_on_review_save(sender, instance, raw=False, **kwargs):
+    """
+    Recomputes the product's rating aggregates after a review is created
+    or updated (including approval toggles).
+
+    :param sender: The Review model class.
+    :param instance: The saved Review instance.
+    :param raw: True when loading fixtures; the refresh is skipped.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if raw:
+        return
+    aggregates = refresh_rating_aggregates([instance.product_id])
+    _apply_rating_aggregates(instance, aggregates)
+
+
+@receiver(post_delete, sender=Review)
+def refresh_ratings_on_review_delete(sender, instance, origin=None,
+                                     **kwargs):
+    """
+    Recomputes the product's rating aggregates after a review is deleted,
+    unless the product itself is being deleted.
+
+    :param sender: The Review model class.
+    :param instance: The deleted Review instance.
+    :param origin: The object or queryset the deletion originated from.
+    :param kwargs: Additional keyword arguments passed by the signal.
+    """
+
+    if _is_product_deletion(origin):
+        return
+    aggregates = refresh_rating_aggregates([instance.product_id])
+    _apply_rating_aggregates(instance, aggregates)
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from .models import (
     Category,
@@ -8,6 +8,24 @@ from .models import (
     Review
 )
 from django.contrib.auth.models import User
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from io import StringIO
+from .admin import ReviewAdmin
+from .forms import ReviewForm
+from .sentiment import get_analyzer
+from .filters import parse_spec_filters
+from .views import ProductListView
+from .models import RelatedProduct, RelatedProductRefresh
+from orders.models import Order, OrderItem, OrderStatus
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+
+# Query-count tests use a local cache, so cache reads are not counted.
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
 
 
 class ProductListViewTests(TestCase):
@@ -165,12 +183,513 @@ class ProductListViewTests(TestCase):
         self.assertEqual(products[0].name, 'Product 1')
 
 
+
+
+class ProductListKeysetPaginationTests(TestCase):
+    def setUp(self):
+        """
+        Set up enough products to span several pages, with duplicated
+        prices so the id tiebreaker is exercised.
+        """
+
+        self.client = Client()
+        self.product_list_url = reverse('product_list')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                price=10 + i % 3,
+                description=f'Description {i}',
+            )
+            for i in range(50)
+        ]
+
+    def walk_cursor_pages(self, response, sort):
+        """
+        Helper following next cursors from a response until the last page
+        and returning the products of the pages visited.
+        """
+
+        seen = []
+        while response.context['next_cursor']:
+            response = self.client.get(self.product_list_url, {
+                'sort': sort,
+                'cursor': response.context['next_cursor'],
+            })
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.context['products'])
+        return seen
+
+    def test_cursor_pages_continue_after_page_numbers(self):
+        """
+        Test that the last numbered page links to cursor pages and that
+        walking them returns every product once, in sort order.
+        """
+
+        for sort in ('price_asc', 'price_desc', 'newest'):
+            seen = []
+            for page in range(1, 6):
+                response = self.client.get(self.product_list_url, {
+                    'sort': sort,
+                    'page': page,
+                })
+                self.assertEqual(response.status_code, 200)
+                seen.extend(response.context['products'])
+
+            self.assertIsNotNone(response.context['next_cursor'])
+            seen.extend(self.walk_cursor_pages(response, sort))
+            expected = list(
+                Product.objects.order_by(
+                    *ProductListView.SORT_ORDERINGS[sort]
+                )
+            )
+            self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        """
+        Test that the previous cursor of a cursor page returns the page
+        before it.
+        """
+
+        page_five = self.client.get(self.product_list_url, {'page': 5})
+        page_six = self.client.get(self.product_list_url, {
+            'cursor': page_five.context['next_cursor'],
+        })
+        previous = self.client.get(self.product_list_url, {
+            'cursor': page_six.context['previous_cursor'],
+        })
+        self.assertEqual(list(previous.context['products']),
+                         list(page_five.context['products']))
+
+    def test_cursor_page_skips_count_query(self):
+        """
+        Test that a cursor page is served without a COUNT query.
+        """
+
+        page_five = self.client.get(self.product_list_url, {'page': 5})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.product_list_url, {
+                'cursor': page_five.context['next_cursor'],
+            })
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+
+    def test_invalid_cursor_returns_404(self):
+        """
+        Test that tampered cursors and cursors for another sort are
+        rejected.
+        """
+
+        response = self.client.get(self.product_list_url,
+                                   {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+        page_five = self.client.get(self.product_list_url, {'page': 5})
+        response = self.client.get(self.product_list_url, {
+            'cursor': page_five.context['next_cursor'],
+            'sort': 'price_asc',
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_last_numbered_page_beyond_page_links_renders(self):
+        """
+        Test that the last page of a catalog with more pages than page
+        links renders, with a disabled next arrow.
+        """
+
+        response = self.client.get(self.product_list_url, {'page': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertContains(response, 'fs-5 disabled')
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        """
+        Set up products, a category and specifications for search tests.
+        """
+
+        self.client = Client()
+        self.product_list_url = reverse('product_list')
+        self.category = Category.objects.create(name='Tablets', slug='tablets')
+        self.spec_type = SpecificationType.objects.create(name='Display')
+
+        self.tablet = Product.objects.create(
+            name='Compute Tablet',
+            price=199.00,
+            description='A modular device',
+            sku='CT-100',
+        )
+        self.tablet.categories.add(self.category)
+        ProductSpecification.objects.create(
+            product=self.tablet,
+            spec_type=self.spec_type,
+            value='Amoled'
+        )
+
+        self.case = Product.objects.create(
+            name='Protective Case',
+            price=19.00,
+            description='Fits the compute tablet perfectly',
+        )
+
+    def search(self, query):
+        """
+        Helper returning the products found for a search query.
+        """
+
+        response = self.client.get(self.product_list_url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['products'])
+
+    def test_search_matches_specification_value(self):
+        """
+        Test that products are found by specification values.
+        """
+
+        self.assertEqual(self.search('amoled'), [self.tablet])
+
+    def test_search_matches_prefix_and_sku(self):
+        """
+        Test that partial words and SKUs match.
+        """
+
+        self.assertEqual(self.search('ct-100'), [self.tablet])
+        self.assertIn(self.case, self.search('protect'))
+
+    def test_search_is_ranked_by_relevance(self):
+        """
+        Test that name matches rank above description matches.
+        """
+
+        self.assertEqual(self.search('compute tablet'),
+                         [self.tablet, self.case])
+
+    def test_search_document_follows_category_rename(self):
+        """
+        Test that renaming a category reindexes its products.
+        """
+
+        self.category.name = 'Slates'
+        self.category.save()
+        self.assertEqual(self.search('slates'), [self.tablet])
+
+    def test_search_document_follows_category_clear(self):
+        """
+        Test that clearing a category's products from the category side
+        reindexes the products it had.
+        """
+
+        self.category.name = 'Slates'
+        self.category.save()
+        self.category.products.clear()
+        self.assertEqual(self.search('slates'), [])
+
+    def test_search_document_follows_specification_delete(self):
+        """
+        Test that deleting a specification removes it from the index.
+        """
+
+        self.tablet.specifications.all().delete()
+        self.assertEqual(self.search('amoled'), [])
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        """
+        Set up categorized products with specifications for facet tests.
+        """
+
+        self.client = Client()
+        self.product_list_url = reverse('product_list')
+        self.phones = Category.objects.create(name='Phones', slug='phones')
+        self.boards = Category.objects.create(name='Boards', slug='boards')
+        self.ram = SpecificationType.objects.create(name='RAM')
+
+        for index, (category, ram) in enumerate([
+            (self.phones, '8GB'),
+            (self.phones, '4GB'),
+            (self.boards, '8GB'),
+        ]):
+            product = Product.objects.create(
+                name=f'Device {index}',
+                price=100 + index,
+            )
+            product.categories.add(category)
+            ProductSpecification.objects.create(
+                product=product, spec_type=self.ram, value=ram
+            )
+
+    def get_facets(self, params=None):
+        """
+        Helper returning the category counts and spec facets of a request.
+        """
+
+        response = self.client.get(self.product_list_url, params or {})
+        self.assertEqual(response.status_code, 200)
+        counts = {
+            category.slug: count
+            for category, count in response.context['category_facets']
+        }
+        spec_facets = {
+            spec_type['name']: [
+                (choice['label'], choice['count'])
+                for choice in spec_type['values']
+            ]
+            for spec_type in response.context['spec_facets']
+        }
+        return counts, spec_facets
+
+    def test_facet_counts(self):
+        """
+        Test category and specification value counts without filters.
+        """
+
+        counts, spec_facets = self.get_facets()
+        self.assertEqual(counts, {'phones': 2, 'boards': 1})
+        self.assertEqual(spec_facets, {'RAM': [('8GB', 2), ('4GB', 1)]})
+
+    def test_category_filter_narrows_spec_facets_only(self):
+        """
+        Test that the category filter narrows the specification counts but
+        not the category counts.
+        """
+
+        counts, spec_facets = self.get_facets({'category': 'boards'})
+        self.assertEqual(counts, {'phones': 2, 'boards': 1})
+        self.assertEqual(spec_facets['RAM'], [('8GB', 1)])
+
+    def test_facets_are_cached_until_catalog_changes(self):
+        """
+        Test that repeated requests reuse the cached counts and that a
+        catalog change invalidates them.
+        """
+
+        self.get_facets({'q': 'Device'})
+        with CaptureQueriesContext(connection) as queries:
+            self.get_facets({'q': '  device '})
+        self.assertFalse(any(
+            'UNION' in query['sql'] for query in queries.captured_queries
+        ))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Device 3', price=1)
+            product.categories.add(self.boards)
+        counts, _ = self.get_facets({'q': 'Device'})
+        self.assertEqual(counts['boards'], 2)
+
+
+class ProductSpecFilterTests(TestCase):
+    def setUp(self):
+        """
+        Set up products with RAM and storage specifications.
+        """
+
+        self.client = Client()
+        self.product_list_url = reverse('product_list')
+        self.ram = SpecificationType.objects.create(name='RAM')
+        self.storage = SpecificationType.objects.create(name='Storage')
+        self.products = {}
+        for name, ram, storage in [
+            ('A', '8 GB', '128GB'),
+            ('B', '8gb', '64GB'),
+            ('C', '4GB', '128GB'),
+        ]:
+            product = Product.objects.create(name=name, price=10)
+            ProductSpecification.objects.create(
+                product=product, spec_type=self.ram, value=ram
+            )
+            ProductSpecification.objects.create(
+                product=product, spec_type=self.storage, value=storage
+            )
+            self.products[name] = product
+
+    def filtered(self, *specs):
+        """
+        Helper returning the names of the products matching spec filters.
+        """
+
+        response = self.client.get(self.product_list_url, {'spec': specs})
+        self.assertEqual(response.status_code, 200)
+        return sorted(product.name for product in response.context['products'])
+
+    def test_values_are_normalized(self):
+        """
+        Test that case and whitespace differences in values are ignored.
+        """
+
+        self.assertEqual(self.filtered('ram:8GB'), ['A', 'B'])
+        self.assertEqual(
+            ProductSpecification.objects.get(
+                product=self.products['A'], spec_type=self.ram
+            ).normalized_value,
+            '8gb'
+        )
+
+    def test_types_are_combined_with_and_values_with_or(self):
+        """
+        Test that different types must all match while values of the same
+        type are alternatives.
+        """
+
+        self.assertEqual(self.filtered('RAM:8GB', 'Storage:128GB'), ['A'])
+        self.assertEqual(self.filtered('RAM:8GB', 'RAM:4GB'), ['A', 'B', 'C'])
+
+    def test_types_sharing_a_name_count_as_one_filter(self):
+        """
+        Test that a product matching one filter through several types with
+        the same name is not excluded, and that repeated names are merged.
+        """
+
+        ram_alias = SpecificationType.objects.create(name='ram')
+        ProductSpecification.objects.create(
+            product=self.products['A'], spec_type=ram_alias, value='8GB'
+        )
+
+        self.assertEqual(self.filtered('RAM:8GB'), ['A', 'B'])
+        self.assertEqual(self.filtered('RAM:8GB', 'Storage:128GB'), ['A'])
+        self.assertEqual(
+            parse_spec_filters(['RAM:8GB', ' ram :4GB']),
+            [(frozenset({self.ram.pk, ram_alias.pk}),
+              frozenset({'8gb', '4gb'}))]
+        )
+
+    def test_unknown_type_matches_nothing_and_malformed_is_ignored(self):
+        """
+        Test that an unknown type yields no products and a malformed filter
+        is ignored.
+        """
+
+        self.assertEqual(self.filtered('Colour:Red'), [])
+        self.assertEqual(self.filtered('nonsense'), ['A', 'B', 'C'])
+
+    def test_filter_uses_one_grouped_specification_subquery(self):
+        """
+        Test that several filters do not join the specification table once
+        per filter.
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            self.filtered('RAM:8GB', 'Storage:128GB')
+        product_query = next(
+            query['sql'] for query in queries.captured_queries
+            if 'HAVING' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        self.assertEqual(
+            product_query.count('"products_productspecification"'), 1
+        )
+
+
+class RelatedProductTests(TestCase):
+    def setUp(self):
+        """
+        Set up products sharing categories, specifications and orders.
+        """
+
+        cache.clear()
+        self.category = Category.objects.create(name='Kits', slug='kits')
+        self.colour = SpecificationType.objects.create(name='Colour')
+        self.product = Product.objects.create(name='Pi Kit', price=80)
+        self.same_category = Product.objects.create(name='Pi Case', price=9)
+        self.same_spec = Product.objects.create(name='Red Cable', price=4)
+        self.bought_together = Product.objects.create(name='Fan', price=5)
+
+        self.product.categories.add(self.category)
+        self.same_category.categories.add(self.category)
+        for product in (self.product, self.same_spec):
+            ProductSpecification.objects.create(
+                product=product, spec_type=self.colour, value='Red'
+            )
+
+        call_command('rebuild_related_products', '--queued',
+                     stdout=StringIO())
+
+        order = Order.objects.create(
+            shipping_full_name='Buyer',
+            shipping_email='buyer@example.com',
+            shipping_address1='1 Street',
+            shipping_city='City',
+            shipping_zipcode='00000',
+            shipping_country='IE',
+            status=OrderStatus.PROCESSING,
+        )
+        for product in (self.product, self.bought_together):
+            OrderItem.objects.create(order=order, product=product, price=1)
+
+    def related_to(self, product):
+        """
+        Helper returning the stored related products, best first.
+        """
+
+        return [
+            entry.related for entry in RelatedProduct.objects.filter(
+                product=product
+            ).order_by('-score')
+        ]
+
+    def test_catalog_changes_refresh_related_products(self):
+        """
+        Test that catalog changes rescore the changed product at once and
+        queue the products around it, and that the queue worker drops a
+        deactivated product from other lists.
+        """
+
+        self.assertFalse(RelatedProductRefresh.objects.exists())
+        self.assertEqual(self.related_to(self.product),
+                         [self.same_category, self.same_spec])
+        self.assertEqual(self.related_to(self.same_spec), [self.product])
+
+        self.same_category.is_active = False
+        self.same_category.save()
+        self.assertTrue(RelatedProductRefresh.objects.filter(
+            product=self.same_category
+        ).exists())
+        self.assertEqual(self.related_to(self.product),
+                         [self.same_category, self.same_spec])
+
+        out = StringIO()
+        call_command('rebuild_related_products', '--queued', stdout=out)
+        self.assertIn('around 1 queued', out.getvalue())
+        self.assertEqual(self.related_to(self.product),
+                         [self.bought_together, self.same_spec])
+
+    def test_command_adds_co_purchases(self):
+        """
+        Test that the rebuild command scores co-purchased products.
+        """
+
+        out = StringIO()
+        call_command('rebuild_related_products', stdout=out)
+        self.assertEqual(
+            self.related_to(self.product),
+            [self.same_category, self.bought_together, self.same_spec]
+        )
+        self.assertIn('4 products', out.getvalue())
+
+    def test_detail_page_reads_related_products_in_one_query(self):
+        """
+        Test that the detail page lists related products from the table.
+        """
+
+        url = reverse('product_detail', kwargs={'pk': self.product.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(list(response.context['related_products']),
+                         [self.same_category, self.same_spec])
+        related_queries = [
+            query for query in queries.captured_queries
+            if 'products_relatedproduct' in query['sql']
+        ]
+        self.assertEqual(len(related_queries), 1)
+
+
 class ProductDetailViewTests(TestCase):
     def setUp(self):
         """
         Set up test environment with a client, user, category, and product.
         """
 
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username='testuser',
@@ -232,6 +751,8 @@ class ProductDetailViewTests(TestCase):
             is_active=True,
         )
         related_product.categories.add(self.category)
+        call_command('rebuild_related_products', '--queued',
+                     stdout=StringIO())
 
         response = self.client.get(self.product_detail_url)
         self.assertEqual(response.status_code, 200)
@@ -240,6 +761,154 @@ class ProductDetailViewTests(TestCase):
             list(response.context['related_products'])
         )
 
+    def test_product_detail_view_is_cached_until_product_changes(self):
+        """
+        Test that repeated views reuse the cached product data, keep the
+        per-user review check uncached, and are invalidated by a review.
+        """
+
+        self.client.login(username='testuser', password='password')
+        self.client.get(self.product_detail_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.product_detail_url)
+        product_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'products_' in query['sql']
+        ]
+        self.assertEqual(len(product_queries), 1)
+        self.assertIn('products_review', product_queries[0])
+        self.assertFalse(response.context['user_has_reviewed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                product=self.product,
+                user=self.user,
+                rating=4,
+                comment='Good',
+                is_approved=True,
+            )
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.context['review_count'], 1)
+        self.assertTrue(response.context['user_has_reviewed'])
+
+
+class ProductReviewsPaginationTests(TestCase):
+    def setUp(self):
+        """
+        Set up a product with more approved reviews than fit on a page.
+        """
+
+        cache.clear()
+        self.product = Product.objects.create(name='Popular', price=10)
+        for index in range(7):
+            user = User.objects.create_user(username=f'reviewer{index}')
+            Review.objects.create(
+                product=self.product,
+                user=user,
+                rating=5 if index % 2 else 3,
+                comment=f'Review {index}',
+                is_approved=True,
+            )
+        self.detail_url = reverse('product_detail',
+                                  kwargs={'pk': self.product.pk})
+        self.reviews_url = reverse('product_reviews',
+                                   kwargs={'pk': self.product.pk})
+
+    def test_reviews_are_paginated_by_cursor(self):
+        """
+        Test that the detail page shows the first page of reviews and the
+        endpoint serves the rest without duplicates.
+        """
+
+        response = self.client.get(self.detail_url)
+        first_page = [review.comment for review in response.context['reviews']]
+        self.assertEqual(len(first_page), 5)
+        self.assertEqual(first_page[0], 'Review 6')
+        self.assertEqual(response.context['review_count'], 7)
+        self.assertEqual(response.context['rating_summary'][0], (5, 3, 43))
+
+        response = self.client.get(
+            self.reviews_url,
+            {'cursor': response.context['reviews_next_cursor']}
+        )
+        data = response.json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('Review 1', data['html'])
+        self.assertIn('Review 0', data['html'])
+        self.assertNotIn('Review 2', data['html'])
+
+    def test_invalid_review_cursor_returns_404(self):
+        """
+        Test that a tampered cursor is rejected.
+        """
+
+        response = self.client.get(self.reviews_url, {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductAutocompleteTests(TestCase):
+    def setUp(self):
+        """
+        Set up products and a category for autocomplete tests.
+        """
+
+        cache.clear()
+        self.url = reverse('product_autocomplete')
+        self.category = Category.objects.create(name='Pi Kits', slug='pi-kits')
+        self.product = Product.objects.create(
+            name='Raspberry Pi 5', price=80, sku='RPI5-8GB'
+        )
+        Product.objects.create(name='Pico Board', price=5)
+        Product.objects.create(name='Pi Zero', price=15, is_active=False)
+
+    def suggest(self, query, **params):
+        """
+        Helper returning the suggestion labels for a query.
+        """
+
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['label'] for result in response.json()['results']]
+
+    def test_prefix_matches_names_words_skus_and_categories(self):
+        """
+        Test that prefixes match at any word, SKUs and category names, and
+        that inactive products are not suggested.
+        """
+
+        self.assertEqual(self.suggest('pi'),
+                         ['Pi Kits', 'Pico Board', 'Raspberry Pi 5'])
+        self.assertEqual(self.suggest('rpi5'), ['Raspberry Pi 5'])
+        self.assertEqual(self.suggest('PI', limit=1), ['Pi Kits'])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_lookups_use_no_queries_and_follow_catalog_changes(self):
+        """
+        Test that a built index answers without queries and is rebuilt
+        after a product is renamed.
+        """
+
+        self.suggest('rasp')
+        with CaptureQueriesContext(connection) as queries:
+            self.suggest('rasp')
+        self.assertEqual(len(queries.captured_queries), 0)
+
+        self.product.name = 'Raspberry Pi 500'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.suggest('rasp'), ['Raspberry Pi 500'])
+
+    def test_stats_command_reports_memory(self):
+        """
+        Test that the stats command reports the index size.
+        """
+
+        out = StringIO()
+        call_command('autocomplete_index_stats', stdout=out)
+        self.assertIn('Entries: 3', out.getvalue())
+        self.assertIn('KiB', out.getvalue())
+
 
 class CategoryModelTests(TestCase):
     def test_category_creation(self):
@@ -452,3 +1121,180 @@ class ReviewModelTests(TestCase):
             str(Review._meta.verbose_name_plural),
             'Product Reviews'
         )
+
+
+class ProductRatingAggregateTests(TestCase):
+    def setUp(self):
+        """
+        Set up a product and two users for rating aggregate tests.
+        """
+
+        self.product = Product.objects.create(
+            name='Test Product',
+            price=50.00,
+            description='Test Description',
+        )
+        self.user1 = User.objects.create_user(
+            username='user1',
+            password='password'
+        )
+        self.user2 = User.objects.create_user(
+            username='user2',
+            password='password'
+        )
+
+    def test_aggregates_follow_review_changes(self):
+        """
+        Test that approving, unapproving and deleting reviews keeps the
+        stored aggregates up to date.
+        """
+
+        review1 = Review.objects.create(product=self.product, user=self.user1,
+                                        rating=5, comment='Great',
+                                        is_approved=True)
+        review2 = Review.objects.create(product=self.product, user=self.user2,
+                                        rating=2, comment='Meh',
+                                        is_approved=True)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 2)
+        self.assertEqual(self.product.rating_avg, 3.5)
+        self.assertEqual(self.product.rating_histogram, [0, 1, 0, 0, 1])
+
+        review2.is_approved = False
+        review2.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, 5.0)
+
+        review1.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 0)
+        self.assertEqual(self.product.rating_avg, 0)
+        self.assertEqual(self.product.rating_histogram, [0, 0, 0, 0, 0])
+
+    def test_admin_approve_action_refreshes_aggregates(self):
+        """
+        Test that the bulk approve admin action refreshes aggregates.
+        """
+
+        Review.objects.create(product=self.product, user=self.user1,
+                              rating=4, comment='Good')
+        ReviewAdmin(Review, site).approve_reviews(None, Review.objects.all())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, 4.0)
+
+    def test_rebuild_rating_aggregates_command(self):
+        """
+        Test that the management command repairs stale aggregates.
+        """
+
+        Review.objects.create(product=self.product, user=self.user1,
+                              rating=3, comment='Okay', is_approved=True)
+        Product.objects.filter(pk=self.product.pk).update(
+            rating_avg=0, rating_count=0
+        )
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, 3.0)
+
+    def test_stale_product_save_keeps_aggregates(self):
+        """
+        Test that saving a product loaded before a review does not write
+        back its stale aggregates.
+        """
+
+        stale = Product.objects.get(pk=self.product.pk)
+        Review.objects.create(product=self.product, user=self.user1,
+                              rating=4, comment='Good', is_approved=True)
+
+        stale.name = 'Renamed Product'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'Renamed Product')
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_histogram, [0, 0, 0, 1, 0])
+
+    def test_saving_deleted_product_recreates_it(self):
+        """
+        Test that saving a product deleted since it was loaded re-creates
+        it instead of raising an error.
+        """
+
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).delete()
+
+        stale.name = 'Restored Product'
+        stale.save()
+        self.assertEqual(Product.objects.get(pk=stale.pk).name,
+                         'Restored Product')
+
+
+class ReviewSentimentTests(TestCase):
+    def setUp(self):
+        """
+        Set up a product, a user and reviews without sentiment scores.
+        """
+
+        self.product = Product.objects.create(name='Sensor', price=12)
+        self.user = User.objects.create_user(username='moderated')
+        self.negative = Review.objects.create(
+            product=self.product,
+            user=self.user,
+            rating=1,
+            comment='Terrible, broken and useless.',
+            is_approved=True,
+        )
+        self.positive = Review.objects.create(
+            product=self.product,
+            user=User.objects.create_user(username='happy'),
+            rating=5,
+            comment='Great sensor, works perfectly!',
+        )
+
+    def test_form_stores_score_with_shared_analyzer(self):
+        """
+        Test that the review form stores the compound score and that the
+        analyzer is loaded only once per process.
+        """
+
+        form = ReviewForm(data={'rating': 5, 'comment': 'I love it'})
+        self.assertTrue(form.is_valid())
+        review = form.save(commit=False)
+        self.assertGreater(review.sentiment_score, 0.05)
+        self.assertTrue(review.is_approved)
+        self.assertIs(get_analyzer(), get_analyzer())
+
+    def test_rescore_command_remoderates_and_refreshes_ratings(self):
+        """
+        Test that the command scores reviews in chunks, recomputes approval
+        and refreshes the product's rating aggregates.
+        """
+
+        out = StringIO()
+        call_command('rescore_reviews', '--remoderate', '--chunk-size=1',
+                     '--workers=1', stdout=out)
+        self.negative.refresh_from_db()
+        self.positive.refresh_from_db()
+        self.product.refresh_from_db()
+
+        self.assertLess(self.negative.sentiment_score, 0)
+        self.assertFalse(self.negative.is_approved)
+        self.assertTrue(self.positive.is_approved)
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, 5)
+        self.assertIn('Approval changed for 2 reviews', out.getvalue())
+
+    def test_rescore_command_with_process_pool(self):
+        """
+        Test that scoring in worker processes stores the same scores.
+        """
+
+        call_command('rescore_reviews', '--only-missing', '--workers=2',
+                     stdout=StringIO())
+        self.positive.refresh_from_db()
+        self.assertGreater(self.positive.sentiment_score, 0.05)
+        self.assertFalse(
+            Review.objects.filter(sentiment_score__isnull=True).exists()
+        )
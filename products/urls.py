@@ -2,11 +2,17 @@
 URL configuration for the products application.
 
 Defines the URL patterns that map request paths to the corresponding
-product views, such as the product list page and the product detail page.
+product views, such as the product list page, the product detail page and
+the paginated product reviews and the search suggestions.
 """
 
 from django.urls import path
-from .views import ProductListView, ProductDetailView
+from .views import (
+    ProductListView,
+    ProductDetailView,
+    ProductReviewsView,
+    ProductAutocompleteView,
+)
 
 urlpatterns = [
     # URL pattern for the main product listing page
@@ -21,4 +27,16 @@ urlpatterns = [
         ProductDetailView.as_view(),
         name='product_detail'
     ),
+    # URL pattern for further pages of a product's reviews (JSON)
+    path(
+        'product/<int:pk>/reviews/',
+        ProductReviewsView.as_view(),
+        name='product_reviews'
+    ),
+    # URL pattern for search-as-you-type suggestions (JSON)
+    path(
+        'autocomplete/',
+        ProductAutocompleteView.as_view(),
+        name='product_autocomplete'
+    ),
 ]
@@ -3,89 +3,330 @@ Defines the views for the products application.
 
 This module contains views for displaying lists of products (`ProductListView`)
 and the detailed view of a single product (`ProductDetailView`),
-including handling product reviews submission via a form.
+including handling product reviews submission via a form and serving further
+pages of reviews (`ProductReviewsView`), and the search-as-you-type
+suggestions (`ProductAutocompleteView`).
 """
 
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import FormMixin
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Product, Category, Review
+from .models import (
+    Product,
+    Category,
+    Review,
+    RelatedProduct,
+    normalize_spec_value,
+)
 from .forms import ReviewForm
-from django.db.models import Q, Avg
+from .search import search_products
+from .filters import filter_by_specs, parse_spec_filters
+from .facets import get_facets
+from .cache import get_product_version
+from .pagination import KeysetPaginator, InvalidCursor
+from .autocomplete import (
+    CATEGORY,
+    MAX_SUGGESTIONS,
+    get_prefix_index,
+)
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
 from django.urls import reverse
 from django.contrib import messages
+from django.template.loader import render_to_string
+from django.views import View
+from urllib.parse import urlencode
+
+REVIEWS_PER_PAGE = 5
+
+
+def get_review_paginator(product_id):
+    """
+    Creates a keyset paginator over a product's approved reviews, newest
+    first.
+
+    :param product_id: The primary key of the reviewed product.
+    :return: A paginator of `REVIEWS_PER_PAGE` reviews per page.
+    :rtype: products.pagination.KeysetPaginator
+    """
+
+    reviews = Review.objects.filter(
+        product_id=product_id,
+        is_approved=True
+    ).select_related('user').only(
+        'product_id', 'rating', 'comment', 'created_on', 'user__username'
+    )
+    return KeysetPaginator(reviews, REVIEWS_PER_PAGE, ('-created_on', '-id'))
+
+
+def get_rating_summary(product):
+    """
+    Builds the per-star rating summary from the product's stored rating
+    histogram.
+
+    :param product: The Product instance.
+    :return: A list of (stars, review count, percentage) tuples from five
+             stars down to one, or an empty list if there are no reviews.
+    :rtype: list[tuple[int, int, int]]
+    """
+
+    if not product.rating_count:
+        return []
+    return [
+        (star, count, round(count * 100 / product.rating_count))
+        for star, count in reversed(
+            list(enumerate(product.rating_histogram, start=1))
+        )
+    ]
 
 
 class ProductListView(ListView):
     """
     Displays a list of active products.
 
-    Handles filtering by category, searching across multiple fields (name,
-    description, SKU, category, specifications), and sorting by various
-    criteria (newest, price, rating). Supports pagination.
+    Handles filtering by category and by specification values ('spec'
+    parameters such as "RAM:8GB"), full-text searching across product
+    search documents (name, description, SKU, category, specifications),
+    and sorting by various criteria (relevance, newest, price, rating).
+
+    The first `max_page_number` pages use page-number (OFFSET) pagination.
+    Later pages, and any request carrying a 'cursor' parameter, use keyset
+    pagination on the active sort key, which needs no `COUNT(*)` and costs
+    the same for every page.
     """
 
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 8
+    max_page_number = 5
 
-    def get_queryset(self):
+    SORT_ORDERINGS = {
+        'newest': ('-created_on', '-id'),
+        'price_asc': ('price', 'id'),
+        'price_desc': ('-price', '-id'),
+        'rating_desc': ('-rating_avg', '-created_on', '-id'),
+        'relevance': ('-search_rank', '-created_on', '-id'),
+    }
+
+    def get_sort_key(self):
         """
-        Retrieves and filters the queryset of active products.
+        Determines the active sort key from the 'sort' GET parameter.
+
+        Searches without an explicit sort are sorted by relevance; anything
+        else unknown falls back to newest first.
+
+        :return: A key of `SORT_ORDERINGS`.
+        :rtype: str
+        """
+
+        sort_by = self.request.GET.get('sort')
+        if sort_by in self.SORT_ORDERINGS and sort_by != 'relevance':
+            return sort_by
+        if self.request.GET.get('q'):
+            return 'relevance'
+        return 'newest'
+
+    def get_spec_filters(self):
+        """
+        Parses the 'spec' GET parameters (once per request).
+
+        :return: Filters as returned by
+                 `products.filters.parse_spec_filters`.
+        :rtype: list
+        """
+
+        if not hasattr(self, '_spec_filters'):
+            self._spec_filters = parse_spec_filters(
+                self.request.GET.getlist('spec')
+            )
+        return self._spec_filters
+
+    def get_filtered_queryset(self, apply_categories=True):
+        """
+        Retrieves the active products matching the current filter state,
+        without any ordering.
 
         Applies filters based on GET parameters for search query ('q'),
-        category slugs ('category'), and sorting ('sort'). Annotates the
-        queryset with the calculated average rating for sorting purposes.
+        category slugs ('category') and specification values ('spec').
 
-        :return: A filtered and sorted QuerySet of Product objects.
+        :param apply_categories: False to ignore the category filter (used
+                                 for the category facet counts).
+        :return: A filtered QuerySet of Product objects.
         :rtype: django.db.models.QuerySet
         """
 
         queryset = Product.objects.filter(is_active=True)
         search_query = self.request.GET.get('q')
-        sort_by = self.request.GET.get('sort')
         selected_category_slugs = self.request.GET.getlist('category')
-        queryset = queryset.annotate(
-            calculated_average_rating=Avg(
-                'reviews__rating',
-                filter=Q(reviews__is_approved=True)
-            )
-        )
 
-        if selected_category_slugs:
+        if apply_categories and selected_category_slugs:
             queryset = queryset.filter(
                 categories__slug__in=selected_category_slugs
             ).distinct()
 
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(sku__icontains=search_query) |
-                Q(categories__name__icontains=search_query) |
-                Q(specifications__value__icontains=search_query) |
-                Q(specifications__spec_type__name__icontains=search_query)
-            ).distinct()
+        queryset = filter_by_specs(queryset, self.get_spec_filters())
 
-        if sort_by == 'newest':
-            queryset = queryset.order_by('-created_on')
-        elif sort_by == 'price_asc':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_desc':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'rating_desc':
-            queryset = queryset.order_by('-calculated_average_rating')
-        else:
-            queryset = queryset.order_by('-created_on')
+        if search_query:
+            queryset = search_products(queryset, search_query)
 
         return queryset
 
+    def get_queryset(self):
+        """
+        Retrieves the filtered queryset of active products, sorted by the
+        'sort' GET parameter.
+
+        Rating sorts use the stored `rating_avg` column. Every ordering ends
+        with the primary key so pagination is stable.
+
+        :return: A filtered and sorted QuerySet of Product objects.
+        :rtype: django.db.models.QuerySet
+        """
+
+        return self.get_filtered_queryset().order_by(
+            *self.SORT_ORDERINGS[self.get_sort_key()]
+        )
+
+    def get_facets(self):
+        """
+        Returns the facet counts for the current search and filter state.
+
+        Category counts ignore the category filter itself so shoppers can
+        see how many products selecting another category would add.
+
+        :return: The facet counts, see `products.facets.compute_facets`.
+        :rtype: dict
+        """
+
+        return get_facets(
+            self.request.GET.get('q'),
+            self.request.GET.getlist('category'),
+            self.request.GET.getlist('spec'),
+            self.get_filtered_queryset(apply_categories=False),
+            self.get_filtered_queryset(),
+        )
+
+    def get_keyset_paginator(self, queryset, page_size):
+        """
+        Creates a keyset paginator for the active sort key.
+
+        :param queryset: The filtered product queryset.
+        :param page_size: Number of products per page.
+        :return: A paginator keyed on the active ordering.
+        :rtype: products.pagination.KeysetPaginator
+        """
+
+        return KeysetPaginator(
+            queryset,
+            page_size,
+            self.SORT_ORDERINGS[self.get_sort_key()]
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates by page number, or by cursor when a 'cursor' GET
+        parameter is present.
+
+        :param queryset: The filtered product queryset.
+        :param page_size: Number of products per page.
+        :return: A (paginator, page, object_list, is_paginated) tuple.
+        :rtype: tuple
+        :raises Http404: If the cursor is invalid.
+        """
+
+        cursor = self.request.GET.get('cursor')
+        if cursor is None:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = self.get_keyset_paginator(queryset, page_size)
+        try:
+            page = paginator.page(cursor)
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_pagination_context(self, page):
+        """
+        Builds the links used by the pagination controls.
+
+        Page numbers are only offered up to `max_page_number`; from there
+        the "next" link continues with a cursor positioned after the last
+        product shown.
+
+        :param page: The current Page or CursorPage.
+        :return: A dictionary of pagination context variables.
+        :rtype: dict
+        """
+
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query.pop('cursor', None)
+        context = {
+            'pagination_query': query.urlencode(),
+            'max_page_number': self.max_page_number,
+            'next_cursor': None,
+            'previous_cursor': None,
+        }
+
+        if page is None:
+            return context
+
+        if getattr(page, 'is_cursor_page', False):
+            context['next_cursor'] = page.next_cursor
+            context['previous_cursor'] = page.previous_cursor
+        elif page.number >= self.max_page_number and page.has_next():
+            paginator = self.get_keyset_paginator(
+                self.object_list, self.paginate_by
+            )
+            products = list(page.object_list)
+            context['next_cursor'] = paginator.encode_cursor(products[-1])
+        return context
+
+    def get_spec_facet_choices(self, spec_facets):
+        """
+        Adds the filter parameter and selection state to each
+        specification facet value.
+
+        :param spec_facets: The 'specifications' part of the facet counts.
+        :return: A list of dicts with 'name' and 'values', each value a
+                 dict with 'label', 'count', 'param' and 'selected'.
+        :rtype: list[dict]
+        """
+
+        selected = {
+            (type_id, value)
+            for type_ids, values in self.get_spec_filters()
+            for type_id in type_ids
+            for value in values
+        }
+        return [
+            {
+                'name': spec_type['name'],
+                'values': [
+                    {
+                        'label': label,
+                        'count': count,
+                        'param': f"{spec_type['name']}:{label}",
+                        'selected': (
+                            spec_type['spec_type_id'],
+                            normalize_spec_value(label),
+                        ) in selected,
+                    }
+                    for label, count in spec_type['values']
+                ],
+            }
+            for spec_type in spec_facets
+        ]
+
     def get_context_data(self, **kwargs):
         """
-        Adds filtering, sorting, and category data to the template context.
+        Adds filtering, sorting, category, facet and pagination data to the
+        template context.
 
-        Includes all categories for filter display, the currently selected
-        categories, the search term, and the current sort parameter.
+        Includes all categories for filter display (with their facet
+        counts), the specification facets, the currently selected
+        categories and specification filters, the search term, the current
+        sort parameter and the pagination links.
 
         :param kwargs: Keyword arguments passed to the view.
         :return: A dictionary containing context data for the template.
@@ -93,10 +334,25 @@ class ProductListView(ListView):
         """
 
         context = super().get_context_data(**kwargs)
-        context['all_categories'] = Category.objects.all().order_by('name')
+        categories = Category.objects.all().order_by('name')
+        facets = self.get_facets()
+        context['all_categories'] = categories
+        context['category_facets'] = [
+            (category, facets['categories'].get(category.pk, 0))
+            for category in categories
+        ]
+        context['spec_facets'] = self.get_spec_facet_choices(
+            facets['specifications']
+        )
         context['selected_categories'] = self.request.GET.getlist('category')
+        context['selected_specs'] = self.request.GET.getlist('spec')
+        context['active_filter_count'] = (
+            len(context['selected_categories'])
+            + len(context['selected_specs'])
+        )
         context['search_term'] = self.request.GET.get('q', '')
         context['current_sort'] = self.request.GET.get('sort', '')
+        context.update(self.get_pagination_context(context['page_obj']))
         return context
 
 
@@ -107,12 +363,86 @@ class ProductDetailView(FormMixin, DetailView):
     Includes product information, approved reviews, a form for submitting
     new reviews (using FormMixin), related products, and average rating.
     Handles POST requests for review submission.
+
+    The product-level data (product and specifications, rating summary,
+    related products and reviews) is cached under the product's cache
+    version, which is bumped whenever the product, its specifications or
+    its reviews change. Other changes, such as a related product being
+    renamed or deactivated, show once the entry expires after
+    `cache_timeout` seconds. Only the per-user "has reviewed" check is run
+    on every request.
     """
 
     model = Product
     template_name = 'products/product_detail.html'
     context_object_name = 'product'
     form_class = ReviewForm
+    cache_timeout = 60 * 2
+
+    def get_cache_key(self):
+        """
+        Builds the cache key of the product-level data.
+
+        :return: A cache key including the product's cache version.
+        :rtype: str
+        """
+
+        pk = self.kwargs['pk']
+        return f'products:detail:{pk}:{get_product_version(pk)}'
+
+    def build_detail_data(self):
+        """
+        Loads the product-level data shown on the detail page.
+
+        :return: A dictionary with the product (specifications prefetched),
+                 the first page of approved reviews, related products and
+                 the rating summary.
+        :rtype: dict
+        :raises: Http404 if the product is not found or not active.
+        """
+
+        product = get_object_or_404(
+            Product.objects.filter(is_active=True).prefetch_related(
+                'specifications__spec_type'
+            ),
+            pk=self.kwargs['pk']
+        )
+        reviews_page = get_review_paginator(product.pk).page()
+        related_entries = RelatedProduct.objects.filter(
+            product=product,
+            related__is_active=True
+        ).select_related('related').order_by('-score')[:4]
+
+        return {
+            'product': product,
+            'reviews': reviews_page.object_list,
+            'reviews_next_cursor': reviews_page.next_cursor,
+            'review_count': product.rating_count,
+            'rating_summary': get_rating_summary(product),
+            'related_products': [entry.related for entry in related_entries],
+            'average_rating': round(
+                product.rating_avg,
+                1
+            ) if product.rating_count else None,
+        }
+
+    def get_detail_data(self):
+        """
+        Returns the product-level data from the cache, building and caching
+        it on a miss.
+
+        :return: See `build_detail_data`.
+        :rtype: dict
+        """
+
+        if not hasattr(self, '_detail_data'):
+            key = self.get_cache_key()
+            data = cache.get(key)
+            if data is None:
+                data = self.build_detail_data()
+                cache.set(key, data, self.cache_timeout)
+            self._detail_data = data
+        return self._detail_data
 
     def get_object(self):
         """
@@ -128,18 +458,21 @@ class ProductDetailView(FormMixin, DetailView):
         :raises: Http404 if the product is not found or not active.
         """
 
-        return get_object_or_404(
-            Product.objects.filter(is_active=True),
-            pk=self.kwargs['pk']
-        )
+        return self.get_detail_data()['product']
 
     def get_context_data(self, **kwargs):
         """
         Populates the context data for the product detail template.
 
-        Includes the product, approved reviews, review count, review form,
-        related products, average rating, and checks if the current user
-        has already reviewed this product.
+        Includes the product, the first page of approved reviews (later
+        pages are served by `ProductReviewsView`), review count, review
+        form, related products (read from the precomputed `RelatedProduct`
+        table), average rating and per-star summary (read, like the review
+        count, from the product's stored rating aggregates), and checks if
+        the current user has already reviewed this product.
+
+        Everything except the review form and the "has reviewed" check
+        comes from the cached product-level data.
 
         :param kwargs: Keyword arguments passed to the view.
         :return: A dictionary containing context data for the template.
@@ -147,37 +480,22 @@ class ProductDetailView(FormMixin, DetailView):
         """
 
         context = super().get_context_data(**kwargs)
-        product = self.object
-        reviews = Review.objects.filter(
-            product=product,
-            is_approved=True
-        ).select_related('user').order_by('-created_on')
-        context['reviews'] = reviews
-        context['review_count'] = reviews.count()
+        data = self.get_detail_data()
+        context['reviews'] = data['reviews']
+        context['reviews_next_cursor'] = data['reviews_next_cursor']
+        context['review_count'] = data['review_count']
+        context['rating_summary'] = data['rating_summary']
         context['review_form'] = self.get_form()
-        related_products = Product.objects.filter(
-            categories__in=product.categories.all(),
-            is_active=True
-        ).exclude(pk=product.pk).distinct().annotate(
-            calculated_average_rating=Avg(
-                'reviews__rating',
-                filter=Q(reviews__is_approved=True)
-            )
-        )
-        context['related_products'] = related_products[:4]
+        context['related_products'] = data['related_products']
+        context['average_rating'] = data['average_rating']
         context['user_has_reviewed'] = False
 
         if self.request.user.is_authenticated:
             context['user_has_reviewed'] = Review.objects.filter(
-                product=product,
+                product_id=self.object.pk,
                 user=self.request.user
             ).exists()
 
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
-        context['average_rating'] = round(
-            avg_rating,
-            1
-        ) if avg_rating else None
         return context
 
     def post(self, request, *args, **kwargs):
@@ -279,3 +597,90 @@ class ProductDetailView(FormMixin, DetailView):
         """
 
         return reverse('product_detail', kwargs={'pk': self.object.pk})
+
+
+class ProductReviewsView(View):
+    """
+    Serves further pages of a product's approved reviews as JSON.
+
+    The detail page renders the first page; this endpoint continues from a
+    'cursor' GET parameter (keyset pagination on `created_on`) and returns
+    the rendered review cards with the cursor of the following page.
+    """
+
+    def get(self, request, pk):
+        """
+        Handles GET requests for a page of reviews.
+
+        :param request: The HttpRequest object.
+        :type request: django.http.HttpRequest
+        :param pk: The primary key of the product.
+        :return: A JsonResponse with 'html' (the rendered reviews) and
+                 'next_cursor' (None on the last page).
+        :rtype: django.http.JsonResponse
+        :raises: Http404 if the product is not active or the cursor is
+                 invalid.
+        """
+
+        if not Product.objects.filter(pk=pk, is_active=True).exists():
+            raise Http404("Product not found.")
+
+        try:
+            page = get_review_paginator(pk).page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+
+        html = render_to_string(
+            'products/partials/review_items.html',
+            {'reviews': page.object_list},
+            request=request
+        )
+        return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
+
+
+class ProductAutocompleteView(View):
+    """
+    Serves search-as-you-type suggestions as JSON.
+
+    Product names, SKUs and category names are matched by prefix against
+    the in-process index in `products.autocomplete`, so requests do not
+    query the database (apart from rebuilding the index after catalog
+    changes).
+    """
+
+    default_limit = 8
+
+    def get(self, request):
+        """
+        Handles GET requests for suggestions.
+
+        :param request: The HttpRequest object, with the typed text in 'q'
+                        and an optional 'limit' (capped at
+                        `MAX_SUGGESTIONS`).
+        :type request: django.http.HttpRequest
+        :return: A JsonResponse with a 'results' list of dicts holding
+                 'label', 'type' and 'url'.
+        :rtype: django.http.JsonResponse
+        """
+
+        query = request.GET.get('q', '')
+        try:
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), MAX_SUGGESTIONS)
+
+        results = []
+        if query.strip():
+            product_list_url = reverse('product_list')
+            for kind, reference, label in get_prefix_index().lookup(
+                query, limit
+            ):
+                if kind == CATEGORY:
+                    query_string = urlencode({'category': reference})
+                    url = f'{product_list_url}?{query_string}'
+                else:
+                    url = reverse('product_detail', kwargs={'pk': reference})
+                results.append({'label': label, 'type': kind, 'url': url})
+
+        return JsonResponse({'results': results})
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "raspimobile.settings")
 
 application = get_wsgi_application()
+
+# Build the in-process autocomplete index before serving the first request.
+from products.autocomplete import warm_prefix_index  # noqa: E402
+
+warm_prefix_index()
@@ -0,0 +1,98 @@
+/**
+ * @file autocomplete.js
+ * @description Search-as-you-type suggestions for the navbar search field.
+ * Queries the autocomplete endpoint (debounced) as the user types and shows the
+ * matching products and categories in a dropdown below the field.
+ */
+
+document.addEventListener("DOMContentLoaded", function () {
+    const searchInput = document.querySelector("input[data-autocomplete-url]");
+    if (!searchInput) {
+        return;
+    }
+
+    const suggestionsMenu = searchInput.parentElement.querySelector(".search-suggestions");
+    const debounceDelay = 150;
+    let debounceTimer = null;
+    let latestQuery = "";
+
+    /**
+     * Hides the suggestions dropdown and clears its items.
+     */
+    function hideSuggestions() {
+        suggestionsMenu.classList.remove("show");
+        suggestionsMenu.replaceChildren();
+    }
+
+    /**
+     * Renders suggestion results as dropdown items.
+     *
+     * @param {Array<{label: string, type: string, url: string}>} results - The suggestions to show.
+     */
+    function showSuggestions(results) {
+        suggestionsMenu.replaceChildren();
+        results.forEach((result) => {
+            const item = document.createElement("a");
+            item.className = "dropdown-item d-flex justify-content-between";
+            item.href = result.url;
+            item.setAttribute("role", "option");
+
+            const label = document.createElement("span");
+            label.textContent = result.label;
+            item.appendChild(label);
+
+            if (result.type === "category") {
+                const badge = document.createElement("span");
+                badge.className = "text-muted small ms-2";
+                badge.textContent = "Category";
+                item.appendChild(badge);
+            }
+            suggestionsMenu.appendChild(item);
+        });
+        suggestionsMenu.classList.toggle("show", results.length > 0);
+    }
+
+    /**
+     * Fetches suggestions for the current input value. Responses for
+     * outdated queries are ignored.
+     */
+    function fetchSuggestions() {
+        const query = searchInput.value.trim();
+        latestQuery = query;
+        if (!query) {
+            hideSuggestions();
+            return;
+        }
+
+        const url = new URL(searchInput.dataset.autocompleteUrl, window.location.origin);
+        url.searchParams.set("q", query);
+
+        fetch(url, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+            .then((response) => (response.ok ? response.json() : { results: [] }))
+            .then((data) => {
+                if (query === latestQuery) {
+                    showSuggestions(data.results);
+                }
+            })
+            .catch((error) => {
+                console.error("There was a problem loading suggestions:", error);
+            });
+    }
+
+    searchInput.addEventListener("input", function () {
+        clearTimeout(debounceTimer);
+        debounceTimer = setTimeout(fetchSuggestions, debounceDelay);
+    });
+
+    searchInput.addEventListener("keydown", function (event) {
+        if (event.key === "Escape") {
+            hideSuggestions();
+        }
+    });
+
+    document.addEventListener("click", function (event) {
+        if (!searchInput.parentElement.contains(event.target)) {
+            hideSuggestions();
+        }
+    });
+});
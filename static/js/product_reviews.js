@@ -0,0 +1,50 @@
+/**
+ * @file product_reviews.js
+ * @description Loads further pages of approved reviews on the product detail page.
+ * The first page is rendered by the server; the "Show more reviews" button fetches
+ * the following pages (as HTML fragments) by cursor and appends them to the list.
+ */
+
+document.addEventListener("DOMContentLoaded", function () {
+    const loadMoreButton = document.getElementById("loadMoreReviews");
+    const reviewsList = document.getElementById("reviewsList");
+
+    if (!loadMoreButton || !reviewsList) {
+        return;
+    }
+
+    /**
+     * Fetches the next page of reviews and appends it to the review list.
+     * Hides the button once there are no further pages.
+     */
+    function loadMoreReviews() {
+        const url = new URL(loadMoreButton.dataset.url, window.location.origin);
+        url.searchParams.set("cursor", loadMoreButton.dataset.cursor);
+        loadMoreButton.disabled = true;
+
+        fetch(url, {
+            headers: { "X-Requested-With": "XMLHttpRequest" },
+        })
+            .then((response) => {
+                if (!response.ok) {
+                    throw new Error(`Network error ${response.status} loading reviews.`);
+                }
+                return response.json();
+            })
+            .then((data) => {
+                reviewsList.insertAdjacentHTML("beforeend", data.html);
+                if (data.next_cursor) {
+                    loadMoreButton.dataset.cursor = data.next_cursor;
+                    loadMoreButton.disabled = false;
+                } else {
+                    loadMoreButton.parentElement.remove();
+                }
+            })
+            .catch((error) => {
+                console.error("There was a problem loading reviews:", error);
+                loadMoreButton.disabled = false;
+            });
+    }
+
+    loadMoreButton.addEventListener("click", loadMoreReviews);
+});